@@ -1,16 +1,12 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 from datetime import datetime
-import pytz
+import math
 import os
+import threading
+import time
 
-# Importaciones de tus módulos locales
-from utils.sheets_connector import SheetsConnector
-from utils.lifecycle_calculator import LifecycleCalculator
-from utils.gemini_analyzer import GeminiAnalyzer
-from utils.user_manager import UserManager
+# La pantalla de login solo necesita streamlit: pandas, Sheets y el cálculo se importan
+# después de autenticar, y plotly / Gemini en las vistas que los usan (ver benchmarks/startup_budget.py)
 
 # ============================================
 # CONFIGURACIÓN DE PÁGINA
@@ -38,41 +34,84 @@ def get_secret(key_name):
 SHEET_ID = get_secret("GOOGLE_SHEET_ID")
 API_KEY = get_secret("GEMINI_API_KEY")
 
-@st.cache_data(ttl=600, show_spinner=False)
-def load_data_from_sheets():
-    """Carga datos y los guarda en memoria por 10 min."""
-    if not SHEET_ID:
-        return None, None, None
-    
-    try:
-        conn = SheetsConnector(spreadsheet_id=SHEET_ID)
-        df_a = conn.get_data("Activos")
-        df_m = conn.get_data("Mantenimiento")
-        df_c = conn.get_data("Costos_Referencia")
-        return df_a, df_m, df_c
-    except Exception as e:
-        st.error(f"Error cargando datos: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+# Snapshots locales de las hojas (sobreviven reinicios del servidor)
+SHEETS_CACHE_DIR = os.getenv("SHEETS_CACHE_DIR", os.path.join(".cache", "sheets"))
+# Respuestas de Gemini en disco
+GEMINI_CACHE_DIR = os.getenv("GEMINI_CACHE_DIR", os.path.join(".cache", "gemini"))
+# Journal de la cola de escritura (registros guardados aún no enviados a Sheets)
+ESCRITURA_JOURNAL = os.getenv("ESCRITURA_JOURNAL", os.path.join(".cache", "escritura", "journal.jsonl"))
+# Plazos por llamada a Gemini (segundos)
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+GEMINI_FIRST_TOKEN_TIMEOUT = float(os.getenv("GEMINI_FIRST_TOKEN_TIMEOUT", "20"))
+# Límite de llamadas por minuto del análisis por lote y carpeta de reportes
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+REPORTES_DIR = os.getenv("REPORTES_DIR", "reportes")
+
+def calcular_metricas(df_activos, df_mantenimiento, df_costos_ref):
+    """
+    Métricas de flota de un snapshot (corre en el hilo de refresco: sin llamadas a st.*).
+    Retorna también los agregados por activo (actualizaciones incrementales), el cubo
+    de mantenimiento activo × mes × tipo y el índice temporal de costos por activo.
+    """
+    calc = LifecycleCalculator()
+    cubo = MaintenanceCube.desde_mantenimiento(df_mantenimiento)
+    indice = CostTimeIndex.desde_mantenimiento(df_mantenimiento)
+    agregados = calc.agregar_mantenimiento(df_mantenimiento, cubo=cubo)
+    df = calc.calcular_metricas_completas(df_activos, df_mantenimiento, df_costos_ref,
+                                          agregados=agregados, indice_costos=indice)
+    return df, agregados, cubo, indice
+
+@st.cache_resource
+def get_refresher():
+    """
+    Último snapshot bueno de las hojas y sus métricas, compartido entre sesiones.
+    Un hilo lo renueva cada 10 min o al cambiar la revisión del Spreadsheet;
+    la llave de las métricas incluye la fecha (la ventana de costos se cierra en el día actual).
+    """
+    return FleetRefresher(lambda: get_connector(SHEET_ID, cache_dir=SHEETS_CACHE_DIR), calcular_metricas,
+                          version=LifecycleCalculator.VERSION)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def calcular_proyeccion_cache(huella, _df, _df_costos_ref):
+    """
+    Matriz activos × horizonte de degradación, una vez por huella de la flota.
+    cache_resource: la matriz es de solo lectura, se comparte sin copiarla en cada acierto.
+    """
+    telemetria.marcar_cache(False)
+    return DegradationForecast.desde_flota(_df, _df_costos_ref)
+
+@st.cache_resource
+def get_cola_escritura():
+    """
+    Cola de escritura compartida: los formularios guardan al instante en el journal y un hilo
+    envía las filas por lotes. Tras cada lote se pide un refresco de los datos.
+    """
+    return WriteQueue(lambda: get_connector(SHEET_ID, cache_dir=SHEETS_CACHE_DIR), ESCRITURA_JOURNAL,
+                      al_enviar=get_refresher().solicitar)
+
+@st.cache_resource
+def cambios_locales():
+    """
+    Filas guardadas desde la app que el snapshot aún no trae, aplicadas sobre él (compartido entre sesiones).
+    La llave es el snapshot más los ids de esas filas: se recalcula solo si cambia alguno.
+    """
+    return {'lock': threading.Lock(), 'llave': None, 'datos': None}
+
+@st.cache_resource
+def get_gemini_analyzer(api_key):
+    """Analizador compartido: su caché de respuestas sobrevive a los reruns."""
+    from utils.gemini_analyzer import GeminiAnalyzer
+    return GeminiAnalyzer(api_key=api_key, cache_dir=GEMINI_CACHE_DIR,
+                          timeout=GEMINI_TIMEOUT, first_token_timeout=GEMINI_FIRST_TOKEN_TIMEOUT)
 
 # ============================================
 # FUNCIONES DE VISUALIZACIÓN (GRÁFICOS)
 # ============================================
-def generar_grafico_ciclo_vida(asset_data, df_costos_ref, theme_mode):
-    """Genera gráfico de curva de degradación."""
-    ref = df_costos_ref[df_costos_ref['tipo_equipo'] == asset_data['tipo_equipo']]
-    vida_util_esperada = ref['vida_util_esperada_horas'].values[0] if not ref.empty else 15000
-    horas_promedio_anual = asset_data['horometro_actual'] / max(1, asset_data['edad_anos'])
-
-    ages = np.arange(0, 21, 1)
-    healths_teoricos = []
-
-    for age in ages:
-        hypothetical_hours = age * horas_promedio_anual
-        uso_pct = min(hypothetical_hours / vida_util_esperada, 1.5)
-        score_uso_sim = max(0, 100 * (1 - (uso_pct ** 1.2)))
-        score_edad_sim = max(0, 100 * np.exp(-0.1 * age))
-        theoretical_health = (score_uso_sim * 0.30) + (score_edad_sim * 0.20) + (100 * 0.50)
-        healths_teoricos.append(theoretical_health)
+def generar_grafico_ciclo_vida(asset_data, pronostico, theme_mode):
+    """Genera gráfico de curva de degradación (fila del pronóstico de flota)."""
+    import plotly.graph_objects as go
+
+    ages, healths_teoricos = pronostico.curva(asset_data['id_activo'])
 
     fig = go.Figure()
     fig.add_hrect(y0=85, y1=100, line_width=0, fillcolor="rgba(40, 167, 69, 0.1)", layer="below")
@@ -188,7 +227,9 @@ if not st.session_state.authenticated:
                     st.error("❌ Error: No se encontró GOOGLE_SHEET_ID en Secrets.")
                 else:
                     try:
-                        temp_conn = SheetsConnector(spreadsheet_id=SHEET_ID)
+                        from utils.sheets_connector import get_connector
+                        from utils.user_manager import UserManager
+                        temp_conn = get_connector(SHEET_ID, cache_dir=SHEETS_CACHE_DIR)
                         user_mgr = UserManager(temp_conn)
                         if user_mgr.verify_password(email, password):
                             user_info = user_mgr.get_user_info(email)
@@ -205,6 +246,29 @@ if not st.session_state.authenticated:
                         st.error(f"❌ Error de conexión: {str(e)}")
     st.stop()
 
+# ============================================
+# MÓDULOS DE DATOS (usuario autenticado)
+# ============================================
+import pandas as pd
+import pytz
+
+from utils.sheets_connector import (SheetsConnector, COLUMNAS_HOJAS, FORMATO_FECHA_HOJA, concatenar_filas,
+                                    get_connector, get_pool)
+from utils.lifecycle_calculator import LifecycleCalculator, VENTANA_COSTO_MESES
+from utils.maintenance_cube import MaintenanceCube
+from utils.cost_index import CostTimeIndex
+from utils.degradation_forecast import DegradationForecast, UMBRALES
+from utils.scenario_engine import ScenarioEngine
+from utils.fleet_table import filtrar_flota, paginar
+from utils.user_manager import get_directorio
+from utils.fingerprint import calcular_huella
+from utils.fleet_refresher import FleetRefresher
+from utils.write_queue import WriteQueue
+from utils.bulk_import import BulkImporter, TIPOS_MANTENIMIENTO
+from utils.telemetry import get_telemetria
+
+telemetria = get_telemetria()
+
 # Usuario logueado
 user_email = st.session_state.user_email
 user_name = st.session_state.user_name
@@ -220,7 +284,6 @@ st.markdown("---")
 # ============================================
 try:
     calculator = LifecycleCalculator()
-    gemini_analyzer = GeminiAnalyzer(api_key=API_KEY) if API_KEY else None
 except Exception as e:
     st.error(f"❌ Error al inicializar módulos: {str(e)}")
     st.stop()
@@ -231,12 +294,73 @@ except Exception as e:
 st.sidebar.title("📊 Navegación")
 
 if st.sidebar.button("🔄 Recargar Datos", type="primary"):
-    load_data_from_sheets.clear()
+    get_directorio().invalidar()
+    if SHEET_ID:
+        # Recarga explícita: se espera el refresco; si falla, se conserva el snapshot anterior
+        with st.spinner("🔄 Recargando datos de flota..."):
+            get_refresher().refrescar()
     st.rerun()
 
 chile_tz = pytz.timezone('America/Punta_Arenas')
-ultima_actualizacion = datetime.now(chile_tz).strftime("%d/%m/%Y - %H:%M:%S")
-st.sidebar.caption(f"🕒 Actualizado:\n{ultima_actualizacion}")
+estado_datos = get_refresher().estado() if SHEET_ID else {}
+if estado_datos.get('cargado_en'):
+    ultima_actualizacion = datetime.fromtimestamp(estado_datos['cargado_en'], chile_tz).strftime("%d/%m/%Y - %H:%M:%S")
+    st.sidebar.caption(f"🕒 Actualizado:\n{ultima_actualizacion} (hace {estado_datos['edad_segundos'] / 60:.0f} min)")
+if estado_datos.get('ultimo_error'):
+    st.sidebar.warning(f"⚠️ Falló el último refresco ({estado_datos['ultimo_error']}). Se muestran los datos anteriores.")
+
+estado_cola = get_cola_escritura().estado() if SHEET_ID else {}
+if estado_cola.get('ultimo_error'):
+    reintento = max(0, estado_cola['proximo_intento'] - datetime.now().timestamp())
+    st.sidebar.warning(
+        f"⚠️ {estado_cola['pendientes']} registro(s) sin enviar a Sheets ({estado_cola['ultimo_error']}). "
+        f"Reintento {estado_cola['intentos'] + 1} en {reintento:.0f} s; quedan guardados localmente."
+    )
+elif estado_cola.get('pendientes'):
+    st.sidebar.caption(f"📤 Enviando {estado_cola['pendientes']} registro(s) a Sheets...")
+elif estado_cola.get('ultimo_envio'):
+    ultimo_envio = datetime.fromtimestamp(estado_cola['ultimo_envio'], chile_tz).strftime("%H:%M:%S")
+    st.sidebar.caption(f"✅ Registros enviados a Sheets ({ultimo_envio})")
+
+if user_role == 'admin':
+    pool_stats = get_pool().stats()
+    st.sidebar.caption(
+        f"🔌 Conexiones Sheets: {pool_stats['handshakes']} autorizaciones | "
+        f"{pool_stats['reutilizados']} reutilizadas"
+    )
+
+    # Panel de rendimiento: sin activarlo los spans son objetos nulos.
+    # Es un ajuste único del proceso: solo se escribe cuando un admin mueve el toggle,
+    # y el toggle muestra el valor vigente aunque lo haya cambiado otra sesión.
+    def _cambiar_telemetria():
+        telemetria.activo = st.session_state['toggle_telemetria']
+
+    st.session_state['toggle_telemetria'] = telemetria.activo
+    st.sidebar.toggle("⏱️ Medir rendimiento", key='toggle_telemetria', on_change=_cambiar_telemetria)
+    if telemetria.activo:
+        with st.sidebar.expander("Rendimiento", expanded=False):
+            tabla_perf = telemetria.resumen()
+            if tabla_perf.empty:
+                st.caption("Sin mediciones aún. Navega por las vistas para registrar tiempos.")
+            else:
+                tabla_perf['cache_hit_rate'] = tabla_perf['cache_hit_rate'] * 100
+                st.dataframe(
+                    tabla_perf[['operacion', 'etiquetas', 'llamadas', 'p50_ms', 'p90_ms', 'p99_ms', 'cache_hit_rate']],
+                    hide_index=True, use_container_width=True,
+                    column_config={
+                        'p50_ms': st.column_config.NumberColumn("p50 ms", format="%.1f"),
+                        'p90_ms': st.column_config.NumberColumn("p90 ms", format="%.1f"),
+                        'p99_ms': st.column_config.NumberColumn("p99 ms", format="%.1f"),
+                        'cache_hit_rate': st.column_config.NumberColumn("Caché", format="%.0f%%"),
+                    }
+                )
+            st.download_button("⬇️ JSON", telemetria.a_json(), file_name="rendimiento.json",
+                               mime="application/json")
+            st.download_button("⬇️ Prometheus", telemetria.a_prometheus(), file_name="rendimiento.prom",
+                               mime="text/plain")
+            if st.button("🧹 Reiniciar mediciones"):
+                telemetria.reiniciar()
+                st.rerun()
 
 if st.sidebar.button("🚪 Cerrar Sesión"):
     st.session_state.authenticated = False
@@ -251,11 +375,11 @@ menu_options = []
 
 if user_role == 'admin':
     # Admin ve todo
-    menu_options = ["Dashboard", "Acciones Prioritarias", "Detalle por Activo", "Análisis IA", "📝 Ingreso de Datos"]
+    menu_options = ["Dashboard", "Acciones Prioritarias", "Proyección de Flota", "Simulador de Escenarios", "Detalle por Activo", "Análisis IA", "📝 Ingreso de Datos"]
 
 elif user_role == 'gerente':
     # Gerente: Estrategia y Finanzas (Sin carga operativa)
-    menu_options = ["Dashboard", "Acciones Prioritarias", "Análisis IA"]
+    menu_options = ["Dashboard", "Acciones Prioritarias", "Proyección de Flota", "Simulador de Escenarios", "Análisis IA"]
 
 elif user_role == 'operador':
     # Operador: Operativa y Carga (Sin estrategia financiera/IA)
@@ -270,19 +394,106 @@ view_mode = st.sidebar.radio("Selecciona una vista", menu_options)
 # ============================================
 # CARGA DE DATOS
 # ============================================
-with st.spinner("🔄 Obteniendo datos de flota..."):
-    df_activos, df_mantenimiento, df_costos_ref = load_data_from_sheets()
+# Último snapshot bueno, al instante; solo la primera carga del proceso espera el fetch
+with st.spinner("🔄 Obteniendo datos de flota..."), telemetria.span('fleet.obtener', cache=True):
+    snapshot = get_refresher().obtener() if SHEET_ID else None
 
-if df_activos is None or df_activos.empty:
+if snapshot is None:
     st.warning("⚠️ No se pudieron cargar los datos o la hoja 'Activos' está vacía.")
     st.stop()
 
-# Calcular métricas una sola vez
-df = calculator.calcular_metricas_completas(df_activos, df_mantenimiento, df_costos_ref)
+df_activos = snapshot.hojas["Activos"]
+df_mantenimiento = snapshot.hojas["Mantenimiento"]
+df_costos_ref = snapshot.hojas["Costos_Referencia"]
+# Métricas calculadas una vez por snapshot (compartidas entre reruns y sesiones)
+df, agregados_mant, cubo_mant, indice_costos = snapshot.metricas
+
+def aplicar_cambios_locales(snapshot, df_activos, df_mantenimiento, df, agregados, cubo, indice):
+    """
+    Suma al snapshot las filas guardadas desde la app que aún no trae (pendientes en la cola
+    o enviadas que su lectura aún no refleja). Los mantenimientos recalculan solo sus activos; los activos
+    nuevos se calculan solos (los scores son por fila).
+    """
+    cola = get_cola_escritura()
+    filas_activos = cola.filas_locales("Activos", snapshot.leido_en, snapshot.revision)
+    filas_mant = cola.filas_locales("Mantenimiento", snapshot.leido_en, snapshot.revision)
+    if not filas_activos and not filas_mant:
+        return df_activos, df_mantenimiento, df, agregados, cubo, indice
+
+    locales = cambios_locales()
+    llave = (snapshot.clave, snapshot.cargado_en, tuple(i for i, _ in filas_activos + filas_mant))
+    with locales['lock']:
+        if locales['llave'] == llave:
+            return locales['datos']
+        if filas_mant:
+            df_m_nuevos = SheetsConnector.clean_data(
+                "Mantenimiento", pd.DataFrame([f for _, f in filas_mant], columns=COLUMNAS_HOJAS["Mantenimiento"])
+            )
+            df_mantenimiento = concatenar_filas(df_mantenimiento, df_m_nuevos)
+            indice = indice.agregar(df_m_nuevos)
+            cubo = cubo.agregar(df_m_nuevos)
+            df, agregados = calculator.actualizar_mantenimiento(df, agregados, df_m_nuevos, df_costos_ref,
+                                                                indice_costos=indice)
+        if filas_activos:
+            df_a_nuevos = SheetsConnector.clean_data(
+                "Activos", pd.DataFrame([f for _, f in filas_activos], columns=COLUMNAS_HOJAS["Activos"])
+            )
+            # Si el snapshot ya trae el activo, no se duplica
+            df_a_nuevos = df_a_nuevos[~df_a_nuevos['id_activo'].isin(df_activos['id_activo'])]
+            if not df_a_nuevos.empty:
+                df_activos = concatenar_filas(df_activos, df_a_nuevos)
+                nuevos = calculator.calcular_metricas_completas(df_a_nuevos, None, df_costos_ref,
+                                                                agregados=agregados, indice_costos=indice)
+                df = concatenar_filas(df, nuevos)
+        datos = (df_activos, df_mantenimiento, df, agregados, cubo, indice)
+        locales.update(llave=llave, datos=datos)
+        return datos
+
+# Registros guardados desde la app que aún no trae el snapshot (visibles al instante)
+df_activos, df_mantenimiento, df, agregados_mant, cubo_mant, indice_costos = aplicar_cambios_locales(
+    snapshot, df_activos, df_mantenimiento, df, agregados_mant, cubo_mant, indice_costos
+)
+
+def obtener_pronostico():
+    """Pronóstico de degradación de la flota actual (caché por huella de las columnas que usa)."""
+    columnas = ['id_activo', 'tipo_equipo', 'horometro_actual', 'edad_anos', 'score_confiabilidad', 'health_score']
+    with telemetria.span('calcular_proyeccion_cache', cache=True):
+        return calcular_proyeccion_cache(calcular_huella(df[columnas], df_costos_ref), df, df_costos_ref)
+
+def filtros_flota(clave):
+    """Controles de filtro de la tabla de flota. Retorna los argumentos de filtrar_flota."""
+    col_texto, col_tipo, col_prioridad, col_horizonte = st.columns([2, 2, 1, 1])
+    with col_texto:
+        texto = st.text_input("🔎 Buscar", key=f"{clave}_texto", placeholder="ID, marca, modelo o acción")
+    with col_tipo:
+        tipos = st.multiselect("Tipo de equipo", sorted(df['tipo_equipo'].dropna().unique()), key=f"{clave}_tipos")
+    with col_prioridad:
+        prioridades = st.multiselect("Prioridad", sorted(df['prioridad'].unique()), key=f"{clave}_prioridades")
+    with col_horizonte:
+        horizonte = st.selectbox("Horizonte", ["Todos", "≤ 6 meses", "≤ 12 meses", "≤ 24 meses"],
+                                 key=f"{clave}_horizonte")
+    return {'texto': texto, 'tipos': tipos, 'prioridades': prioridades,
+            'horizonte_max': None if horizonte == "Todos" else int(horizonte.split()[1])}
+
+def paginador(clave, total_filas):
+    """Tamaño y número de página. Si los filtros dejan la página fuera de rango, vuelve a la primera."""
+    col_filas, col_pagina, col_info = st.columns([1, 1, 3])
+    with col_filas:
+        por_pagina = st.selectbox("Filas por página", [25, 50, 100], key=f"{clave}_por_pagina")
+    total_paginas = max(1, math.ceil(total_filas / por_pagina))
+    if st.session_state.get(f"{clave}_pagina", 1) > total_paginas:
+        st.session_state[f"{clave}_pagina"] = 1
+    with col_pagina:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key=f"{clave}_pagina")
+    with col_info:
+        st.caption(f"{total_filas:,} activos | página {pagina} de {total_paginas}")
+    return pagina, por_pagina
 
 # ============================================
 # VISTAS PRINCIPALES
 # ============================================
+# Se cierra al final del script (un st.rerun/st.stop dentro de la vista descarta la muestra)
+span_vista = telemetria.iniciar('vista', vista=view_mode)
 
 # --- VISTA 1: DASHBOARD ---
 if view_mode == "Dashboard":
@@ -302,10 +513,38 @@ if view_mode == "Dashboard":
     st.markdown("---")
     st.subheader("📊 Estado de Activos")
 
-    display_df = df[['id_activo', 'tipo_equipo', 'marca', 'modelo', 'edad_anos', 
-                      'health_score', 'horizonte_meses', 'accion']].copy()
+    # Filtro y orden sobre la flota completa; solo la página visible se arma y estiliza
+    filtrados = filtrar_flota(df, **filtros_flota("dash"))
+    ordenes = {"Orden de la hoja": None, "Health Score": 'health_score', "Prioridad": ['prioridad', 'health_score'],
+               "Horizonte": 'horizonte_meses', "Edad": 'edad_anos', "ID": 'id_activo'}
+
+    # Ventana del costo de mantención (búsqueda en el índice temporal, sin recorrer el historial)
+    col_orden, col_sentido, col_ventana, col_rango = st.columns([1, 1, 1, 2])
+    with col_orden:
+        orden = st.selectbox("Ordenar por", list(ordenes), key="dash_orden")
+    with col_sentido:
+        descendente = st.checkbox("Descendente", key="dash_descendente")
+    with col_ventana:
+        ventana = st.selectbox("Costo de mantención", ["Últimos 12 meses", "Últimos 24 meses",
+                                                       "Últimos 36 meses", "Rango personalizado"])
+    pagina, por_pagina = paginador("dash", len(filtrados))
+    display_df, _ = paginar(filtrados, ordenes[orden], ascendente=not descendente,
+                            pagina=pagina, por_pagina=por_pagina)
+
+    if ventana == "Rango personalizado":
+        with col_rango:
+            hoy = pd.Timestamp.now().normalize()
+            rango = st.date_input("Rango", ((hoy - pd.DateOffset(years=1)).date(), hoy.date()))
+        desde, hasta = (rango[0], rango[-1]) if rango else (None, None)
+        costos_ventana = indice_costos.costos_ventana(display_df['id_activo'], desde=desde, hasta=hasta)
+    else:
+        costos_ventana = indice_costos.costos_ventana(display_df['id_activo'], meses=int(ventana.split()[1]))
+
+    display_df = display_df[['id_activo', 'tipo_equipo', 'marca', 'modelo', 'edad_anos',
+                             'health_score', 'horizonte_meses', 'accion']].copy()
     display_df['health_score'] = display_df['health_score'].round(1)
     display_df['horizonte_meses'] = display_df['horizonte_meses'].round(0)
+    display_df['costo_mantencion_ventana'] = costos_ventana.to_numpy().round(0)
     
     def color_health(val):
         if val < 40: return 'background-color: #4A1F1F; color: #FF6B6B'
@@ -313,10 +552,12 @@ if view_mode == "Dashboard":
         else: return 'background-color: #1F4A2F; color: #6BCF7F'
     
     try:
-        styled_df = display_df.style.applymap(color_health, subset=['health_score'])
-        st.dataframe(styled_df, use_container_width=True, height=400)
+        # Styler.applymap pasó a llamarse Styler.map en pandas 2.1
+        styler = display_df.style
+        styled_df = (styler.map if hasattr(styler, 'map') else styler.applymap)(color_health, subset=['health_score'])
+        st.dataframe(styled_df, use_container_width=True, height=400, hide_index=True)
     except:
-        st.dataframe(display_df, use_container_width=True, height=400)
+        st.dataframe(display_df, use_container_width=True, height=400, hide_index=True)
 
     col1, col2 = st.columns(2)
     with col1:
@@ -324,26 +565,31 @@ if view_mode == "Dashboard":
         st.bar_chart(df['tipo_equipo'].value_counts())
     with col2:
         st.subheader("Health Score Promedio")
-        st.bar_chart(df.groupby('tipo_equipo')['health_score'].mean().sort_values())
+        st.bar_chart(df.groupby('tipo_equipo', observed=True)['health_score'].mean().sort_values())
 
 # --- VISTA 2: ACCIONES PRIORITARIAS ---
 elif view_mode == "Acciones Prioritarias":
     st.subheader("🚨 Acciones Prioritarias")
-    df_recomendaciones = calculator.priorizar_flota(df)
 
+    # Métricas sobre la flota completa
     col1, col2, col3 = st.columns(3)
     with col1:
-        total_criticos = len(df_recomendaciones[df_recomendaciones['prioridad'] <= 2])
+        total_criticos = int((df['prioridad'] <= 2).sum())
         st.metric("🔴 Críticos/Urgentes", total_criticos)
     with col2:
-        impacto_total = df_recomendaciones['impacto_economico_clp'].sum()
+        impacto_total = df['impacto_economico_clp'].sum()
         st.metric("💰 Impacto Total", f"${impacto_total:,.0f}")
     with col3:
-        proximos_6m = len(df_recomendaciones[df_recomendaciones['horizonte_meses'] <= 6])
+        proximos_6m = int((df['horizonte_meses'] <= 6).sum())
         st.metric("⏰ Acción 6 meses", proximos_6m)
 
     st.markdown("---")
 
+    # Mismo orden que priorizar_flota (prioridad, health_score), armando solo los expanders de la página
+    filtrados = filtrar_flota(df, **filtros_flota("acciones"))
+    pagina, por_pagina = paginador("acciones", len(filtrados))
+    df_recomendaciones, _ = paginar(filtrados, ['prioridad', 'health_score'], pagina=pagina, por_pagina=por_pagina)
+
     for idx, rec in df_recomendaciones.iterrows():
         emoji = "🔴" if rec['prioridad'] == 1 else "🟠" if rec['prioridad'] == 2 else "🟡" if rec['prioridad'] == 3 else "🟢"
         with st.expander(f"{emoji} {rec['accion']} - {rec['id_activo']} ({rec['tipo_equipo']})"):
@@ -356,6 +602,90 @@ elif view_mode == "Acciones Prioritarias":
                 st.write(f"**Prioridad:** {rec['prioridad']}")
             st.info(rec['detalle'])
 
+# --- VISTA 2B: PROYECCIÓN DE FLOTA ---
+elif view_mode == "Proyección de Flota":
+    st.subheader("📉 Proyección de Degradación")
+    st.caption("Meses hasta que cada activo cruza los umbrales de health score, "
+               "manteniendo su uso anual real y su confiabilidad actual.")
+    cruces = obtener_pronostico().cruces()
+
+    cols = st.columns(len(UMBRALES))
+    for col, umbral in zip(cols, UMBRALES):
+        with col:
+            en_12m = int((cruces[f'meses_hasta_{umbral}'] <= 12).sum())
+            st.metric(f"Bajo {umbral} en 12 meses", en_12m)
+
+    st.markdown("---")
+    tipos = sorted(cruces['tipo_equipo'].astype(str).unique())
+    filtro_tipo = st.multiselect("Tipo de equipo", tipos)
+    if filtro_tipo:
+        cruces = cruces[cruces['tipo_equipo'].astype(str).isin(filtro_tipo)]
+
+    tabla = cruces.sort_values([f'meses_hasta_{u}' for u in sorted(UMBRALES)], na_position='last')
+    tabla = tabla.round({'health_score': 1, 'horas_anuales': 0})
+    st.dataframe(tabla, use_container_width=True, height=450, hide_index=True)
+
+    st.subheader(f"Activos que cruzan {min(UMBRALES)} por año")
+    anios_cruce = (cruces[f'meses_hasta_{min(UMBRALES)}'] // 12).dropna().astype(int)
+    if not anios_cruce.empty:
+        st.bar_chart(anios_cruce.value_counts().sort_index().rename_axis('años desde hoy'))
+    else:
+        st.info("Ningún activo cruza el umbral dentro del horizonte proyectado.")
+
+# --- VISTA 2C: SIMULADOR DE ESCENARIOS ---
+elif view_mode == "Simulador de Escenarios":
+    st.subheader("🧪 Simulador de Escenarios (What-if)")
+    st.caption("Cada fila es un escenario. Uso y traspaso en %, vida útil en horas (0 = sin cambio). "
+               "Tipo 'Todos' aplica a toda la flota.")
+    tipos = ["Todos"] + sorted(df['tipo_equipo'].dropna().astype(str).unique())
+    escenarios_df = st.data_editor(
+        pd.DataFrame([
+            {'nombre': 'Uso +20%', 'tipo_equipo': 'Todos', 'uso_pct': 120, 'correctivo_a_preventivo_pct': 0, 'vida_util_horas': 0},
+            {'nombre': '30% correctivo → preventivo', 'tipo_equipo': 'Todos', 'uso_pct': 100, 'correctivo_a_preventivo_pct': 30, 'vida_util_horas': 0},
+        ]),
+        num_rows="dynamic", use_container_width=True, key="escenarios_editor",
+        column_config={'tipo_equipo': st.column_config.SelectboxColumn("tipo_equipo", options=tipos, required=True)},
+    )
+    horizonte = st.slider("Horizonte de evaluación (meses)", 0, 60, 12)
+
+    if st.button("▶️ Simular", type="primary"):
+        def _num(valor, defecto):
+            return float(valor) if pd.notna(valor) else defecto
+
+        escenarios = []
+        for _, fila in escenarios_df.dropna(subset=['nombre']).iterrows():
+            tipo = fila['tipo_equipo'] if pd.notna(fila['tipo_equipo']) else 'Todos'
+
+            # 'Todos' va como escalar: alcanza también a los activos sin tipo_equipo
+            def _ajuste(valor):
+                return valor if tipo == 'Todos' else {tipo: valor}
+
+            escenario = {
+                'nombre': str(fila['nombre']),
+                'uso': _ajuste(_num(fila['uso_pct'], 100) / 100),
+                'correctivo_a_preventivo': _ajuste(_num(fila['correctivo_a_preventivo_pct'], 0) / 100),
+            }
+            if _num(fila['vida_util_horas'], 0) > 0:
+                escenario['vida_util'] = _ajuste(float(fila['vida_util_horas']))
+            escenarios.append(escenario)
+
+        resultado = ScenarioEngine(calculator, horizonte_meses=horizonte).evaluar(
+            df, agregados_mant, df_costos_ref, escenarios
+        )
+        st.session_state.resultado_escenarios = resultado
+
+    resultado = st.session_state.get('resultado_escenarios')
+    if resultado is not None:
+        resumen = resultado.resumen()
+        st.dataframe(resumen.round({'health_promedio': 1, 'delta_health': 1, 'impacto_total_clp': 0, 'delta_impacto_clp': 0}),
+                     use_container_width=True, hide_index=True)
+        st.bar_chart(resumen.set_index('escenario')['health_promedio'])
+
+        elegido = st.selectbox("Detalle por activo", resultado.nombres[1:] or resultado.nombres)
+        detalle = resultado.detalle(elegido).sort_values('delta_health')
+        st.dataframe(detalle.round({'health_base': 1, 'health_escenario': 1, 'delta_health': 1, 'impacto_escenario_clp': 0}),
+                     use_container_width=True, height=400, hide_index=True)
+
 # --- VISTA 3: DETALLE POR ACTIVO ---
 elif view_mode == "Detalle por Activo":
     st.subheader("🔍 Análisis Detallado")
@@ -376,7 +706,7 @@ elif view_mode == "Detalle por Activo":
 
     st.markdown("---")
     # --- GRÁFICO CICLO DE VIDA (PLOTLY) ---
-    fig_lifecycle = generar_grafico_ciclo_vida(asset_data, df_costos_ref, st.session_state.theme)
+    fig_lifecycle = generar_grafico_ciclo_vida(asset_data, obtener_pronostico(), st.session_state.theme)
     st.plotly_chart(fig_lifecycle, use_container_width=True)
     # --------------------------------------
 
@@ -390,7 +720,7 @@ elif view_mode == "Detalle por Activo":
         st.write(f"**Año:** {asset_data['ano_compra']}")
     with info_cols[1]:
         st.write(f"**Horómetro:** {asset_data['horometro_actual']:,.0f} hrs")
-        st.write(f"**Costo Mantención:** ${asset_data['costo_mantencion_ultimo_ano']:,.0f}")
+        st.write(f"**Costo Mantención ({VENTANA_COSTO_MESES} meses):** ${asset_data['costo_mantencion_ultimo_ano']:,.0f}")
         st.write(f"**Valor Residual:** ${asset_data['valor_residual_estimado']:,.0f}")
         st.write(f"**RUL:** {asset_data['rul_horas']:,.0f} hrs")
 
@@ -412,33 +742,32 @@ elif view_mode == "Detalle por Activo":
 elif view_mode == "Análisis IA":
     st.subheader("🤖 Análisis Inteligente & Visualización")
     
-    if not gemini_analyzer:
+    if not API_KEY:
         st.warning("⚠️ Configura GEMINI_API_KEY en Secrets para usar esta función")
         st.stop()
+    try:
+        # El cliente de Gemini se importa solo en esta vista
+        from utils.batch_analyzer import BatchAnalyzer
+        gemini_analyzer = get_gemini_analyzer(API_KEY)
+    except Exception as e:
+        st.error(f"❌ Error al inicializar módulos: {str(e)}")
+        st.stop()
 
     tab1, tab2 = st.tabs(["📊 Gráficos y Métricas", "💬 Chat con IA"])
 
     # --- TAB 1: INTELIGENCIA DE NEGOCIOS (PYTHON EXACTO) ---
     with tab1:
         st.markdown("### 💰 Evolución de Costos")
-        if not df_mantenimiento.empty and 'fecha' in df_mantenimiento.columns:
-            df_chart = df_mantenimiento.copy()
-            # Asegurar columna de costos
-            if 'costo_mantenimiento' not in df_chart.columns:
-                if 'costo_repuestos' in df_chart.columns and 'costo_mano_obra' in df_chart.columns:
-                    df_chart['costo_mantenimiento'] = df_chart['costo_repuestos'] + df_chart['costo_mano_obra']
-                else:
-                    df_chart['costo_mantenimiento'] = 0
-
+        # Roll-ups del cubo de mantenimiento (sin reagrupar el historial)
+        gastos_por_mes = cubo_mant.totales_mensuales()
+        if not gastos_por_mes.empty:
             # 1. Gráfico por Mes
-            df_chart['periodo'] = df_chart['fecha'].dt.to_period('M').astype(str)
-            gastos_por_mes = df_chart.groupby('periodo')['costo_mantenimiento'].sum().reset_index()
-            st.bar_chart(gastos_por_mes.set_index('periodo'), color=accent_color)
+            gastos_por_mes.index = gastos_por_mes.index.astype(str)
+            st.bar_chart(gastos_por_mes.rename_axis('periodo').to_frame(), color=accent_color)
             
             # 2. Totales Exactos por Año
             st.markdown("#### 📅 Resumen Exacto por Año")
-            df_chart['año'] = df_chart['fecha'].dt.year
-            gastos_por_ano = df_chart.groupby('año')['costo_mantenimiento'].sum()
+            gastos_por_ano = cubo_mant.totales_anuales()
             cols = st.columns(len(gastos_por_ano))
             for idx, (year, total) in enumerate(gastos_por_ano.items()):
                 with cols[idx % len(cols)]:
@@ -450,46 +779,85 @@ elif view_mode == "Análisis IA":
     with tab2:
         analysis_type = st.radio(
             "Tipo de consulta", 
-            ["Resumen Ejecutivo", "Activo Específico", "Pregunta Personalizada"]
+            ["Resumen Ejecutivo", "Activo Específico", "Análisis de Flota (Lote)", "Pregunta Personalizada"]
         )
+        regenerar = st.checkbox("🔁 Regenerar (ignorar respuestas guardadas)", value=False)
 
         if analysis_type == "Resumen Ejecutivo":
             if st.button("🚀 Generar Resumen", type="primary"):
-                with st.spinner("Gemini está analizando la flota..."):
-                    try:
-                        # CORRECCIÓN: Aquí enviamos 'df' (calculado)
-                        summary = gemini_analyzer.generate_executive_summary(df, df_mantenimiento, df_costos_ref)
-                        st.markdown(summary)
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                try:
+                    # CORRECCIÓN: Aquí enviamos 'df' (calculado)
+                    # Streaming: el texto aparece a medida que Gemini lo genera
+                    st.write_stream(gemini_analyzer.generate_executive_summary(
+                        df, df_mantenimiento, df_costos_ref, regenerate=regenerar, stream=True, cubo=cubo_mant
+                    ))
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
         elif analysis_type == "Activo Específico":
             selected_asset = st.selectbox("Selecciona un activo", df['id_activo'].tolist(), key="ai_select")
             if st.button("🔍 Analizar Activo", type="primary"):
                 asset_data = df[df['id_activo'] == selected_asset].iloc[0]
-                with st.spinner(f"Analizando {selected_asset}..."):
-                    try:
-                        analysis = gemini_analyzer.analyze_asset(asset_data, df_mantenimiento, df_costos_ref)
-                        st.markdown(analysis)
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                try:
+                    st.write_stream(gemini_analyzer.analyze_asset(
+                        asset_data, df_mantenimiento, df_costos_ref, regenerate=regenerar, stream=True, cubo=cubo_mant
+                    ))
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+        elif analysis_type == "Análisis de Flota (Lote)":
+            todos = df['id_activo'].tolist()
+            seleccion = st.multiselect("Activos a analizar (vacío = toda la flota)", todos, key="batch_select")
+            concurrencia = st.slider("Consultas simultáneas", 1, 16, 4)
+            trabajo = st.session_state.get('lote_ia')
+            en_curso = trabajo is not None and not trabajo.terminado
+            if st.button("🚀 Analizar Lote", type="primary", disabled=en_curso):
+                ids = seleccion or todos
+                batch = BatchAnalyzer(gemini_analyzer, max_workers=concurrencia, requests_per_minute=GEMINI_RPM)
+                ruta = os.path.join(REPORTES_DIR, f"analisis_flota_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md")
+                # Corre en su propio hilo: navegar a otra vista no lo interrumpe
+                trabajo = st.session_state['lote_ia'] = batch.iniciar(
+                    df, df_mantenimiento, df_costos_ref, ids=ids, regenerate=regenerar, output_path=ruta, cubo=cubo_mant
+                )
+
+            if trabajo is not None:
+                avance = trabajo.completados / trabajo.total if trabajo.total else 1.0
+                st.progress(avance, text=f"{trabajo.completados} / {trabajo.total} activos")
+                if not trabajo.terminado:
+                    st.caption("⏳ El lote sigue en segundo plano aunque cambies de vista.")
+                    time.sleep(1)
+                    st.rerun()
+                elif trabajo.error:
+                    st.error(f"❌ El lote se detuvo: {trabajo.error}")
+
+                df_resultados = trabajo.df_resultados()
+                if trabajo.terminado and not df_resultados.empty:
+                    errores = (df_resultados['estado'] == 'error').sum()
+                    st.success(f"✅ {len(df_resultados) - errores} activos analizados | ⚠️ {errores} con error"
+                               + (f" | Reporte: {trabajo.ruta}" if trabajo.ruta else ""))
+                    st.dataframe(df_resultados[['id_activo', 'estado', 'intentos', 'segundos', 'error']],
+                                 use_container_width=True, height=300)
+                    st.download_button("⬇️ Descargar Reporte", BatchAnalyzer.reporte_markdown(df_resultados),
+                                       file_name=os.path.basename(trabajo.ruta or "analisis_flota.md"),
+                                       mime="text/markdown")
 
         else:
             question = st.text_area("Pregunta a la IA", placeholder="Ej: ¿Qué pasó con el camión TOL-01 en septiembre?")
             if st.button("💬 Consultar", type="primary") and question:
-                with st.spinner("Consultando..."):
-                    try:
-                        answer = gemini_analyzer.custom_query(df, df_mantenimiento, df_costos_ref, question)
-                        st.markdown(answer)
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+                try:
+                    st.write_stream(gemini_analyzer.custom_query(
+                        df, df_mantenimiento, df_costos_ref, question, regenerate=regenerar, stream=True,
+                        cubo=cubo_mant
+                    ))
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
 # --- VISTA 5: INGRESO DE DATOS (NUEVO) ---
 elif view_mode == "📝 Ingreso de Datos":
     st.subheader("📝 Registro Seguro de Datos")
-    st.info("Los datos ingresados aquí se guardan directamente en Google Sheets y no se pueden borrar desde esta interfaz.")
+    st.info("Los datos ingresados aquí se guardan al instante y se envían a Google Sheets en segundo plano. No se pueden borrar desde esta interfaz.")
 
-    tab_mant, tab_asset = st.tabs(["🔧 Registrar Mantenimiento", "🚛 Nuevo Activo"])
+    tab_mant, tab_asset, tab_import = st.tabs(["🔧 Registrar Mantenimiento", "🚛 Nuevo Activo", "📥 Importación Masiva"])
 
     # --- FORMULARIO 1: NUEVO MANTENIMIENTO ---
     with tab_mant:
@@ -500,7 +868,7 @@ elif view_mode == "📝 Ingreso de Datos":
                 # Dropdown inteligente: Solo muestra activos existentes
                 id_activo = st.selectbox("Seleccionar Activo", df['id_activo'].unique())
                 fecha = st.date_input("Fecha del Evento", datetime.now())
-                tipo = st.selectbox("Tipo Mantenimiento", ["Preventivo", "Correctivo", "Predictivo"])
+                tipo = st.selectbox("Tipo Mantenimiento", TIPOS_MANTENIMIENTO)
             
             with col2:
                 costo_rep = st.number_input("Costo Repuestos (CLP)", min_value=0, step=10000)
@@ -512,7 +880,7 @@ elif view_mode == "📝 Ingreso de Datos":
             submitted = st.form_submit_button("💾 Guardar Registro", type="primary")
             
             if submitted:
-                fecha_str = fecha.strftime("%d/%m/%Y")
+                fecha_str = fecha.strftime(FORMATO_FECHA_HOJA)
                 
                 # Orden: id_activo, fecha, tipo, descripcion, repuestos, mano_obra, horas
                 row_data = [
@@ -525,12 +893,12 @@ elif view_mode == "📝 Ingreso de Datos":
                     horas_parada
                 ]
                 
-                conn = SheetsConnector(spreadsheet_id=SHEET_ID)
-                if conn.add_row("Mantenimiento", row_data):
-                    st.success(f"✅ Mantenimiento para {id_activo} guardado exitosamente!")
-                    load_data_from_sheets.clear()
-                else:
-                    st.error("❌ Error al conectar con Google Sheets")
+                # Se confirma al quedar en el journal; el envío a Sheets es en segundo plano
+                try:
+                    get_cola_escritura().encolar("Mantenimiento", row_data)
+                    st.success(f"✅ Mantenimiento para {id_activo} guardado exitosamente! Se enviará a Google Sheets en segundo plano.")
+                except OSError as e:
+                    st.error(f"❌ No se pudo guardar el registro: {e}")
 
     # --- FORMULARIO 2: NUEVO ACTIVO ---
     with tab_asset:
@@ -560,12 +928,63 @@ elif view_mode == "📝 Ingreso de Datos":
                         new_id, tipo_eq, marca, modelo, ano, horometro, valor_compra, valor_residual
                     ]
                     
-                    conn = SheetsConnector(spreadsheet_id=SHEET_ID)
-                    if conn.add_row("Activos", row_data):
-                        st.success(f"✅ Activo {new_id} creado exitosamente!")
-                        load_data_from_sheets.clear()
-                    else:
-                        st.error("❌ Error al guardar en Google Sheets")
+                    try:
+                        get_cola_escritura().encolar("Activos", row_data)
+                        st.success(f"✅ Activo {new_id} creado exitosamente! Se enviará a Google Sheets en segundo plano.")
+                    except OSError as e:
+                        st.error(f"❌ No se pudo guardar el activo: {e}")
+
+    # --- IMPORTACIÓN MASIVA DE HISTORIAL ---
+    with tab_import:
+        st.caption(
+            "Historial de mantenimiento desde CSV (separado por ',' o ';') o Excel (.xlsx). "
+            f"Columnas: {', '.join(COLUMNAS_HOJAS['Mantenimiento'])}. "
+            "Los registros que ya existen en la hoja se omiten."
+        )
+        st.download_button("⬇️ Plantilla CSV", ",".join(COLUMNAS_HOJAS["Mantenimiento"]) + "\n",
+                           file_name="plantilla_mantenimiento.csv", mime="text/csv")
+        archivo = st.file_uploader("Archivo de historial", type=["csv", "xlsx"])
+
+        if archivo is not None and st.button("📥 Importar", type="primary"):
+            # Duplicados contra el snapshot (incluye lo guardado en la cola que aún no llega a Sheets)
+            # y contra lo importado en este proceso que el snapshot aún no trae
+            importador = BulkImporter(get_connector(SHEET_ID, cache_dir=SHEETS_CACHE_DIR),
+                                      activos_validos=df_activos['id_activo'].astype(str),
+                                      registros_existentes=df_mantenimiento)
+            avance = st.empty()
+
+            def mostrar_avance(r):
+                avance.caption(f"⏳ {r['leidas']:,} filas leídas | {r['importadas']:,} importadas | "
+                               f"{r['duplicadas']:,} duplicadas | {r['con_error']:,} con error")
+
+            with st.spinner("📥 Importando historial..."):
+                resultado = importador.importar(archivo, archivo.name, progreso=mostrar_avance)
+            avance.empty()
+
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Filas Leídas", f"{resultado['leidas']:,}")
+            c2.metric("Importadas", f"{resultado['importadas']:,}")
+            c3.metric("Duplicadas (omitidas)", f"{resultado['duplicadas']:,}")
+            c4.metric("Con Error", f"{resultado['con_error']:,}")
+
+            if resultado['error']:
+                st.error(f"❌ Importación detenida: {resultado['error']}. "
+                         "Lo importado se conserva; volver a importar el archivo no lo duplica.")
+            else:
+                st.success(f"✅ Importación terminada en {resultado['segundos']:.0f} s.")
+            if resultado['importadas']:
+                get_refresher().solicitar()
+
+            if resultado['errores']:
+                df_errores = pd.DataFrame(resultado['errores'])
+                if resultado['con_error'] > len(df_errores):
+                    st.caption(f"Se muestran los primeros {len(df_errores):,} errores de {resultado['con_error']:,}.")
+                st.dataframe(df_errores, hide_index=True, use_container_width=True,
+                             column_config={'fila': "Fila del archivo", 'motivo': "Motivo"})
+                st.download_button("⬇️ Descargar errores", df_errores.to_csv(index=False),
+                                   file_name="errores_importacion.csv", mime="text/csv")
+
+span_vista.cerrar()
 
 st.markdown("---")
 st.caption("Concremag S.A. - Sistema de Gestión de Activos | Powered by Gemini AI")
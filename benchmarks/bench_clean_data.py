@@ -0,0 +1,86 @@
+"""
+Benchmark: limpieza de la hoja Mantenimiento (esquema vectorizado vs. apply por celda).
+
+Uso:
+    python benchmarks/bench_clean_data.py --rows 500000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from utils.sheets_connector import SheetsConnector
+
+
+def limpieza_legacy(df):
+    """Limpieza original de get_data (apply de clean_clp celda a celda)."""
+    df = df.copy()
+
+    def clean_clp(val):
+        if isinstance(val, str):
+            val = val.replace('$', '').replace('.', '').replace(',', '.')
+            return val.strip()
+        return val
+
+    for col in ['costo_repuestos', 'costo_mano_obra', 'horas_parada']:
+        df[col] = df[col].apply(clean_clp)
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['costo_mantenimiento'] = df['costo_repuestos'] + df['costo_mano_obra']
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    return df
+
+
+def generar_registros(n, n_activos=300, seed=0):
+    """Registros como los entrega get_all_records: mezcla de números y textos con formato CLP."""
+    rng = np.random.default_rng(seed)
+    costos = rng.integers(10_000, 5_000_000, n)
+    como_texto = rng.random(n) < 0.3
+    repuestos = np.where(como_texto, [f"${c:,.0f}".replace(',', '.') for c in costos], costos).astype(object)
+    repuestos[~como_texto] = costos[~como_texto]
+    fechas = pd.Timestamp('2018-01-01') + pd.to_timedelta(rng.integers(0, 365 * 7, n), unit='D')
+    return pd.DataFrame({
+        'id_activo': rng.choice([f"MX-{i:03d}" for i in range(n_activos)], n),
+        'fecha': fechas.strftime('%Y-%m-%d'),
+        'tipo_mantenimiento': rng.choice(['Preventivo', 'Correctivo', 'Predictivo'], n),
+        'descripcion': rng.choice(['Cambio aceite', 'Falla hidráulica', 'Neumáticos'], n),
+        'costo_repuestos': repuestos,
+        'costo_mano_obra': rng.integers(0, 1_000_000, n),
+        'horas_parada': rng.integers(0, 48, n),
+    }).astype({'id_activo': object, 'tipo_mantenimiento': object, 'descripcion': object, 'fecha': object})
+
+
+def medir(fn, df, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        out = fn(df)
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    raw = generar_registros(args.rows)
+    t_legacy, df_legacy = medir(limpieza_legacy, raw, args.repeat)
+    t_nuevo, df_nuevo = medir(lambda d: SheetsConnector.clean_data("Mantenimiento", d), raw, args.repeat)
+
+    mem_legacy = df_legacy.memory_usage(deep=True).sum() / 1e6
+    mem_nuevo = df_nuevo.memory_usage(deep=True).sum() / 1e6
+    iguales = np.allclose(df_legacy['costo_mantenimiento'], df_nuevo['costo_mantenimiento'])
+
+    print(f"Filas: {args.rows:,}")
+    print(f"Legacy (apply):     {t_legacy:8.3f} s  {mem_legacy:8.1f} MB")
+    print(f"Esquema vectorial:  {t_nuevo:8.3f} s  {mem_nuevo:8.1f} MB")
+    print(f"Aceleración: {t_legacy / t_nuevo:.1f}x | Memoria: {mem_nuevo / mem_legacy:.0%} | Costos iguales: {iguales}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: largo del prompt de custom_query vs. tamaño del historial.
+Compara el prompt anterior (todos los meses + últimos 50 registros) con el
+constructor por índices y presupuesto de tokens.
+
+Uso:
+    python benchmarks/bench_prompt_context.py --sizes 1000 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from bench_clean_data import generar_registros
+from utils.prompt_context import ContextBuilder, estimar_tokens
+from utils.sheets_connector import SheetsConnector
+
+PREGUNTAS = [
+    "¿Qué pasó con el camión MX-001 en 2019?",
+    "¿Cuánto se gastó en correctivos en septiembre 2021?",
+    "Resumen general de gastos",
+]
+
+
+def contexto_legacy(mantenimiento_df):
+    """Contexto anterior de custom_query: totales anuales y mensuales completos + últimos 50 registros."""
+    df = mantenimiento_df.copy()
+    anual = df.groupby(df['fecha'].dt.year)['costo_mantenimiento'].sum()
+    mensual = df.groupby(df['fecha'].dt.to_period('M'))['costo_mantenimiento'].sum()
+    txt = "\n".join(f"- Año {a}: ${m:,.0f} CLP" for a, m in anual.items())
+    txt += "\n" + "\n".join(f"- {p}: ${m:,.0f} CLP" for p, m in mensual.items())
+    cols = ['fecha', 'id_activo', 'tipo_mantenimiento', 'descripcion', 'costo_repuestos', 'costo_mano_obra', 'costo_mantenimiento']
+    txt += "\n" + df.sort_values('fecha', ascending=False).head(50)[cols].to_string(index=False)
+    return txt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 500_000])
+    parser.add_argument('--max-tokens', type=int, default=4000)
+    args = parser.parse_args()
+
+    filas = []
+    for n in args.sizes:
+        # El historial crece en años además de filas (1 año cada ~20k registros, mínimo 1)
+        raw = generar_registros(n)
+        anios = max(1, n // 20_000)
+        raw['fecha'] = (pd.Timestamp('2025-12-31') - pd.to_timedelta(
+            pd.Series(range(n)) % (365 * anios), unit='D')).dt.strftime('%Y-%m-%d')
+        m = SheetsConnector.clean_data("Mantenimiento", raw)
+        activos = pd.DataFrame({'id_activo': m['id_activo'].cat.categories, 'tipo_equipo': 'Camión Mixer'})
+
+        t0 = time.perf_counter()
+        legacy = contexto_legacy(m)
+        t_legacy = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        builder = ContextBuilder(m, activos)
+        t_indices = time.perf_counter() - t0
+
+        for q in PREGUNTAS:
+            t0 = time.perf_counter()
+            resumen, detalle, _ = builder.build(q, max_tokens=args.max_tokens)
+            t_build = time.perf_counter() - t0
+            filas.append({
+                'registros': n, 'pregunta': q[:40],
+                'tokens_legacy': estimar_tokens(legacy), 'tokens_nuevo': estimar_tokens(resumen + detalle),
+                'ms_legacy': round(t_legacy * 1000, 1), 'ms_indices': round(t_indices * 1000, 1),
+                'ms_build': round(t_build * 1000, 1),
+            })
+
+    print(pd.DataFrame(filas).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
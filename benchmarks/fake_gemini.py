@@ -0,0 +1,46 @@
+"""
+Modelo falso con la misma interfaz que genai.GenerativeModel.generate_content.
+Permite probar streaming, plazos y caché sin red ni API key.
+"""
+import time
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    def __init__(self, respuesta="Respuesta de prueba.", chunk_size=20,
+                 first_token_delay=0.0, chunk_delay=0.0, error=None):
+        """
+        respuesta: texto fijo o función prompt -> texto.
+        first_token_delay / chunk_delay: latencias simuladas (segundos).
+        error: excepción a lanzar en cada llamada (para probar reintentos y fallbacks).
+        """
+        self.respuesta = respuesta
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.error = error
+        self.calls = 0
+
+    def _texto(self, prompt):
+        return self.respuesta(prompt) if callable(self.respuesta) else self.respuesta
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        texto = self._texto(prompt)
+        if stream:
+            return self._chunks(texto)
+        time.sleep(self.first_token_delay + self.chunk_delay * (len(texto) // max(1, self.chunk_size)))
+        return _FakeResponse(texto)
+
+    def _chunks(self, texto):
+        time.sleep(self.first_token_delay)
+        for i in range(0, len(texto), self.chunk_size):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield _FakeResponse(texto[i:i + self.chunk_size])
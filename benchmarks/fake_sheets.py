@@ -0,0 +1,105 @@
+"""
+Spreadsheet falso con la interfaz de gspread que usa SheetsConnector.
+Permite medir y probar lectura, escritura y snapshots sin red ni credenciales.
+"""
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import fill_gaps, numericise_all, to_records
+
+from utils.sheets_connector import sin_celdas_vacias
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, values):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self._values = [list(map(str, fila)) for fila in values]
+
+    def get_all_values(self):
+        self.spreadsheet._llamada()
+        return [list(fila) for fila in self._values]
+
+    def get_all_records(self):
+        """Igual que gspread: encabezado como llaves y valores numéricos convertidos."""
+        values = self.get_all_values()
+        if not values:
+            return []
+        values = fill_gaps(values)
+        return to_records(values[0], [numericise_all(fila) for fila in values[1:]])
+
+    def col_values(self, col):
+        self.spreadsheet._llamada()
+        columna = [fila[col - 1] if len(fila) >= col else '' for fila in self._values]
+        while columna and columna[-1] == '':
+            columna.pop()
+        return columna
+
+    def update(self, range_name=None, values=None):
+        """Soporta rangos de una celda inicial ('A21'), como add_row."""
+        self.spreadsheet._llamada()
+        fila = int(re.match(r'[A-Z]+(\d+)', range_name).group(1))
+        with self.spreadsheet._lock:
+            for i, valores in enumerate(values):
+                indice = fila - 1 + i
+                while len(self._values) <= indice:
+                    self._values.append([])
+                self._values[indice] = [str(v) for v in valores]
+            self.spreadsheet._modificado()
+        return {'updatedRange': f"{self.title}!{range_name}"}
+
+    def append_row(self, values, **kwargs):
+        self.update(range_name=f"A{len(self._values) + 1}", values=[values])
+
+    def append_rows(self, values, **kwargs):
+        self.update(range_name=f"A{len(self._values) + 1}", values=values)
+
+
+class FakeSpreadsheet:
+    def __init__(self, hojas=None, latencia=0.0):
+        """
+        hojas: {nombre: matriz de valores con encabezado en la primera fila}.
+        latencia: segundos simulados por llamada a la API.
+        """
+        self.latencia = latencia
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._hojas = {nombre: FakeWorksheet(self, nombre, valores) for nombre, valores in (hojas or {}).items()}
+        self._modificado()
+
+    def _llamada(self):
+        self.calls += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _modificado(self):
+        self._last_update = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def worksheet(self, title):
+        self._llamada()
+        if title not in self._hojas:
+            raise WorksheetNotFound(title)
+        return self._hojas[title]
+
+    def values_batch_get(self, ranges, params=None):
+        self._llamada()
+        respuesta = []
+        for rango in ranges:
+            nombre, _, celdas = rango.partition('!')
+            nombre = nombre.strip("'")
+            if nombre not in self._hojas:
+                raise WorksheetNotFound(nombre)
+            valores = self._hojas[nombre]._values
+            if celdas:
+                # Rangos 'A5:G' (filas desde la 5): como la API, sin celdas vacías al final
+                desde = int(re.match(r'[A-Z]+(\d+)', celdas).group(1))
+                valores = [sin_celdas_vacias(f) for f in valores[desde - 1:]]
+            respuesta.append({'range': rango, 'values': [list(f) for f in valores]})
+        return {'valueRanges': respuesta}
+
+    def get_lastUpdateTime(self):
+        self._llamada()
+        return self._last_update
@@ -0,0 +1,148 @@
+"""
+Suite de benchmarks sobre flotas sintéticas.
+Mide la limpieza de SheetsConnector.get_data (contra un spreadsheet falso),
+calcular_metricas_completas, priorizar_flota y la construcción de prompts de GeminiAnalyzer.
+Guarda los resultados en JSON para comparar entre commits.
+
+Uso:
+    python benchmarks/run_benchmarks.py --activos 10 1000 10000
+    python benchmarks/run_benchmarks.py --activos 50000 --eventos-por-activo 40 --repeat 1
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from synthetic_fleet import generar_flota, a_valores
+from fake_gemini import FakeGenerativeModel
+from fake_sheets import FakeSpreadsheet
+from utils.gemini_analyzer import GeminiAnalyzer
+from utils.lifecycle_calculator import LifecycleCalculator
+from utils.sheets_connector import SheetsConnector
+
+RESULTADOS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocido'
+
+
+def medir(fn, repeticiones):
+    """Ejecuta fn 'repeticiones' veces. Retorna (tiempos, último resultado)."""
+    tiempos = []
+    out = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        out = fn()
+        tiempos.append(time.perf_counter() - t0)
+    return tiempos, out
+
+
+def correr_escala(n_activos, eventos_por_activo, repeticiones, seed=0):
+    hojas = generar_flota(n_activos, eventos_por_activo, seed=seed)
+    spreadsheet = FakeSpreadsheet({nombre: a_valores(df) for nombre, df in hojas.items()})
+    conn = SheetsConnector(spreadsheet=spreadsheet)
+    calc = LifecycleCalculator()
+    analyzer = GeminiAnalyzer(api_key=None, model=FakeGenerativeModel())
+    n_eventos = len(hojas['Mantenimiento'])
+
+    resultados = []
+
+    def registrar(operacion, fn, reps=repeticiones):
+        tiempos, out = medir(fn, reps)
+        resultados.append({
+            'operacion': operacion, 'activos': n_activos, 'eventos': n_eventos, 'repeticiones': reps,
+            'min_s': min(tiempos), 'mediana_s': statistics.median(tiempos),
+        })
+        print(f"  {operacion:<38} min {min(tiempos) * 1000:10.1f} ms  mediana {statistics.median(tiempos) * 1000:10.1f} ms")
+        return out
+
+    # 1. Lectura + limpieza (sin snapshot: cada llamada lee y limpia)
+    df_a = registrar('get_data[Activos]', lambda: conn.get_data('Activos'))
+    df_m = registrar('get_data[Mantenimiento]', lambda: conn.get_data('Mantenimiento'))
+    df_c = conn.get_data('Costos_Referencia')
+    registrar('clean_data[Mantenimiento]',
+              lambda: SheetsConnector.clean_data('Mantenimiento', hojas['Mantenimiento']))
+
+    # 2. Métricas y priorización
+    df = registrar('calcular_metricas_completas', lambda: calc.calcular_metricas_completas(df_a, df_m, df_c))
+    registrar('priorizar_flota', lambda: calc.priorizar_flota(df))
+
+    # 3. Prompts (sin llamar al modelo)
+    activo = df.sort_values('health_score').iloc[0]
+    registrar('prompt_resumen_ejecutivo', lambda: analyzer.build_executive_summary_prompt(df, df_m, df_c))
+    registrar('prompt_activo', lambda: analyzer.build_asset_prompt(activo, df_m, df_c))
+    pregunta = f"¿Cuánto se gastó en {activo['id_activo']} en correctivos en {pd.Timestamp.now().year - 1}?"
+    # La primera consulta construye los índices del contexto; las siguientes los reutilizan
+    registrar('prompt_pregunta_inicial', lambda: analyzer.build_custom_query_prompt(df, df_m, df_c, pregunta), reps=1)
+    registrar('prompt_pregunta', lambda: analyzer.build_custom_query_prompt(df, df_m, df_c, pregunta))
+    return resultados
+
+
+def comparar(actual, anterior_path):
+    with open(anterior_path, encoding='utf-8') as f:
+        anterior = json.load(f)
+    previos = {(r['operacion'], r['activos'], r['eventos']): r for r in anterior['resultados']}
+    print(f"\nComparación con {anterior.get('commit')} ({anterior_path}):")
+    for r in actual['resultados']:
+        previo = previos.get((r['operacion'], r['activos'], r['eventos']))
+        if previo is None:
+            continue
+        ratio = r['min_s'] / previo['min_s'] if previo['min_s'] else float('nan')
+        marca = '⚠️ ' if ratio > 1.2 else '   '
+        print(f"{marca}{r['operacion']:<38} {r['activos']:>7} activos  {previo['min_s'] * 1000:9.1f} -> "
+              f"{r['min_s'] * 1000:9.1f} ms  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--activos', type=int, nargs='+', default=[10, 1_000, 10_000])
+    parser.add_argument('--eventos-por-activo', type=float, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Archivo JSON (por defecto results/<commit>.json)")
+    parser.add_argument('--compare', default=None, help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    commit = _commit()
+    salida = {
+        'commit': commit,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'eventos_por_activo': args.eventos_por_activo,
+        'resultados': [],
+    }
+    for n in args.activos:
+        print(f"Escala: {n:,} activos, ~{int(n * args.eventos_por_activo):,} eventos")
+        salida['resultados'] += correr_escala(n, args.eventos_por_activo, args.repeat, seed=args.seed)
+
+    path = args.output or os.path.join(RESULTADOS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados: {path}")
+
+    if args.compare:
+        comparar(salida, args.compare)
+
+
+if __name__ == '__main__':
+    main()
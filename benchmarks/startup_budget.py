@@ -0,0 +1,109 @@
+"""
+Presupuesto de arranque en frío de app.py.
+Renderiza la pantalla de login en un proceso nuevo (streamlit AppTest) con -X importtime,
+reporta el tiempo de importación por paquete y falla si:
+  - el render del login supera el presupuesto, o
+  - el login carga alguna dependencia pesada que debe ser diferida (DIFERIDOS).
+
+Uso:
+    python benchmarks/startup_budget.py
+    python benchmarks/startup_budget.py --presupuesto 1.5 --top 25
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app.py')
+
+# Segundos permitidos para importar streamlit y renderizar el login
+PRESUPUESTO_LOGIN_S = 2.0
+
+# Dependencias que el login no debe cargar (se importan después de autenticar o por vista)
+DIFERIDOS = ['pandas', 'numpy', 'plotly', 'gspread', 'google.oauth2.service_account', 'google.generativeai', 'pytz']
+
+_RENDER_LOGIN = """
+import json, sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=60)
+at.secrets['GOOGLE_SHEET_ID'] = 'presupuesto-arranque'
+at.run()
+print(json.dumps({{
+    'segundos': time.perf_counter() - inicio,
+    'errores': [str(e.value) for e in at.exception],
+    'campos_login': len(at.text_input),
+    'diferidos_cargados': [m for m in {diferidos!r} if m in sys.modules],
+}}))
+"""
+
+
+def _importtime(stderr):
+    """Parsea la salida de -X importtime -> {paquete raíz: segundos propios sumados}."""
+    por_paquete = defaultdict(float)
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, _, nombre = linea.split('|')
+        por_paquete[nombre.strip().split('.')[0]] += int(propio.split(':')[1]) / 1e6
+    return dict(por_paquete)
+
+
+def medir_login():
+    codigo = _RENDER_LOGIN.format(app=os.path.abspath(APP), diferidos=DIFERIDOS)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(APP)))
+    salida = [l for l in proc.stdout.splitlines() if l.startswith('{')]
+    if proc.returncode != 0 or not salida:
+        raise RuntimeError(f"No se pudo renderizar el login:\n{proc.stderr[-2000:]}")
+    return json.loads(salida[-1]), _importtime(proc.stderr)
+
+
+def costo_diferidos():
+    """Tiempo de importar cada dependencia diferida por separado (lo que el login se ahorra)."""
+    costos = {}
+    for modulo in DIFERIDOS:
+        proc = subprocess.run([sys.executable, '-c',
+                               f"import time; t = time.perf_counter(); import {modulo}; print(time.perf_counter() - t)"],
+                              capture_output=True, text=True)
+        costos[modulo] = float(proc.stdout.strip()) if proc.returncode == 0 else None
+    return costos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--presupuesto', type=float, default=PRESUPUESTO_LOGIN_S,
+                        help="Segundos máximos para renderizar el login")
+    parser.add_argument('--top', type=int, default=15, help="Paquetes a mostrar en el reporte de importación")
+    args = parser.parse_args()
+
+    resultado, por_paquete = medir_login()
+    print(f"Importación por paquete (login, total {sum(por_paquete.values()):.3f} s):")
+    for paquete, segundos in sorted(por_paquete.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"  {paquete:<30} {segundos * 1000:9.1f} ms")
+
+    print("\nDiferidas (costo de importarlas en frío, fuera del login):")
+    for modulo, segundos in costo_diferidos().items():
+        print(f"  {modulo:<30} {'no instalado' if segundos is None else f'{segundos * 1000:9.1f} ms'}")
+
+    print(f"\nLogin renderizado en {resultado['segundos']:.3f} s (presupuesto {args.presupuesto:.3f} s)")
+    fallas = []
+    if resultado['errores']:
+        fallas.append(f"el script lanzó excepciones: {resultado['errores']}")
+    if not resultado['campos_login']:
+        fallas.append("no se renderizó el formulario de login")
+    if resultado['diferidos_cargados']:
+        fallas.append(f"el login cargó dependencias diferidas: {resultado['diferidos_cargados']}")
+    if resultado['segundos'] > args.presupuesto:
+        fallas.append(f"el login tardó {resultado['segundos']:.3f} s (> {args.presupuesto:.3f} s)")
+    for falla in fallas:
+        print(f"❌ {falla}")
+    if fallas:
+        sys.exit(1)
+    print("✅ Dentro del presupuesto")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Generador de flotas sintéticas con los esquemas de "Activos", "Mantenimiento" y "Costos_Referencia".
+Los valores salen como los entrega Sheets: textos, con parte de los montos en formato CLP ($1.234.567).
+
+Uso:
+    python benchmarks/synthetic_fleet.py --activos 1000 --eventos-por-activo 40
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from utils.sheets_connector import COLUMNAS_HOJAS
+
+TIPOS_EQUIPO = {
+    # tipo: (prefijo, vida útil horas, costo hora, costo día parada, valor compra base)
+    'Camión Tolva': ('TOL', 20000, 45000, 900000, 180_000_000),
+    'Excavadora': ('EXC', 15000, 60000, 1_200_000, 250_000_000),
+    'Cargador': ('CAR', 16000, 50000, 1_000_000, 200_000_000),
+    'Mixer': ('MIX', 18000, 40000, 800_000, 150_000_000),
+    'Retroexcavadora': ('RET', 12000, 35000, 600_000, 90_000_000),
+}
+MARCAS = ['Caterpillar', 'Komatsu', 'Volvo', 'Mercedes-Benz', 'JCB', 'Liebherr']
+DESCRIPCIONES = {
+    'Preventivo': ['Cambio aceite y filtros', 'Engrase general', 'Inspección 500 hrs', 'Cambio neumáticos'],
+    'Correctivo': ['Falla hidráulica', 'Reparación motor', 'Cambio bomba', 'Falla eléctrica', 'Rotura manguera'],
+    'Predictivo': ['Análisis de aceite', 'Termografía', 'Análisis de vibraciones'],
+}
+PROB_TIPOS_MANT = {'Preventivo': 0.55, 'Correctivo': 0.30, 'Predictivo': 0.15}
+
+
+def _formato_clp(valores, rng, fraccion_texto=0.3):
+    """Mezcla números y textos '$1.234.567' como quedan en una hoja con formato moneda."""
+    enteros = np.asarray(valores).astype(np.int64)
+    salida = enteros.astype(object)
+    como_texto = rng.random(len(salida)) < fraccion_texto
+    salida[como_texto] = [f"${v:,}".replace(',', '.') for v in enteros[como_texto]]
+    return salida
+
+
+def generar_flota(n_activos=100, eventos_por_activo=40, n_eventos=None, seed=0, anio_actual=None):
+    """
+    Retorna {nombre_hoja: DataFrame crudo} con las columnas de COLUMNAS_HOJAS.
+    n_eventos: total de registros de mantenimiento (por defecto n_activos * eventos_por_activo).
+    """
+    rng = np.random.default_rng(seed)
+    anio_actual = anio_actual or pd.Timestamp.now().year
+    n_eventos = int(n_eventos if n_eventos is not None else n_activos * eventos_por_activo)
+    tipos = list(TIPOS_EQUIPO)
+
+    # --- ACTIVOS ---
+    tipo_activo = rng.choice(tipos, n_activos)
+    prefijos = np.array([TIPOS_EQUIPO[t][0] for t in tipo_activo])
+    ids = np.char.add(np.char.add(prefijos, '-'), np.char.zfill(np.arange(1, n_activos + 1).astype(str), 5))
+    edad = rng.integers(0, 20, n_activos)
+    horas_anuales = rng.normal(1500, 500, n_activos).clip(200, 4000)
+    valor_base = np.array([TIPOS_EQUIPO[t][4] for t in tipo_activo], dtype=float)
+    valor_compra = (valor_base * rng.uniform(0.8, 1.2, n_activos)).round(-3)
+    valor_residual = (valor_compra * np.exp(-0.15 * edad) * rng.uniform(0.8, 1.1, n_activos)).round(-3)
+    activos = pd.DataFrame({
+        'id_activo': ids,
+        'tipo_equipo': tipo_activo,
+        'marca': rng.choice(MARCAS, n_activos),
+        'modelo': np.char.add('M', rng.integers(100, 999, n_activos).astype(str)),
+        'ano_compra': anio_actual - edad,
+        'horometro_actual': (horas_anuales * np.maximum(edad, 0.5)).round(0).astype(int),
+        'valor_compra': _formato_clp(valor_compra, rng),
+        'valor_residual_estimado': _formato_clp(valor_residual, rng),
+    })[COLUMNAS_HOJAS['Activos']]
+
+    # --- MANTENIMIENTO ---
+    # Activos más viejos y más usados acumulan más eventos
+    peso = (edad + 1) * horas_anuales
+    activo_evento = rng.choice(n_activos, n_eventos, p=peso / peso.sum())
+    tipo_mant = rng.choice(list(PROB_TIPOS_MANT), n_eventos, p=list(PROB_TIPOS_MANT.values()))
+    es_correctivo = tipo_mant == 'Correctivo'
+    dias_atras = (rng.random(n_eventos) * (edad[activo_evento] + 1) * 365).astype(int)
+    fechas = pd.Timestamp.now().normalize() - pd.to_timedelta(dias_atras, unit='D')
+    repuestos = np.where(es_correctivo, rng.lognormal(14.0, 0.8, n_eventos), rng.lognormal(12.5, 0.6, n_eventos))
+    mano_obra = repuestos * rng.uniform(0.2, 0.6, n_eventos)
+    descripciones = np.empty(n_eventos, dtype=object)
+    for tipo, opciones in DESCRIPCIONES.items():
+        mask = tipo_mant == tipo
+        descripciones[mask] = rng.choice(opciones, int(mask.sum()))
+    mantenimiento = pd.DataFrame({
+        'id_activo': ids[activo_evento],
+        'fecha': fechas.strftime('%Y-%m-%d'),
+        'tipo_mantenimiento': tipo_mant,
+        'descripcion': descripciones,
+        'costo_repuestos': _formato_clp(repuestos.round(-2), rng),
+        'costo_mano_obra': _formato_clp(mano_obra.round(-2), rng),
+        'horas_parada': np.where(es_correctivo, rng.integers(4, 72, n_eventos), rng.integers(0, 8, n_eventos)),
+    })[COLUMNAS_HOJAS['Mantenimiento']]
+
+    # --- COSTOS DE REFERENCIA ---
+    costos = pd.DataFrame([
+        {'tipo_equipo': t, 'costo_hora_operacion': v[2], 'costo_dia_parada': v[3],
+         'vida_util_esperada_horas': v[1], 'tasa_depreciacion_anual': 0.15}
+        for t, v in TIPOS_EQUIPO.items()
+    ])[COLUMNAS_HOJAS['Costos_Referencia']]
+
+    return {'Activos': activos, 'Mantenimiento': mantenimiento, 'Costos_Referencia': costos}
+
+
+def a_valores(df):
+    """DataFrame -> matriz de textos con encabezado (como values_batch_get / get_all_values)."""
+    return [list(df.columns)] + df.astype(str).to_numpy().tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--activos', type=int, default=100)
+    parser.add_argument('--eventos-por-activo', type=float, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="Carpeta donde escribir un CSV por hoja")
+    args = parser.parse_args()
+
+    hojas = generar_flota(args.activos, args.eventos_por_activo, seed=args.seed)
+    for nombre, df in hojas.items():
+        print(f"{nombre}: {len(df):,} filas")
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            df.to_csv(os.path.join(args.output, f"{nombre}.csv"), index=False)
+
+
+if __name__ == '__main__':
+    main()
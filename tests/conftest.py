@@ -0,0 +1,30 @@
+"""
+Fixtures compartidas: flota sintética limpia y leída a través de SheetsConnector (sin red).
+"""
+import os
+import sys
+import warnings
+
+import pytest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [RAIZ, os.path.join(RAIZ, 'benchmarks')]
+
+from fake_sheets import FakeSpreadsheet
+from synthetic_fleet import a_valores, generar_flota
+from utils.sheets_connector import SheetsConnector
+
+HOJAS = ["Activos", "Mantenimiento", "Costos_Referencia"]
+
+
+def spreadsheet_sintetico(n_activos=200, eventos_por_activo=20, seed=0, **kwargs):
+    hojas = generar_flota(n_activos, eventos_por_activo, seed=seed)
+    return FakeSpreadsheet({nombre: a_valores(df) for nombre, df in hojas.items()}, **kwargs)
+
+
+@pytest.fixture(scope='session')
+def flota():
+    """{hoja: DataFrame limpio} de 200 activos y ~4000 mantenimientos."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return SheetsConnector(spreadsheet=spreadsheet_sintetico()).get_many(HOJAS)
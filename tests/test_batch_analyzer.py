@@ -0,0 +1,68 @@
+"""Análisis por lote en segundo plano con un modelo falso (sin red)."""
+import time
+
+import pandas as pd
+
+from fake_gemini import FakeGenerativeModel
+from utils.batch_analyzer import BatchAnalyzer
+from utils.gemini_analyzer import GeminiAnalyzer
+from utils.lifecycle_calculator import LifecycleCalculator
+
+
+def _esperar(trabajo, plazo=30):
+    limite = time.monotonic() + plazo
+    while not trabajo.terminado and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert trabajo.terminado
+
+
+def test_lote_en_segundo_plano_y_cache(flota, tmp_path):
+    df = LifecycleCalculator().calcular_metricas_completas(
+        flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"])
+    ids = df['id_activo'].tolist()[:8]
+    modelo = FakeGenerativeModel(lambda prompt: f"Análisis ({len(prompt)})")
+    batch = BatchAnalyzer(GeminiAnalyzer(api_key=None, model=modelo), max_workers=4, requests_per_minute=6000)
+
+    ruta = tmp_path / "reporte.md"
+    trabajo = batch.iniciar(df, flota["Mantenimiento"], flota["Costos_Referencia"], ids=ids, output_path=str(ruta))
+    _esperar(trabajo)
+    resultados = trabajo.df_resultados()
+    assert trabajo.total == 8 and sorted(resultados['id_activo']) == sorted(ids)
+    assert (resultados['estado'] == 'ok').all() and modelo.calls == 8
+    assert trabajo.ruta == str(ruta) and ruta.exists()
+
+    # Segunda vez: todo sale de la caché del analizador, sin llamar al modelo
+    trabajo = batch.iniciar(df, flota["Mantenimiento"], flota["Costos_Referencia"], ids=ids)
+    _esperar(trabajo)
+    assert (trabajo.df_resultados()['estado'] == 'cache').all() and modelo.calls == 8
+
+
+def test_lote_reintenta_y_reporta_error(flota):
+    df = LifecycleCalculator().calcular_metricas_completas(
+        flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"])
+    modelo = FakeGenerativeModel(error=RuntimeError("cuota agotada"))
+    batch = BatchAnalyzer(GeminiAnalyzer(api_key=None, model=modelo), max_workers=2,
+                          requests_per_minute=6000, max_retries=2, backoff_base=0)
+    trabajo = batch.iniciar(df, flota["Mantenimiento"], flota["Costos_Referencia"], ids=df['id_activo'][:2])
+    _esperar(trabajo)
+    resultados = trabajo.df_resultados()
+    assert (resultados['estado'] == 'error').all()
+    assert (resultados['intentos'] == 3).all() and modelo.calls == 6
+    assert resultados['error'].str.contains("cuota agotada").all()
+
+
+def test_reporte_sin_resultados(flota, tmp_path):
+    vacio = pd.DataFrame()
+    reporte = BatchAnalyzer.reporte_markdown(vacio)
+    assert reporte.startswith("# Análisis IA de Flota")
+    assert "Activos: 0 | Exitosos: 0 | Con error: 0" in reporte
+
+    # Selección vacía de punta a punta: el lote termina sin error y escribe el reporte
+    modelo = FakeGenerativeModel(lambda prompt: "Análisis")
+    batch = BatchAnalyzer(GeminiAnalyzer(api_key=None, model=modelo))
+    ruta = tmp_path / "reporte.md"
+    trabajo = batch.iniciar(flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"], ids=[],
+                            output_path=str(ruta))
+    _esperar(trabajo)
+    assert trabajo.error is None and trabajo.df_resultados().empty
+    assert "Activos: 0" in ruta.read_text(encoding='utf-8') and modelo.calls == 0
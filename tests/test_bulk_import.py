@@ -0,0 +1,153 @@
+"""Importación masiva: parseo de números del archivo, validación y descarte de duplicados."""
+import io
+
+import pandas as pd
+import pytest
+
+from fake_sheets import FakeSpreadsheet
+from utils import bulk_import
+from utils.bulk_import import BulkImporter, LlavesImportadas
+from utils.sheets_connector import COLUMNAS_HOJAS, SheetsConnector
+
+ENCABEZADO = COLUMNAS_HOJAS['Mantenimiento']
+
+
+@pytest.fixture(autouse=True)
+def llaves_limpias(monkeypatch):
+    monkeypatch.setattr(bulk_import, '_llaves_importadas', LlavesImportadas())
+
+
+@pytest.fixture
+def hoja():
+    return FakeSpreadsheet({'Mantenimiento': [ENCABEZADO]})
+
+
+def _csv(filas, sep=','):
+    texto = sep.join(ENCABEZADO) + "\n" + "\n".join(sep.join(f) for f in filas) + "\n"
+    return io.BytesIO(texto.encode('utf-8'))
+
+
+def _importar(hoja, archivo, existentes=None, **kwargs):
+    conector = SheetsConnector(spreadsheet=hoja)
+    if existentes is None:
+        existentes = pd.DataFrame(columns=ENCABEZADO)
+    importador = BulkImporter(conector, registros_existentes=existentes, **kwargs)
+    return importador.importar(archivo, 'historial.csv')
+
+
+def _escritas(hoja):
+    return SheetsConnector.clean_data('Mantenimiento', pd.DataFrame(hoja._hojas['Mantenimiento']._values[1:],
+                                                                    columns=ENCABEZADO))
+
+
+def test_horas_con_punto_decimal(hoja):
+    resultado = _importar(hoja, _csv([['TOL-01', '2026-01-15', 'Correctivo', 'Bomba', '1234.50', '800', '2.5']]))
+    assert resultado['completo'] and resultado['importadas'] == 1
+    fila = hoja._hojas['Mantenimiento']._values[1]
+    assert fila[4:] == ['1234.5', '800', '2.5']
+
+
+def test_horas_con_coma_decimal_y_separador_punto_y_coma(hoja):
+    resultado = _importar(hoja, _csv([['TOL-01', '15/01/2026', 'preventivo', '', '$1.234.567', '1.500', '2,5']],
+                                     sep=';'))
+    assert resultado['importadas'] == 1
+    fila = hoja._hojas['Mantenimiento']._values[1]
+    assert fila == ['TOL-01', '15/01/2026', 'Preventivo', '', '1234567', '1500', '2.5']
+
+
+def test_filas_invalidas_se_reportan_con_su_numero(hoja):
+    archivo = _csv([
+        ['TOL-01', '2026-01-15', 'Correctivo', '', '1000', '0', '1'],
+        ['', '2026-01-15', 'Correctivo', '', '1000', '0', '1'],
+        ['TOL-01', 'ayer', 'Correctivo', '', '1000', '0', '1'],
+        ['TOL-01', '2026-01-15', 'Limpieza', '', '1000', '0', '1'],
+        ['TOL-01', '2026-01-15', 'Correctivo', '', 'mil', '0', '1'],
+        ['TOL-01', '2026-01-15', 'Correctivo', '', '1000', '0', '-2'],
+        ['', '', '', '', '', '', ''],
+        ['XXX-99', '2026-01-15', 'Correctivo', '', '1000', '0', '1'],
+    ])
+    resultado = _importar(hoja, archivo, activos_validos=['TOL-01'])
+    assert resultado['importadas'] == 1
+    assert [(e['fila'], e['motivo']) for e in resultado['errores']] == [
+        (3, "id_activo vacío"),
+        (4, "fecha inválida"),
+        (5, "tipo_mantenimiento debe ser Preventivo, Correctivo, Predictivo"),
+        (6, "costo_repuestos no es numérico"),
+        (7, "horas_parada negativo"),
+        (9, "id_activo no existe en Activos"),
+    ]
+
+
+def test_reimportar_antes_del_refresco_no_duplica(hoja):
+    filas = [['TOL-01', '2026-01-15', 'Correctivo', '', '$1.000', '500', '2,5'],
+             ['TOL-02', '2026-01-16', 'Preventivo', '', '2000', '0', '1'],
+             ['TOL-02', '2026-01-16', 'Preventivo', 'repetida en el archivo', '2000', '0', '1']]
+    primero = _importar(hoja, _csv(filas, sep=';'))
+    assert (primero['importadas'], primero['duplicadas']) == (2, 1)
+
+    # El snapshot de la app aún no trae lo escrito: se sigue pasando el frame anterior
+    segundo = _importar(hoja, _csv(filas, sep=';'))
+    assert (segundo['importadas'], segundo['duplicadas']) == (0, 3)
+    assert len(hoja._hojas['Mantenimiento']._values) == 3
+
+    # Con un snapshot que ya trae las filas, las llaves compartidas se olvidan
+    tercero = _importar(hoja, _csv(filas, sep=';'), existentes=_escritas(hoja))
+    assert (tercero['importadas'], tercero['duplicadas']) == (0, 3)
+    assert len(bulk_import.get_llaves_importadas()) == 0
+
+
+def test_fechas_numericas_se_rechazan(hoja):
+    # Una celda numérica no es una fecha (pd.to_datetime la tomaría como segundos desde 1970)
+    bloque = pd.DataFrame({
+        'id_activo': ['TOL-01'] * 3,
+        'fecha': [45000, pd.Timestamp(2026, 1, 15).to_pydatetime(), 20260115.0],
+        'tipo_mantenimiento': ['Correctivo'] * 3,
+        'costo_repuestos': [1000] * 3, 'costo_mano_obra': [0] * 3, 'horas_parada': [1] * 3,
+        'fila_origen': [2, 3, 4],
+    }, dtype=object)
+    importador = BulkImporter(SheetsConnector(spreadsheet=hoja), registros_existentes=pd.DataFrame(columns=ENCABEZADO))
+    limpio, errores = importador.validar_bloque(bloque)
+    assert limpio['fecha'].tolist() == [pd.Timestamp(2026, 1, 15)]
+    assert [(e['fila'], e['motivo']) for e in errores] == [(2, "fecha inválida"), (4, "fecha inválida")]
+
+
+def test_reintento_no_duplica_un_lote_ya_escrito(hoja, monkeypatch):
+    monkeypatch.setattr(bulk_import.time, 'sleep', lambda s: None)
+    conector = SheetsConnector(spreadsheet=hoja)
+    original = conector.append_rows
+    intentos = []
+
+    def timeout_tras_escribir(worksheet_name, rows):
+        intentos.append(len(rows))
+        original(worksheet_name, rows)
+        if len(intentos) == 1:
+            raise TimeoutError("sin respuesta del servidor")
+
+    monkeypatch.setattr(conector, 'append_rows', timeout_tras_escribir)
+    filas = [['TOL-01', '2026-01-15', 'Correctivo', '', '1000', '0', '1'],
+             ['TOL-02', '2026-01-16', 'Preventivo', '', '2000', '0', '3']]
+    importador = BulkImporter(conector, registros_existentes=pd.DataFrame(columns=ENCABEZADO))
+    resultado = importador.importar(_csv(filas), 'historial.csv')
+    assert resultado['completo'] and resultado['importadas'] == 2
+    assert intentos == [2]
+    assert len(hoja._hojas['Mantenimiento']._values) == 3
+
+
+def test_reintento_reenvia_si_el_lote_no_llego(hoja, monkeypatch):
+    monkeypatch.setattr(bulk_import.time, 'sleep', lambda s: None)
+    conector = SheetsConnector(spreadsheet=hoja)
+    original = conector.append_rows
+    intentos = []
+
+    def falla_una_vez(worksheet_name, rows):
+        intentos.append(len(rows))
+        if len(intentos) == 1:
+            raise ConnectionError("429 cuota excedida")
+        original(worksheet_name, rows)
+
+    monkeypatch.setattr(conector, 'append_rows', falla_una_vez)
+    filas = [['TOL-01', '2026-01-15', 'Correctivo', '', '1000', '0', '1']]
+    importador = BulkImporter(conector, registros_existentes=pd.DataFrame(columns=ENCABEZADO))
+    assert importador.importar(_csv(filas), 'historial.csv')['importadas'] == 1
+    assert intentos == [1, 1]
+    assert len(hoja._hojas['Mantenimiento']._values) == 2
@@ -0,0 +1,114 @@
+"""CostTimeIndex: sumas por ventana contra un groupby directo sobre el historial."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cost_index import CostTimeIndex
+from utils.lifecycle_calculator import VENTANA_COSTO_MESES
+
+REFERENCIA = pd.Timestamp('2024-06-15')
+
+
+def _naive(df, ids, desde, hasta):
+    """Suma por activo con máscara y groupby, sin índice."""
+    fecha = df['fecha'].dt.normalize()
+    en_ventana = df[(fecha >= desde) & (fecha <= hasta)]
+    suma = en_ventana.groupby('id_activo')['costo_mantenimiento'].sum()
+    return suma.reindex(ids, fill_value=0.0).astype(float)
+
+
+def _historial(n=3000, n_activos=40, seed=1):
+    rng = np.random.default_rng(seed)
+    fechas = pd.Timestamp('2018-01-01') + pd.to_timedelta(rng.integers(0, 365 * 8, n), unit='D')
+    return pd.DataFrame({
+        'id_activo': rng.choice([f"EXC-{i:05d}" for i in range(n_activos)], n),
+        'fecha': fechas,
+        'costo_mantenimiento': rng.integers(1, 500, n).astype(float) * 1000,
+    })
+
+
+def test_ventana_de_flota_igual_a_groupby():
+    df = _historial()
+    ids = sorted(df['id_activo'].unique())
+    indice = CostTimeIndex.desde_mantenimiento(df)
+    desde, hasta = CostTimeIndex.rango_ventana(VENTANA_COSTO_MESES, REFERENCIA)
+    pd.testing.assert_series_equal(indice.costos_ventana(ids, meses=VENTANA_COSTO_MESES, referencia=REFERENCIA),
+                                   _naive(df, ids, desde, hasta), check_names=False, check_index_type=False)
+
+
+def test_entrada_desordenada_da_lo_mismo():
+    df = _historial()
+    ids = sorted(df['id_activo'].unique())
+    ordenado = CostTimeIndex.desde_mantenimiento(df.sort_values(['id_activo', 'fecha']))
+    desordenado = CostTimeIndex.desde_mantenimiento(df.sample(frac=1, random_state=3))
+    np.testing.assert_allclose(desordenado.costos_ventana(ids, referencia=REFERENCIA).to_numpy(),
+                               ordenado.costos_ventana(ids, referencia=REFERENCIA).to_numpy())
+
+
+def test_bordes_de_la_ventana_son_inclusivos():
+    desde, hasta = CostTimeIndex.rango_ventana(12, REFERENCIA)
+    assert (desde, hasta) == (pd.Timestamp('2023-06-16'), pd.Timestamp('2024-06-15'))
+    df = pd.DataFrame({
+        'id_activo': ['A'] * 5,
+        'fecha': pd.to_datetime(['2023-06-15', '2023-06-16', '2024-01-01', '2024-06-15 18:30', '2024-06-16'],
+                                format='ISO8601'),
+        'costo_mantenimiento': [1.0, 10.0, 100.0, 1000.0, 10000.0],
+    })
+    indice = CostTimeIndex.desde_mantenimiento(df)
+    # Fuera: el día anterior a 'desde' y el posterior a 'hasta'; la hora no saca al registro del día
+    assert indice.costo('A', desde, hasta) == 1110.0
+    assert indice.costos_ventana(['A'], meses=12, referencia=REFERENCIA).iloc[0] == 1110.0
+    assert indice.costo('A', hasta=pd.Timestamp('2023-06-15')) == 1.0
+    assert indice.costo('A', desde=pd.Timestamp('2024-06-16')) == 10000.0
+
+
+def test_ventana_no_invade_al_activo_vecino():
+    # Activos adyacentes en la llave compuesta, con eventos en los extremos del historial
+    df = pd.DataFrame({
+        'id_activo': ['A', 'A', 'B', 'B'],
+        'fecha': pd.to_datetime(['2020-01-01', '2024-12-31', '2020-01-01', '2024-12-31']),
+        'costo_mantenimiento': [1.0, 2.0, 4.0, 8.0],
+    })
+    indice = CostTimeIndex.desde_mantenimiento(df)
+    amplio = indice.costos_ventana(['A', 'B'], desde=pd.Timestamp('1990-01-01'), hasta=pd.Timestamp('2030-01-01'))
+    assert amplio.tolist() == [3.0, 12.0]
+    assert indice.costos_ventana(['A', 'B'], desde=pd.Timestamp('2025-01-01')).tolist() == [0.0, 0.0]
+    assert indice.costos_ventana(['A', 'B'], hasta=pd.Timestamp('2019-12-31')).tolist() == [0.0, 0.0]
+
+
+def test_activos_sin_eventos_quedan_en_cero():
+    df = _historial(n=200, n_activos=5)
+    indice = CostTimeIndex.desde_mantenimiento(df)
+    ids = ['NO-EXISTE', 'EXC-00000', 'OTRO']
+    resultado = indice.costos_ventana(ids, referencia=REFERENCIA)
+    assert resultado.index.tolist() == ids
+    assert resultado['NO-EXISTE'] == 0.0 and resultado['OTRO'] == 0.0
+    desde, hasta = CostTimeIndex.rango_ventana(12, REFERENCIA)
+    assert resultado['EXC-00000'] == _naive(df, ['EXC-00000'], desde, hasta).iloc[0]
+
+
+def test_indice_vacio():
+    vacio = CostTimeIndex.desde_mantenimiento(pd.DataFrame(columns=['id_activo', 'fecha', 'costo_mantenimiento']))
+    assert len(vacio) == 0
+    assert vacio.costos_ventana(['A', 'B'], referencia=REFERENCIA).tolist() == [0.0, 0.0]
+
+
+def test_fechas_nat_no_entran_en_ninguna_ventana():
+    df = _historial(n=500, n_activos=8)
+    df.loc[df.sample(frac=0.2, random_state=0).index, 'fecha'] = pd.NaT
+    ids = sorted(df['id_activo'].unique())
+    indice = CostTimeIndex.desde_mantenimiento(df)
+    assert len(indice) == df['fecha'].notna().sum()
+    todo = indice.costos_ventana(ids, desde=pd.Timestamp('1900-01-01'), hasta=pd.Timestamp('2100-01-01'))
+    esperado = df.dropna(subset=['fecha']).groupby('id_activo')['costo_mantenimiento'].sum().reindex(ids)
+    np.testing.assert_allclose(todo.to_numpy(), esperado.to_numpy())
+
+
+@pytest.mark.parametrize('referencia', ['2018-01-01', '2020-02-29', '2022-12-31', '2030-01-01'])
+def test_agregar_equivale_a_reconstruir(referencia):
+    df = _historial(n=1000)
+    ids = sorted(df['id_activo'].unique())
+    incremental = CostTimeIndex.desde_mantenimiento(df.iloc[:700]).agregar(df.iloc[700:])
+    desde, hasta = CostTimeIndex.rango_ventana(VENTANA_COSTO_MESES, referencia)
+    np.testing.assert_allclose(incremental.costos_ventana(ids, referencia=referencia).to_numpy(),
+                               _naive(df, ids, desde, hasta).to_numpy())
@@ -0,0 +1,36 @@
+"""Curvas de DegradationForecast por activo."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.degradation_forecast import EDADES_CURVA, DegradationForecast
+from utils.lifecycle_calculator import LifecycleCalculator
+
+
+def test_curva_con_id_repetido_es_la_primera_fila(flota):
+    df = LifecycleCalculator().calcular_metricas_completas(
+        flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"])
+    # El mismo id dos veces en Activos (ej: fila duplicada en la hoja), con otro horómetro
+    repetida = df.iloc[[0]].assign(horometro_actual=df['horometro_actual'].iloc[0] * 3)
+    df = pd.concat([df, repetida], ignore_index=True)
+    pronostico = DegradationForecast.desde_flota(df, flota["Costos_Referencia"])
+
+    edades, health = pronostico.curva(df['id_activo'].iloc[0])
+    assert health.shape == EDADES_CURVA.shape
+    assert (health == pronostico.curvas[0]).all()
+
+    with pytest.raises(KeyError):
+        pronostico.curva("NO-EXISTE")
+
+
+def test_proyeccion_usa_las_formulas_del_calculador(flota):
+    calc = LifecycleCalculator()
+    df = calc.calcular_metricas_completas(flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"])
+    pronostico = DegradationForecast.desde_flota(df, flota["Costos_Referencia"])
+    # Mes 0 = estado actual: el mismo health score de la flota
+    np.testing.assert_array_equal(pronostico.proyeccion[:, 0], df['health_score'].to_numpy())
+    # La proyección solo empeora con el tiempo (uso y edad crecen, confiabilidad fija)
+    assert (np.diff(pronostico.proyeccion, axis=1) <= 1e-9).all()
+    # Compartida entre sesiones: de solo lectura
+    with pytest.raises(ValueError):
+        pronostico.proyeccion[0, 0] = 0
@@ -0,0 +1,146 @@
+"""FleetRefresher: stale-while-revalidate sobre un Spreadsheet falso (sin red)."""
+import threading
+
+import pytest
+from conftest import HOJAS, spreadsheet_sintetico
+
+from utils.fleet_refresher import FleetRefresher
+from utils.sheets_connector import SheetsConnector
+
+
+@pytest.fixture
+def sin_hilo(monkeypatch):
+    # Los tests llaman refrescar() a mano, sin carreras con el hilo de refresco
+    monkeypatch.setattr(FleetRefresher, '_iniciar_hilo', lambda self: None)
+
+
+@pytest.fixture
+def hoja():
+    return spreadsheet_sintetico(n_activos=20, eventos_por_activo=5)
+
+
+class Conexion:
+    """conectar() que entrega el conector o falla a pedido."""
+    def __init__(self, hoja, cache_dir=None):
+        self.conector = SheetsConnector(spreadsheet=hoja, cache_dir=cache_dir)
+        self.falla = None
+
+    def __call__(self):
+        if self.falla is not None:
+            raise self.falla
+        return self.conector
+
+
+def _refresher(conexion, calculos, **kwargs):
+    def calcular(activos, mantenimiento, costos):
+        calculos.append(len(mantenimiento))
+        return {'activos': len(activos), 'eventos': len(mantenimiento)}
+    return FleetRefresher(conexion, calcular, hojas=HOJAS, version='v1', **kwargs)
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_primera_carga_es_sincronica(hoja):
+    calculos = []
+    refresher = _refresher(Conexion(hoja), calculos)
+    snapshot = refresher.obtener()
+    assert snapshot is not None
+    assert snapshot.metricas == {'activos': 20, 'eventos': 100}
+    assert refresher.obtener() is snapshot
+    assert calculos == [100]
+    assert refresher.estado()['ultimo_error'] is None
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_refresco_fallido_conserva_el_ultimo_snapshot(hoja):
+    conexion, calculos = Conexion(hoja), []
+    refresher = _refresher(conexion, calculos)
+    bueno = refresher.obtener()
+
+    conexion.falla = ConnectionError("cuota excedida")
+    assert refresher.refrescar() is False
+    assert refresher.obtener() is bueno
+    estado = refresher.estado()
+    assert estado['ultimo_error'] == "cuota excedida"
+    assert estado['refrescando'] is False
+    assert estado['ultimo_intento'] is not None
+
+    # El siguiente refresco bueno limpia el error
+    conexion.falla = None
+    assert refresher.refrescar() is True
+    assert refresher.estado()['ultimo_error'] is None
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_hoja_principal_vacia_no_reemplaza_el_snapshot(hoja):
+    refresher = _refresher(Conexion(hoja), [])
+    bueno = refresher.obtener()
+    hoja._hojas['Activos']._values = hoja._hojas['Activos']._values[:1]
+    assert refresher.refrescar() is False
+    assert refresher.obtener() is bueno
+    assert "Activos" in refresher.estado()['ultimo_error']
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_primera_carga_fallida_retorna_none(hoja):
+    conexion = Conexion(hoja)
+    conexion.falla = ConnectionError("sin red")
+    refresher = _refresher(conexion, [])
+    assert refresher.obtener() is None
+    assert refresher.estado()['cargado_en'] is None
+    assert refresher.estado()['ultimo_error'] == "sin red"
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_metricas_se_reutilizan_si_los_datos_no_cambian(hoja):
+    calculos = []
+    refresher = _refresher(Conexion(hoja), calculos)
+    primero = refresher.obtener()
+    assert refresher.refrescar() is True
+    segundo = refresher.obtener()
+    assert segundo is not primero
+    assert segundo.metricas is primero.metricas
+    assert calculos == [100]
+
+    # Un cambio en las hojas cambia la llave y recalcula
+    hoja._hojas['Mantenimiento']._values.append(list(hoja._hojas['Mantenimiento']._values[-1]))
+    assert refresher.refrescar() is True
+    assert refresher.obtener().huella != primero.huella
+    assert calculos == [100, 101]
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_cambio_de_revision(hoja, tmp_path):
+    conexion = Conexion(hoja, cache_dir=str(tmp_path))
+    refresher = _refresher(conexion, [])
+    snapshot = refresher.obtener()
+    assert snapshot.revision is not None
+    assert refresher._cambio_revision(snapshot) is False
+
+    hoja.worksheet('Mantenimiento').append_rows([list(hoja._hojas['Mantenimiento']._values[-1])])
+    conexion.conector._revision = None
+    assert refresher._cambio_revision(snapshot) is True
+
+    # Sin poder consultar la revisión no se fuerza un refresco
+    conexion.falla = ConnectionError("sin red")
+    assert refresher._cambio_revision(snapshot) is False
+
+
+def test_solicitar_refresca_en_segundo_plano(hoja):
+    conexion, calculos = Conexion(hoja), []
+    refresher = _refresher(conexion, calculos, intervalo_revision=60)
+    primero = refresher.obtener()
+
+    listo = threading.Event()
+    refrescar = refresher.refrescar
+    def refrescar_y_avisar(**kwargs):
+        try:
+            return refrescar(**kwargs)
+        finally:
+            listo.set()
+    refresher.refrescar = refrescar_y_avisar
+
+    hoja._hojas['Mantenimiento']._values.append(list(hoja._hojas['Mantenimiento']._values[-1]))
+    refresher.solicitar()
+    assert listo.wait(5)
+    assert refresher.obtener() is not primero
+    assert refresher.obtener().metricas['eventos'] == 101
@@ -0,0 +1,34 @@
+"""Caché y streaming de GeminiAnalyzer con un modelo falso (sin red)."""
+from fake_gemini import FakeGenerativeModel
+from utils.gemini_analyzer import GeminiAnalyzer
+from utils.response_cache import ResponseCache
+
+
+def _analyzer(modelo):
+    return GeminiAnalyzer(api_key=None, model=modelo, timeout=5, first_token_timeout=5)
+
+
+def test_stream_completo_queda_en_cache():
+    modelo = FakeGenerativeModel("Respuesta larga del modelo.", chunk_size=5)
+    analyzer = _analyzer(modelo)
+    assert "".join(analyzer._stream("prompt")) == "Respuesta larga del modelo."
+    assert "".join(analyzer._stream("prompt")) == "Respuesta larga del modelo."
+    assert modelo.calls == 1
+
+
+def test_stream_vacio_no_queda_en_cache():
+    modelo = FakeGenerativeModel("")
+    analyzer = _analyzer(modelo)
+    assert "".join(analyzer._stream("prompt")) == ""
+    assert analyzer.cache.get(ResponseCache.make_key("prompt", analyzer.model_name)) is None
+    modelo.respuesta = "Ahora sí."
+    assert "".join(analyzer._stream("prompt")) == "Ahora sí."
+    assert modelo.calls == 2
+
+
+def test_respuesta_vacia_no_queda_en_cache():
+    modelo = FakeGenerativeModel("")
+    analyzer = _analyzer(modelo)
+    assert analyzer._generate("prompt") == ""
+    modelo.respuesta = "Texto"
+    assert analyzer._generate("prompt") == "Texto"
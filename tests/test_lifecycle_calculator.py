@@ -0,0 +1,77 @@
+"""Paridad del cálculo columnar de la flota con la implementación fila a fila."""
+import numpy as np
+import pandas as pd
+
+from utils.lifecycle_calculator import LifecycleCalculator
+
+
+def test_scores_flota_iguales_a_fila_a_fila(flota):
+    calc = LifecycleCalculator()
+    activos, mant, costos = flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"]
+    df = calc.calcular_metricas_completas(activos, mant, costos)
+
+    esperado = [calc.calcular_health_score(fila, mant, costos) for _, fila in activos.iterrows()]
+    health = np.array([h for h, _ in esperado], dtype=float)
+    rul = np.array([r for _, r in esperado], dtype=float)
+
+    # np.power (SIMD) puede diferir del ** escalar en el último bit: tolerancia relativa, no igualdad exacta
+    np.testing.assert_allclose(df['health_score'].to_numpy(), health, rtol=1e-12, atol=0)
+    np.testing.assert_allclose(df['rul_horas'].to_numpy(dtype=float), rul, rtol=1e-12, atol=0)
+
+
+def recomendar_original(row):
+    """Copia congelada de recomendar_accion antes de la tabla de reglas (if/elif por fila)."""
+    health = row['health_score']
+    rul = row['rul_horas']
+    costo_mant = row.get('costo_mantencion_ultimo_ano', 0)
+    valor_residual = row['valor_residual_estimado']
+
+    if health < 40:
+        return ("🔴 REEMPLAZO CRÍTICO", "Confiabilidad comprometida y vida útil excedida",
+                f"Score ({health:.1f}%) bajo zona de seguridad. Alto riesgo de falla catastrófica.",
+                3, 1, valor_residual * 0.2 + costo_mant)
+    if health < 60:
+        if valor_residual > 0 and (costo_mant > valor_residual * 0.4):
+            return ("🟠 EVALUAR BAJA (ECONÓMICA)", "Costo de mantenimiento supera el 40% del valor residual",
+                    f"Gasto anual ${costo_mant:,.0f} vs Valor Residual ${valor_residual:,.0f}. No es rentable reparar.",
+                    6, 1, costo_mant)
+        return ("🟡 OVERHAUL / REPARACIÓN MAYOR", "Desgaste medio-alto. Requiere intervención para extender vida.",
+                f"RUL: {rul:.0f} hrs. Planificar reparación mayor.", 6, 2, costo_mant * 0.5)
+    if health < 85:
+        return ("🟢 MANTENIMIENTO PREVENTIVO", "Operación normal con desgaste esperado",
+                "Reforzar pautas preventivas según horómetro.", 12, 3, 0)
+    return ("✅ OPERACIÓN NORMAL", "Equipo en óptimas condiciones", "Sin acciones correctivas requeridas.", 24, 4, 0)
+
+
+def _columnas_accion(df):
+    return list(zip(df['accion'], df['razon'], df['detalle'], df['horizonte_meses'], df['prioridad'],
+                    df['impacto_economico_clp']))
+
+
+def test_acciones_flota_identicas_a_reglas_originales(flota):
+    calc = LifecycleCalculator()
+    costos = flota["Costos_Referencia"]
+    df = calc.calcular_metricas_completas(flota["Activos"], flota["Mantenimiento"], costos)
+
+    assert _columnas_accion(df) == [recomendar_original(fila) for _, fila in df.iterrows()]
+    # La muestra cubre más de una regla
+    assert df['accion'].nunique() > 1
+    # La versión de un activo también sigue las reglas originales
+    for _, fila in df.head(20).iterrows():
+        assert calc.recomendar_accion(fila, costos) == recomendar_original(fila)
+
+
+def test_acciones_en_bordes_y_todas_las_reglas():
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({
+        'health_score': rng.uniform(0, 100, n),
+        'rul_horas': rng.uniform(0, 20000, n),
+        'costo_mantencion_ultimo_ano': rng.uniform(0, 5e7, n),
+        'valor_residual_estimado': np.where(rng.random(n) < 0.1, 0, rng.uniform(0, 1e8, n)),
+    })
+    # Bordes exactos de los umbrales
+    df.loc[:3, 'health_score'] = [40, 60, 85, 39.999]
+    flota = LifecycleCalculator().recomendar_acciones_flota(df)
+    assert _columnas_accion(flota) == [recomendar_original(fila) for _, fila in df.iterrows()]
+    assert flota['prioridad'].nunique() == 4
@@ -0,0 +1,129 @@
+"""MaintenanceCube: cortes y roll-ups contra groupby/pivot_table sobre los mismos eventos."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.maintenance_cube import MEDIDAS, MaintenanceCube
+
+MEDIDAS_EVENTO = ['costo_repuestos', 'costo_mano_obra', 'costo_mantenimiento', 'horas_parada']
+
+
+@pytest.fixture(scope='module')
+def mant(flota):
+    return flota['Mantenimiento']
+
+
+@pytest.fixture(scope='module')
+def cubo(mant):
+    return MaintenanceCube.desde_mantenimiento(mant)
+
+
+def _suma(df, por):
+    """groupby directo: eventos (conteo) + medidas sumadas."""
+    g = df.groupby(por, sort=True, observed=True)
+    return g[MEDIDAS_EVENTO].sum().assign(eventos=g.size())[MEDIDAS]
+
+
+def _comparar(obtenido, esperado):
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False, check_names=False,
+                                  check_index_type=False, check_column_type=False, check_categorical=False)
+
+
+def test_total_general_igual_al_historial(cubo, mant):
+    total = cubo.totales()
+    assert total['eventos'] == len(mant)
+    for medida in MEDIDAS_EVENTO:
+        assert total[medida] == pytest.approx(mant[medida].sum())
+
+
+@pytest.mark.parametrize('por', ['id_activo', 'tipo_mantenimiento'])
+def test_roll_up_por_dimension(cubo, mant, por):
+    _comparar(cubo.totales(por), _suma(mant, por))
+
+
+def test_roll_up_por_anio_y_periodo(cubo, mant):
+    anual = _suma(mant.assign(anio=mant['fecha'].dt.year), 'anio')
+    _comparar(cubo.totales('anio'), anual)
+    mensual = _suma(mant.assign(periodo=mant['fecha'].dt.to_period('M')), 'periodo')
+    _comparar(cubo.totales('periodo'), mensual)
+    assert cubo.totales_anuales().to_dict() == anual['costo_mantenimiento'].to_dict()
+
+
+def test_pivot_activo_por_anio(cubo, mant):
+    por_celda = cubo.totales(['id_activo', 'anio'], ['costo_mantenimiento'])['costo_mantenimiento']
+    obtenido = por_celda.unstack(fill_value=0.0)
+    esperado = mant.assign(anio=mant['fecha'].dt.year).pivot_table(
+        index='id_activo', columns='anio', values='costo_mantenimiento', aggfunc='sum', fill_value=0.0,
+        observed=True)
+    _comparar(obtenido, esperado)
+
+
+def test_corte_por_activos_tipos_y_anios(cubo, mant):
+    activos = sorted(mant['id_activo'].unique())[:15]
+    anios = [2020, 2023]
+    sub = cubo.filtrar(activos=activos, tipos=['Correctivo'], anios=anios)
+    mask = (mant['id_activo'].isin(activos) & (mant['tipo_mantenimiento'] == 'Correctivo')
+            & mant['fecha'].dt.year.isin(anios))
+    _comparar(sub.totales('id_activo'), _suma(mant[mask], 'id_activo'))
+
+
+def test_corte_por_periodos_y_meses(cubo, mant):
+    fecha = mant['fecha']
+    periodos = [(2022, 3), (2024, 11)]
+    sub = cubo.filtrar(periodos=periodos)
+    mask = pd.Series(False, index=mant.index)
+    for a, m in periodos:
+        mask |= (fecha.dt.year == a) & (fecha.dt.month == m)
+    _comparar(sub.totales('tipo_mantenimiento'), _suma(mant[mask], 'tipo_mantenimiento'))
+
+    sub = cubo.filtrar(meses=[1, 7])
+    _comparar(sub.totales('anio'), _suma(mant[fecha.dt.month.isin([1, 7])].assign(anio=fecha.dt.year), 'anio'))
+
+
+def test_corte_por_rango_desde_hasta(cubo, mant):
+    sub = cubo.filtrar(desde='2021-04', hasta=pd.Timestamp('2023-02-17'))
+    periodo = mant['fecha'].dt.to_period('M')
+    mask = (periodo >= pd.Period('2021-04', 'M')) & (periodo <= pd.Period('2023-02', 'M'))
+    _comparar(sub.totales('id_activo'), _suma(mant[mask], 'id_activo'))
+
+
+def test_corte_vacio(cubo):
+    sub = cubo.filtrar(activos=['NO-EXISTE'])
+    assert sub.empty
+    assert sub.totales()['eventos'] == 0
+
+
+def test_por_activo_igual_a_groupby(cubo, mant):
+    correctivo = mant['tipo_mantenimiento'] == 'Correctivo'
+    g = mant.assign(
+        correctivo=correctivo.astype(int),
+        gasto_correctivo=mant['costo_mantenimiento'].where(correctivo, 0.0),
+    ).groupby('id_activo', observed=True)
+    esperado = pd.DataFrame({
+        'total_eventos': g.size(),
+        'eventos_correctivos': g['correctivo'].sum(),
+        'gasto_total': g['costo_mantenimiento'].sum(),
+        'gasto_correctivo': g['gasto_correctivo'].sum(),
+    })
+    _comparar(cubo.por_activo().sort_index(), esperado.sort_index())
+
+
+def test_registros_sin_fecha_cuentan_por_activo_pero_no_por_periodo():
+    df = pd.DataFrame({
+        'id_activo': ['A', 'A', 'B'],
+        'fecha': pd.to_datetime(['2024-01-05', None, '2024-02-01']),
+        'tipo_mantenimiento': ['Preventivo', 'Correctivo', 'Preventivo'],
+        'costo_repuestos': [10.0, 20.0, 40.0],
+        'costo_mano_obra': [1.0, 2.0, 4.0],
+    })
+    cubo = MaintenanceCube.desde_mantenimiento(df)
+    assert cubo.totales('id_activo')['costo_mantenimiento'].to_dict() == {'A': 33.0, 'B': 44.0}
+    assert cubo.totales_mensuales().tolist() == [11.0, 44.0]
+    assert cubo.filtrar(anios=[2024]).totales()['eventos'] == 2
+
+
+def test_agregar_equivale_a_reconstruir(mant):
+    incremental = MaintenanceCube.desde_mantenimiento(mant.iloc[:3000]).agregar(mant.iloc[3000:])
+    completo = MaintenanceCube.desde_mantenimiento(mant)
+    _comparar(incremental.totales(['id_activo', 'periodo']), completo.totales(['id_activo', 'periodo']))
+    assert np.array_equal(incremental.eventos_por_tipo().to_numpy(), completo.eventos_por_tipo().to_numpy())
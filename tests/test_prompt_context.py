@@ -0,0 +1,110 @@
+"""ContextBuilder: filtros de la pregunta, selección por índices y presupuesto de tokens."""
+import numpy as np
+import pandas as pd
+import pytest
+from fake_gemini import FakeGenerativeModel
+
+from utils.gemini_analyzer import GeminiAnalyzer
+from utils.prompt_context import RESERVA_PLANTILLA, ContextBuilder, estimar_tokens
+
+
+@pytest.fixture(scope='module')
+def builder(flota):
+    return ContextBuilder(flota['Mantenimiento'], flota['Activos'])
+
+
+def _tokens_prompt(question, resumen, detalle):
+    return estimar_tokens(question) + estimar_tokens(resumen) + estimar_tokens(detalle) + RESERVA_PLANTILLA
+
+
+def test_extrae_activo_anio_y_periodo(builder, flota):
+    activo = flota['Activos']['id_activo'].iloc[0]
+    filtros = builder.extraer_filtros(f"¿Cuánto costó el {activo.lower()} en marzo 2024 y en 2023?")
+    assert filtros['activos'] == [activo]
+    assert filtros['anios'] == [2023, 2024]
+    assert filtros['meses'] == [3]
+    assert filtros['periodos'] == [(2024, 3)]
+
+
+def test_extrae_tipo_de_equipo_y_mantenimiento(builder):
+    filtros = builder.extraer_filtros("mantenimientos correctivos de excavadoras")
+    assert filtros['tipos_equipo'] == ['excavadora']
+    assert filtros['tipos_mantenimiento'] == ['Correctivo']
+    assert filtros['activos'] == [] and filtros['anios'] == []
+
+
+def test_seleccion_igual_a_filtro_pandas(builder, flota):
+    mant = flota['Mantenimiento']
+    activo = flota['Activos']['id_activo'].iloc[3]
+    seleccion = builder.seleccionar(builder.extraer_filtros(f"correctivos de {activo} en 2022"))
+    esperado = np.flatnonzero((mant['id_activo'] == activo).to_numpy()
+                              & (mant['fecha'].dt.year == 2022).to_numpy()
+                              & (mant['tipo_mantenimiento'] == 'Correctivo').to_numpy())
+    np.testing.assert_array_equal(np.sort(seleccion), esperado)
+
+
+def test_seleccion_por_tipo_de_equipo_y_mes(builder, flota):
+    mant, activos = flota['Mantenimiento'], flota['Activos']
+    seleccion = builder.seleccionar(builder.extraer_filtros("gastos de cargadores en enero"))
+    ids = activos.loc[activos['tipo_equipo'] == 'Cargador', 'id_activo']
+    esperado = np.flatnonzero((mant['id_activo'].isin(ids) & (mant['fecha'].dt.month == 1)).to_numpy())
+    np.testing.assert_array_equal(np.sort(seleccion), esperado)
+
+
+def test_total_de_la_pregunta_calza_con_pandas(builder, flota):
+    mant = flota['Mantenimiento']
+    activo = flota['Activos']['id_activo'].iloc[5]
+    resumen, _, _ = builder.build(f"costos de {activo} en 2021")
+    sub = mant[(mant['id_activo'] == activo) & (mant['fecha'].dt.year == 2021)]
+    assert (f"**TOTAL DE LOS REGISTROS QUE CALZAN CON LA PREGUNTA:** {len(sub)} eventos | "
+            f"${sub['costo_mantenimiento'].sum():,.0f} CLP") in resumen
+
+
+@pytest.mark.parametrize('max_tokens', [350, 400, 600, 900, 1500, 4000])
+@pytest.mark.parametrize('question', [
+    "¿Cuánto se gastó en total?",
+    "costos de cargadores y excavadoras",
+    "mantenimiento correctivo de excavadoras en marzo 2024",
+])
+def test_todas_las_secciones_respetan_el_presupuesto(builder, question, max_tokens):
+    resumen, detalle, _ = builder.build(question, max_tokens=max_tokens)
+    assert _tokens_prompt(question, resumen, detalle) <= max_tokens
+
+
+def test_historial_largo_recorta_totales_y_conserva_lo_reciente():
+    # 40 años de historia: sólo los totales anuales ya superan el presupuesto
+    fechas = pd.date_range('1980-01-01', '2019-12-01', freq='MS')
+    mant = pd.DataFrame({
+        'id_activo': 'EXC-00001', 'fecha': fechas, 'tipo_mantenimiento': 'Preventivo',
+        'descripcion': 'Cambio de aceite', 'costo_repuestos': 1000.0, 'costo_mano_obra': 500.0,
+    })
+    mant['costo_mantenimiento'] = mant['costo_repuestos'] + mant['costo_mano_obra']
+    builder = ContextBuilder(mant)
+    question = "¿cuánto se gastó en total por año?"
+    completo = builder._texto_totales(builder.extraer_filtros(question), None)
+
+    resumen, detalle, _ = builder.build(question, max_tokens=RESERVA_PLANTILLA + 150)
+    assert estimar_tokens(completo) > 150
+    assert _tokens_prompt(question, resumen, detalle) <= RESERVA_PLANTILLA + 150
+    assert "- Año 2019: $18,000 CLP" in resumen
+    assert "- Año 1980:" not in resumen
+    assert "omitidas por espacio" in resumen
+
+
+def test_presupuesto_prioriza_total_de_la_pregunta(builder, flota):
+    activo = flota['Activos']['id_activo'].iloc[0]
+    question = f"costos de {activo} en 2023"
+    resumen, detalle, _ = builder.build(question, max_tokens=400)
+    assert "**TOTAL DE LOS REGISTROS QUE CALZAN CON LA PREGUNTA:**" in resumen
+    assert _tokens_prompt(question, resumen, detalle) <= 400
+
+
+def test_analyzer_reutiliza_builder_mientras_los_datos_no_cambian(flota):
+    analyzer = GeminiAnalyzer(api_key=None, model=FakeGenerativeModel(""))
+    mant, activos = flota['Mantenimiento'], flota['Activos']
+    primero = analyzer._context_builder(activos, mant)
+    assert analyzer._context_builder(activos, mant.copy()) is primero
+
+    cambiado = mant.copy()
+    cambiado.loc[0, 'costo_repuestos'] += 1
+    assert analyzer._context_builder(activos, cambiado) is not primero
@@ -0,0 +1,58 @@
+"""Motor de escenarios: escenario base, ajustes por tipo de equipo y activos sin tipo."""
+import numpy as np
+import pandas as pd
+
+from utils.lifecycle_calculator import LifecycleCalculator
+from utils.scenario_engine import ScenarioEngine, _por_tipo
+
+
+def test_escenario_base_en_horizonte_cero_igual_a_la_flota(flota):
+    calc = LifecycleCalculator()
+    agregados = calc.agregar_mantenimiento(flota["Mantenimiento"])
+    df = calc.calcular_metricas_completas(flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"],
+                                          agregados=agregados)
+    resultado = ScenarioEngine(calc, horizonte_meses=0).evaluar(df, agregados, flota["Costos_Referencia"], [])
+    np.testing.assert_array_equal(resultado.health[0], df['health_score'].to_numpy())
+    np.testing.assert_array_equal(resultado.prioridad[0], df['prioridad'].to_numpy())
+
+
+def test_escenario_por_tipo_solo_cambia_ese_tipo(flota):
+    calc = LifecycleCalculator()
+    agregados = calc.agregar_mantenimiento(flota["Mantenimiento"])
+    df = calc.calcular_metricas_completas(flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"],
+                                          agregados=agregados)
+    tipo = df['tipo_equipo'].iloc[0]
+    resultado = ScenarioEngine(calc).evaluar(df, agregados, flota["Costos_Referencia"],
+                                             [{'nombre': 'Doble uso', 'uso': {tipo: 2.0}}])
+    del_tipo = (df['tipo_equipo'] == tipo).to_numpy()
+    assert (resultado.health[1][~del_tipo] == resultado.health[0][~del_tipo]).all()
+    assert (resultado.health[1][del_tipo] <= resultado.health[0][del_tipo]).all()
+    assert (resultado.health[1][del_tipo] < resultado.health[0][del_tipo]).any()
+
+
+def test_por_tipo_sin_tipo_usa_el_defecto():
+    codigos, tipos = pd.factorize(pd.Series(['A', None, 'B'], dtype=object))
+    assert _por_tipo({'B': 2.0}, tipos, codigos, 1.0).tolist() == [1.0, 1.0, 2.0]
+    codigos, tipos = pd.factorize(pd.Series([None, None], dtype=object))
+    assert _por_tipo({'B': 2.0}, tipos, codigos, 1.0).tolist() == [1.0, 1.0]
+
+
+def test_ajuste_escalar_alcanza_a_activos_sin_tipo(flota):
+    calc = LifecycleCalculator()
+    agregados = calc.agregar_mantenimiento(flota["Mantenimiento"])
+    df = calc.calcular_metricas_completas(flota["Activos"], flota["Mantenimiento"], flota["Costos_Referencia"],
+                                          agregados=agregados)
+    df['tipo_equipo'] = df['tipo_equipo'].astype(object)
+    df.loc[:9, 'tipo_equipo'] = None
+    tipos = df['tipo_equipo'].dropna().unique()
+    resultado = ScenarioEngine(calc).evaluar(df, agregados, flota["Costos_Referencia"], [
+        {'nombre': 'Todos', 'uso': 2.0},
+        {'nombre': 'Por tipo', 'uso': {t: 2.0 for t in tipos}},
+    ])
+    sin_tipo = df['tipo_equipo'].isna().to_numpy()
+    # Los que ya están en el tope de uso (150% de la vida útil) no cambian
+    assert (resultado.health[1][sin_tipo] <= resultado.health[0][sin_tipo]).all()
+    assert (resultado.health[1][sin_tipo] < resultado.health[0][sin_tipo]).any()
+    # Un dict por tipo no incluye a los activos sin tipo: quedan como en la base
+    np.testing.assert_array_equal(resultado.health[2][sin_tipo], resultado.health[0][sin_tipo])
+    np.testing.assert_array_equal(resultado.health[1][~sin_tipo], resultado.health[2][~sin_tipo])
@@ -0,0 +1,189 @@
+"""
+Limpieza declarativa de hojas (ESQUEMAS_HOJAS), parseo vectorizado de montos CLP
+y lectura por delta de las hojas de solo agregar.
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import HOJAS, spreadsheet_sintetico
+from utils import sheets_connector
+from utils.sheets_connector import SheetsConnector, _parse_clp
+
+
+def _clean_clp_original(val):
+    """Regla anterior, celda a celda: quita '$' y puntos, la coma pasa a punto decimal."""
+    if isinstance(val, str):
+        val = val.replace('$', '').replace('.', '').replace(',', '.')
+        return val.strip()
+    return val
+
+
+def test_parse_clp_igual_a_regla_celda_a_celda():
+    serie = pd.Series([1500, 2.5, "$1.234.567", "1.234,5", " 300 ", "", "abc", None, "$ 12,75", np.nan],
+                      dtype=object)
+    esperado = pd.to_numeric(serie.apply(_clean_clp_original), errors='coerce').astype('float64')
+    pd.testing.assert_series_equal(_parse_clp(serie), esperado)
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('$1.234.567', 1234567.0), ('1.234.567', 1234567.0), ('1.234,5', 1234.5), ('$ 12,75', 12.75),
+    ('12.500', 12500.0), ('-1.500', -1500.0), ('1234.50', 1234.5), ('2.5', 2.5), ('2,5', 2.5), ('300', 300.0),
+])
+def test_parse_clp_punto_de_miles_solo_con_signo_o_forma_de_miles(texto, esperado):
+    # La regla anterior quitaba todos los puntos: "2.5" era 25 y "1234.50" era 123450
+    assert _parse_clp(pd.Series([texto], dtype=object)).tolist() == [esperado]
+
+
+def test_parse_clp_columna_numerica_sin_cambios():
+    serie = pd.Series([1, 2, 3])
+    assert _parse_clp(serie).tolist() == [1.0, 2.0, 3.0]
+
+
+def test_clean_data_activos_tipos_y_derivadas():
+    df = pd.DataFrame({
+        'id_activo': ['TOL-01', 'EXC-02'],
+        'tipo_equipo': ['Camión Tolva', 'Excavadora'],
+        'ano_compra': [2015, "2020"],
+        'horometro_actual': ["12.500", 8000],
+        'valor_compra': ["$150.000.000", 90000000],
+    })
+    limpio = SheetsConnector.clean_data("Activos", df)
+    assert isinstance(limpio['id_activo'].dtype, pd.CategoricalDtype)
+    assert limpio['ano_compra'].dtype == 'int16'
+    assert limpio['horometro_actual'].tolist() == [12500.0, 8000.0]
+    assert limpio['valor_compra'].tolist() == [150000000.0, 90000000.0]
+    assert limpio['edad_anos'].tolist() == [datetime.now().year - 2015, datetime.now().year - 2020]
+
+
+def test_clean_data_no_reduce_dtype_con_perdida():
+    # Un año con decimales no cabe en int16 sin pérdida: queda float64
+    limpio = SheetsConnector.clean_data("Activos", pd.DataFrame({'ano_compra': [2015, "2020,5"]}))
+    assert limpio['ano_compra'].dtype == 'float64'
+    assert limpio['ano_compra'].tolist() == [2015.0, 2020.5]
+
+
+def test_clean_data_mantenimiento():
+    df = pd.DataFrame({
+        'id_activo': ['TOL-01', 'TOL-01', 'EXC-02'],
+        'fecha': ['2024-01-15', 'no es fecha', '2023-06-01'],
+        'tipo_mantenimiento': ['Correctivo', 'Preventivo', 'Correctivo'],
+        'costo_repuestos': ["$1.000.000", "", 250000],
+        'costo_mano_obra': [500000, "abc", "12.500"],
+        'horas_parada': [4, "2,5", ""],
+    })
+    limpio = SheetsConnector.clean_data("Mantenimiento", df)
+    assert limpio['fecha'].isna().tolist() == [False, True, False]
+    # Vacíos e inválidos quedan en 0, como antes
+    assert limpio['costo_repuestos'].tolist() == [1000000.0, 0.0, 250000.0]
+    assert limpio['costo_mano_obra'].tolist() == [500000.0, 0.0, 12500.0]
+    assert limpio['horas_parada'].dtype == 'float32'
+    assert limpio['horas_parada'].tolist() == [4.0, 2.5, 0.0]
+    assert limpio['costo_mantenimiento'].tolist() == [1500000.0, 0.0, 262500.0]
+
+
+# --- LECTURA POR DELTA ---
+NUEVAS = [['TOL-00001', '2026-01-01', 'Correctivo', 'Cambio de aceite', '$1.234.567', '500,5', '3'],
+          ['NUEVO-1', '', 'Tipo Nuevo', '', 'x', '1000', ''],
+          ['AAA-0', '2025-02-03', 'Preventivo', 'Revisión', '2000', '1.000', '2.5']]
+
+
+@pytest.fixture
+def hoja():
+    return spreadsheet_sintetico(n_activos=50, eventos_por_activo=10)
+
+
+def _igual_a_lectura_completa(conn, fake):
+    leidas = conn.get_many(HOJAS)
+    completas = SheetsConnector(spreadsheet=fake).get_many(HOJAS)
+    for nombre in HOJAS:
+        pd.testing.assert_frame_equal(leidas[nombre], completas[nombre])
+    return leidas
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_delta_igual_a_lectura_completa(hoja):
+    conn = SheetsConnector(spreadsheet=hoja)
+    filas = len(_igual_a_lectura_completa(conn, hoja)['Mantenimiento'])
+    hoja._hojas['Mantenimiento'].append_rows(NUEVAS)
+    llamadas = hoja.calls
+    assert len(_igual_a_lectura_completa(conn, hoja)['Mantenimiento']) == filas + 3
+    # La lectura del conector fue una sola petición (el resto es la lectura completa de control)
+    assert conn._rango_lectura('Mantenimiento').startswith("'Mantenimiento'!A")
+    assert hoja.calls - llamadas == 2
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_ancla_distinta_relee_completa(hoja):
+    conn = SheetsConnector(spreadsheet=hoja)
+    conn.get_many(HOJAS)
+    ws = hoja._hojas['Mantenimiento']
+    ws.append_rows(NUEVAS)
+    conn.get_many(HOJAS)
+    # Se edita la última fila ingerida y se borra otra: la delta no puede confiar en el ancla
+    ws._values[-1][4] = '999'
+    del ws._values[-2]
+    _igual_a_lectura_completa(conn, hoja)
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_resync_completo_trae_ediciones_antiguas(hoja, monkeypatch):
+    conn = SheetsConnector(spreadsheet=hoja)
+    conn.get_many(HOJAS)
+    hoja._hojas['Mantenimiento']._values[5][4] = '777'
+    # Dentro del intervalo de resync una edición antigua no se ve (hoja de solo agregar)
+    assert conn.get_many(HOJAS)['Mantenimiento'].loc[4, 'costo_repuestos'] != 777
+    monkeypatch.setattr(sheets_connector, 'RESYNC_SEGUNDOS', 0)
+    assert _igual_a_lectura_completa(conn, hoja)['Mantenimiento'].loc[4, 'costo_repuestos'] == 777
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_snapshot_en_disco_solo_de_lecturas_completas(hoja, tmp_path, monkeypatch):
+    monkeypatch.setattr(sheets_connector, 'REVISION_TTL', 0)
+    conn = SheetsConnector(spreadsheet=hoja, cache_dir=str(tmp_path))
+    conn.get_many(HOJAS)
+    ws = hoja._hojas['Mantenimiento']
+    # Edición antigua que la delta no ve + filas nuevas (cambia la revisión)
+    ws._values[5][4] = '777'
+    ws.append_rows(NUEVAS)
+    assert conn.get_many(HOJAS)['Mantenimiento'].loc[4, 'costo_repuestos'] != 777
+    # Un proceso nuevo con la misma carpeta no debe tomar el frame de la delta como vigente
+    reiniciado = SheetsConnector(spreadsheet=hoja, cache_dir=str(tmp_path))
+    _igual_a_lectura_completa(reiniciado, hoja)
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_get_many_concurrente_no_duplica_filas(hoja, monkeypatch):
+    conn = SheetsConnector(spreadsheet=hoja)
+    conn.get_many(HOJAS)
+    ws = hoja._hojas['Mantenimiento']
+    limpiar = SheetsConnector.clean_data
+
+    def limpiar_lento(worksheet_name, df):
+        # Ensancha la ventana entre la verificación del ancla y el cambio de estado
+        time.sleep(0.01)
+        return limpiar(worksheet_name, df)
+
+    monkeypatch.setattr(SheetsConnector, 'clean_data', staticmethod(limpiar_lento))
+    for ronda in range(5):
+        ws.append_rows([[f'NUE-{ronda}-{i}'] + NUEVAS[0][1:] for i in range(3)])
+        hilos = [threading.Thread(target=conn.get_many, args=(HOJAS,)) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert conn._ingesta['Mantenimiento']['filas'] == len(ws._values) - 1
+    monkeypatch.setattr(SheetsConnector, 'clean_data', staticmethod(limpiar))
+    _igual_a_lectura_completa(conn, hoja)
+
+
+def test_clean_data_fechas_del_formulario_y_anteriores():
+    # Sin formatos explícitos pandas lee 05/01 como 1 de mayo y deja NaT al mezclar formatos
+    df = pd.DataFrame({'fecha': ['05/01/2026', '2025-12-31', '31-12-2024', '', 'ayer']})
+    fechas = SheetsConnector.clean_data("Mantenimiento", df)['fecha']
+    assert fechas[:3].tolist() == [pd.Timestamp(2026, 1, 5), pd.Timestamp(2025, 12, 31), pd.Timestamp(2024, 12, 31)]
+    assert fechas[3:].isna().all()
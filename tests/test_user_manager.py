@@ -0,0 +1,126 @@
+"""Directorio de usuarios compartido: TTL, invalidación y verificación de contraseña."""
+import hashlib
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from utils import user_manager
+from utils.user_manager import UserManager, get_directorio
+
+
+def _hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+class ConectorUsuarios:
+    """Conector mínimo: cuenta las lecturas de la hoja 'Usuarios'."""
+    def __init__(self, filas, spreadsheet_id='hoja-prueba', espera=0):
+        self.filas = filas
+        self.spreadsheet_id = spreadsheet_id
+        self.espera = espera
+        self.lecturas = 0
+
+    def get_data(self, worksheet_name):
+        assert worksheet_name == 'Usuarios'
+        self.lecturas += 1
+        time.sleep(self.espera)
+        if isinstance(self.filas, Exception):
+            raise self.filas
+        return pd.DataFrame(self.filas)
+
+
+@pytest.fixture(autouse=True)
+def directorio_limpio():
+    get_directorio().invalidar()
+    yield
+    get_directorio().invalidar()
+
+
+FILAS = [
+    {'email': ' Ana@Empresa.cl ', 'role': 'ADMIN', 'name': 'Ana', 'company': 'X', 'password': _hash('clave1')},
+    {'email': 'luis@empresa.cl', 'role': 'viewer', 'name': 'Luis', 'company': 'X', 'password': _hash('clave2')},
+    {'email': '', 'role': 'admin', 'name': 'Sin email', 'company': 'X', 'password': _hash('x')},
+    {'email': 'luis@empresa.cl', 'role': 'manager', 'name': 'Luis', 'company': 'X', 'password': _hash('clave3')},
+]
+
+
+def test_directorio_normaliza_y_repetidos_quedan_con_la_ultima_fila():
+    gestor = UserManager(ConectorUsuarios(FILAS))
+    assert sorted(gestor.list_users()) == ['ana@empresa.cl', 'luis@empresa.cl']
+    assert gestor.get_role('ANA@empresa.cl') == 'admin'
+    assert gestor.has_permission('ana@empresa.cl', 'manage_users')
+    assert gestor.get_role('luis@empresa.cl') == 'manager'
+    assert not gestor.has_permission('luis@empresa.cl', 'delete')
+
+
+def test_verify_password():
+    gestor = UserManager(ConectorUsuarios(FILAS))
+    assert gestor.verify_password(' Ana@empresa.cl', 'clave1')
+    assert not gestor.verify_password('ana@empresa.cl', 'clave2')
+    assert gestor.verify_password('luis@empresa.cl', 'clave3')
+    assert not gestor.verify_password('luis@empresa.cl', 'clave2')
+    assert not gestor.verify_password('nadie@empresa.cl', '')
+
+
+def test_logins_reutilizan_el_directorio_hasta_el_ttl(monkeypatch):
+    conector = ConectorUsuarios(FILAS)
+    for _ in range(5):
+        UserManager(conector)
+    assert conector.lecturas == 1
+
+    vencido = time.monotonic() + user_manager.USUARIOS_TTL + 1
+    monkeypatch.setattr(user_manager.time, 'monotonic', lambda: vencido)
+    UserManager(conector)
+    assert conector.lecturas == 2
+
+
+def test_logins_simultaneos_leen_la_hoja_una_vez():
+    conector = ConectorUsuarios(FILAS, espera=0.05)
+    hilos = [threading.Thread(target=UserManager, args=(conector,)) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert conector.lecturas == 1
+
+
+def test_reload_invalida_solo_su_spreadsheet():
+    conector = ConectorUsuarios(FILAS)
+    otro = ConectorUsuarios(FILAS, spreadsheet_id='otra-hoja')
+    gestor = UserManager(conector)
+    UserManager(otro)
+    conector.filas = FILAS[:1]
+    gestor.reload_users()
+    assert list(gestor.list_users()) == ['ana@empresa.cl']
+    assert conector.lecturas == 2
+    UserManager(otro)
+    assert otro.lecturas == 1
+
+
+def test_lectura_fallida_usa_respaldo_con_ttl_corto(monkeypatch):
+    conector = ConectorUsuarios(RuntimeError("sin red"))
+    gestor = UserManager(conector)
+    assert gestor.get_role('cf.lopezgaete@gmail.com') == 'admin'
+
+    vencido = time.monotonic() + user_manager.USUARIOS_TTL_FALLBACK + 1
+    monkeypatch.setattr(user_manager.time, 'monotonic', lambda: vencido)
+    conector.filas = FILAS
+    assert UserManager(conector).get_role('ana@empresa.cl') == 'admin'
+    assert conector.lecturas == 2
+
+
+def test_usuarios_no_van_al_snapshot_en_disco(tmp_path):
+    from fake_sheets import FakeSpreadsheet
+    from utils.sheets_connector import SheetsConnector
+
+    filas = [list(FILAS[0])] + [[str(v) for v in f.values()] for f in FILAS]
+    conector = SheetsConnector(spreadsheet=FakeSpreadsheet({'Usuarios': filas}), cache_dir=str(tmp_path))
+    # Snapshot de una versión anterior que sí guardaba la hoja
+    (tmp_path / 'sheet_Usuarios.pkl').write_bytes(b'hashes')
+    gestor = UserManager(conector)
+    assert gestor.verify_password('ana@empresa.cl', 'clave1')
+    assert list(tmp_path.iterdir()) == []
+    gestor.reload_users()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,140 @@
+"""Cola de escritura diferida: journal, envío por lotes, reintentos y filas visibles localmente."""
+import time
+
+import pytest
+
+from fake_sheets import FakeSpreadsheet
+from utils import write_queue
+from utils.sheets_connector import SheetsConnector
+from utils.write_queue import WriteQueue
+
+ENCABEZADO = ['id_activo', 'fecha', 'horas_parada']
+
+
+@pytest.fixture
+def hoja():
+    return FakeSpreadsheet({'Mantenimiento': [ENCABEZADO], 'Activos': [['id_activo']]})
+
+
+@pytest.fixture
+def conector(hoja, tmp_path):
+    return SheetsConnector(spreadsheet=hoja, cache_dir=str(tmp_path / 'snapshots'))
+
+
+@pytest.fixture
+def sin_hilo(monkeypatch):
+    # Los tests llaman enviar() a mano, sin carreras con el hilo de envío
+    monkeypatch.setattr(WriteQueue, '_iniciar_hilo', lambda self: None)
+
+
+def _cola(conector, tmp_path, **kwargs):
+    return WriteQueue(lambda: conector, str(tmp_path / 'journal.jsonl'), **kwargs)
+
+
+def _filas(hoja, nombre='Mantenimiento'):
+    return hoja._hojas[nombre]._values[1:]
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_journal_se_recupera_al_reiniciar(conector, hoja, tmp_path):
+    cola = _cola(conector, tmp_path)
+    cola.encolar('Mantenimiento', ['TOL-01', '2026-01-01', 2.5])
+    cola.encolar('Activos', ['TOL-02'])
+    # Corte a mitad de una escritura: la última línea queda incompleta
+    with open(cola.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"id": "a')
+
+    reiniciada = _cola(conector, tmp_path)
+    assert reiniciada.estado()['pendientes'] == 2
+    assert reiniciada.enviar()
+    assert _filas(hoja) == [['TOL-01', '2026-01-01', '2.5']]
+    assert _filas(hoja, 'Activos') == [['TOL-02']]
+    assert open(cola.journal_path, encoding='utf-8').read() == ''
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_lotes_por_hoja_en_orden(conector, hoja, tmp_path, monkeypatch):
+    monkeypatch.setattr(write_queue, 'MAX_FILAS_LOTE', 3)
+    enviados = []
+    cola = _cola(conector, tmp_path, al_enviar=lambda: enviados.append(1))
+    for i in range(7):
+        cola.encolar('Mantenimiento', [f'TOL-{i}', '2026-01-01', i])
+    cola.encolar('Activos', ['TOL-9'])
+    llamadas = hoja.calls
+    assert cola.enviar()
+    assert [f[0] for f in _filas(hoja)] == [f'TOL-{i}' for i in range(7)]
+    # 3 lotes de Mantenimiento + 1 de Activos: revisión y append por lote, más el handle de cada hoja
+    assert len(enviados) == 4
+    assert hoja.calls - llamadas == 4 * 2 + 2
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_error_reintenta_con_espera_y_conserva_el_orden(conector, hoja, tmp_path, monkeypatch):
+    cola = _cola(conector, tmp_path)
+    cola.encolar('Mantenimiento', ['TOL-01', '2026-01-01', 1])
+    cola.encolar('Mantenimiento', ['TOL-02', '2026-01-02', 2])
+    original = conector.append_rows
+
+    def falla(*args):
+        raise RuntimeError("429 cuota excedida")
+
+    monkeypatch.setattr(conector, 'append_rows', falla)
+    assert not cola.enviar()
+    assert not cola.enviar()
+    estado = cola.estado()
+    assert estado['pendientes'] == 2 and estado['intentos'] == 2
+    assert 'cuota' in estado['ultimo_error']
+    assert estado['proximo_intento'] > time.time() + write_queue.ESPERA_BASE ** 2 - 1
+    # Lo pendiente sigue en el journal
+    assert len(open(cola.journal_path, encoding='utf-8').read().splitlines()) == 2
+
+    monkeypatch.setattr(conector, 'append_rows', original)
+    assert cola.enviar()
+    assert cola.estado()['intentos'] == 0
+    assert [f[0] for f in _filas(hoja)] == ['TOL-01', 'TOL-02']
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_filas_locales_hasta_que_el_snapshot_trae_la_escritura(conector, hoja, tmp_path):
+    cola = _cola(conector, tmp_path)
+    antes = (time.time(), conector.get_revision(fresca=True))
+    id_fila = cola.encolar('Mantenimiento', ['TOL-01', '2026-01-01', 1])
+
+    # Pendiente: visible para cualquier snapshot
+    assert cola.filas_locales('Mantenimiento', *antes) == [(id_fila, ['TOL-01', '2026-01-01', 1])]
+    assert cola.enviar()
+    assert cola.filas_locales('Activos', *antes) == []
+    # Snapshot leído antes del envío
+    assert len(cola.filas_locales('Mantenimiento', *antes)) == 1
+    # Leído después, pero con la revisión previa (caché de revisión o retraso de Drive)
+    assert len(cola.filas_locales('Mantenimiento', time.time(), antes[1])) == 1
+    # Leído después y con una revisión que ya incluye la escritura
+    revision = conector.get_revision()
+    assert revision != antes[1]
+    assert cola.filas_locales('Mantenimiento', time.time(), revision) == []
+
+
+@pytest.mark.usefixtures('sin_hilo')
+def test_filas_locales_sin_revisiones_usa_la_hora_de_lectura(hoja, tmp_path):
+    conector = SheetsConnector(spreadsheet=hoja)
+    cola = _cola(conector, tmp_path)
+    leido_antes = time.time()
+    cola.encolar('Activos', ['TOL-02'])
+    assert cola.enviar()
+    assert len(cola.filas_locales('Activos', leido_antes)) == 1
+    assert cola.filas_locales('Activos', time.time()) == []
+
+
+def test_journal_recuperado_se_envia_sin_guardados_nuevos(conector, hoja, tmp_path, monkeypatch):
+    # Journal que dejó un proceso anterior sin enviar (el hilo no corre mientras se escribe)
+    with monkeypatch.context() as m:
+        m.setattr(WriteQueue, '_iniciar_hilo', lambda self: None)
+        _cola(conector, tmp_path).encolar('Mantenimiento', ['TOL-01', '2026-01-01', 1])
+    assert _filas(hoja) == []
+
+    reiniciada = WriteQueue(lambda: conector, str(tmp_path / 'journal.jsonl'), intervalo=0.05)
+    limite = time.time() + 5
+    while reiniciada.estado()['pendientes'] and time.time() < limite:
+        time.sleep(0.02)
+    assert _filas(hoja) == [['TOL-01', '2026-01-01', '1']]
+    assert reiniciada.estado()['pendientes'] == 0
@@ -0,0 +1,192 @@
+"""
+Análisis IA por lote: varios activos (o toda la flota) con concurrencia acotada,
+limitador de tasa (token bucket) y reintentos con backoff exponencial.
+El lote corre en un hilo propio (TrabajoLote): cambiar de vista no lo deja a medias.
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+
+class TokenBucket:
+    """Limitador de tasa: 'rate' permisos por segundo con ráfagas de hasta 'capacity'."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta obtener un permiso."""
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (ahora - self._ultimo) * self.rate)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.rate
+            time.sleep(espera)
+
+
+class TrabajoLote:
+    """Avance y resultados de un lote que corre en segundo plano."""
+
+    def __init__(self, total):
+        self.total = total
+        self.terminado = False
+        self.error = None
+        self.ruta = None
+        self.iniciado_en = time.time()
+        self._resultados = []
+        self._lock = threading.Lock()
+
+    def _agregar(self, resultado):
+        with self._lock:
+            self._resultados.append(resultado)
+
+    @property
+    def completados(self):
+        return len(self._resultados)
+
+    def df_resultados(self):
+        with self._lock:
+            return pd.DataFrame(list(self._resultados))
+
+
+class BatchAnalyzer:
+    def __init__(self, analyzer, max_workers=4, requests_per_minute=60, max_retries=3, backoff_base=2.0):
+        """
+        analyzer: instancia de GeminiAnalyzer (se reutiliza su modelo y su caché).
+        max_workers: llamadas simultáneas al modelo.
+        requests_per_minute: tasa máxima de llamadas (las respuestas en caché no consumen cuota).
+        max_retries: reintentos por activo tras el primer intento fallido.
+        """
+        self.analyzer = analyzer
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.bucket = TokenBucket(requests_per_minute / 60.0, capacity=max_workers)
+
+    def _analizar_uno(self, id_activo, prompt, regenerate):
+        inicio = time.monotonic()
+        if not regenerate:
+            cached = self.analyzer.respuesta_en_cache(prompt)
+            if cached is not None:
+                return {'id_activo': id_activo, 'estado': 'cache', 'texto': cached,
+                        'intentos': 0, 'segundos': time.monotonic() - inicio, 'error': None}
+
+        ultimo_error = None
+        for intento in range(1, self.max_retries + 2):
+            self.bucket.acquire()
+            try:
+                # Solo las llamadas reales consumen cuota: la caché ya se consultó arriba
+                texto, _ = self.analyzer.analizar_prompt(prompt, regenerate=True)
+                return {'id_activo': id_activo, 'estado': 'ok', 'texto': texto,
+                        'intentos': intento, 'segundos': time.monotonic() - inicio, 'error': None}
+            except Exception as e:
+                ultimo_error = e
+                if intento <= self.max_retries:
+                    # Backoff exponencial con jitter para no sincronizar los reintentos
+                    time.sleep(self.backoff_base * (2 ** (intento - 1)) * (0.5 + random.random()))
+
+        return {'id_activo': id_activo, 'estado': 'error', 'texto': None,
+                'intentos': self.max_retries + 1, 'segundos': time.monotonic() - inicio,
+                'error': str(ultimo_error)}
+
+    def iter_analisis(self, df_flota, df_mantenimiento, df_costos_ref, ids=None, regenerate=False, cubo=None):
+        """
+        Genera los resultados por activo a medida que terminan (para mostrar progreso).
+        Un activo que falla no detiene el resto.
+        cubo: MaintenanceCube compartido (conteos y gastos sin reagrupar por activo).
+        """
+        flota = df_flota if ids is None else df_flota[df_flota['id_activo'].isin(ids)]
+
+        # Historial separado por activo una sola vez
+        por_activo = {}
+        if df_mantenimiento is not None and not df_mantenimiento.empty and 'id_activo' in df_mantenimiento.columns:
+            por_activo = {k: g for k, g in df_mantenimiento.groupby('id_activo', observed=True)}
+        vacio = df_mantenimiento.iloc[0:0] if df_mantenimiento is not None else pd.DataFrame()
+
+        prompts = [
+            (row['id_activo'], self.analyzer.build_asset_prompt(row, por_activo.get(row['id_activo'], vacio), df_costos_ref,
+                                                              cubo=cubo))
+            for _, row in flota.iterrows()
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futuros = [pool.submit(self._analizar_uno, id_activo, prompt, regenerate) for id_activo, prompt in prompts]
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+
+    def iniciar(self, df_flota, df_mantenimiento, df_costos_ref, ids=None, regenerate=False, output_path=None,
+                cubo=None):
+        """
+        Lanza el lote en un hilo y retorna el TrabajoLote para consultar su avance.
+        Pensado para Streamlit: el hilo no usa st.* y sigue aunque el script se vuelva a ejecutar.
+        """
+        total = len(df_flota) if ids is None else int(df_flota['id_activo'].isin(ids).sum())
+        trabajo = TrabajoLote(total)
+
+        def _correr():
+            try:
+                for resultado in self.iter_analisis(df_flota, df_mantenimiento, df_costos_ref, ids=ids,
+                                                    regenerate=regenerate, cubo=cubo):
+                    trabajo._agregar(resultado)
+                if output_path:
+                    self.guardar_reporte(trabajo.df_resultados(), output_path)
+                    trabajo.ruta = output_path
+            except Exception as e:
+                print(f"Error en análisis por lote: {e}")
+                trabajo.error = str(e)
+            finally:
+                trabajo.terminado = True
+
+        threading.Thread(target=_correr, name="batch-analyzer", daemon=True).start()
+        return trabajo
+
+    def analizar(self, df_flota, df_mantenimiento, df_costos_ref, ids=None, regenerate=False, output_path=None,
+                 cubo=None):
+        """Ejecuta el lote completo. Retorna un DataFrame con un resultado por activo."""
+        resultados = list(self.iter_analisis(df_flota, df_mantenimiento, df_costos_ref, ids=ids,
+                                             regenerate=regenerate, cubo=cubo))
+        df_resultados = pd.DataFrame(resultados)
+        if output_path:
+            self.guardar_reporte(df_resultados, output_path)
+        return df_resultados
+
+    @staticmethod
+    def reporte_markdown(df_resultados):
+        """Reporte combinado en Markdown (ordenado por id_activo)."""
+        ok = (df_resultados['estado'] != 'error').sum() if not df_resultados.empty else 0
+        lineas = [
+            "# Análisis IA de Flota",
+            f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')} | Activos: {len(df_resultados)} | "
+            f"Exitosos: {ok} | Con error: {len(df_resultados) - ok}",
+            "",
+        ]
+        if df_resultados.empty:
+            # Selección vacía o lote cancelado: sin columnas que ordenar
+            return "\n".join(lineas)
+        for _, r in df_resultados.sort_values('id_activo').iterrows():
+            lineas.append(f"## {r['id_activo']}")
+            lineas.append(r['texto'] if r['estado'] != 'error' else f"⚠️ Error tras {r['intentos']} intentos: {r['error']}")
+            lineas.append("")
+        return "\n".join(lineas)
+
+    def guardar_reporte(self, df_resultados, output_path):
+        """Escribe el reporte Markdown y, al lado, los resultados en JSON."""
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(self.reporte_markdown(df_resultados))
+        with open(os.path.splitext(output_path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump(df_resultados.to_dict(orient='records'), f, ensure_ascii=False, indent=2, default=str)
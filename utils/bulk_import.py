@@ -0,0 +1,341 @@
+"""
+Importación masiva de historial de mantenimiento desde CSV o Excel.
+El archivo se lee por bloques (CSV con chunksize, Excel con openpyxl en modo read_only), cada bloque
+se valida y limpia con las reglas de clean_data, se descartan los registros ya existentes y las
+filas válidas se escriben en lotes grandes con append_rows. La memoria queda acotada por el
+bloque y las llaves (hash de 64 bits) de los registros vistos.
+Las llaves de lo escrito se comparten en el proceso hasta que el snapshot de la hoja las trae,
+para que reimportar el archivo antes del refresco no duplique registros.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.sheets_connector import (COLUMNAS_HOJAS, FORMATO_FECHA_HOJA, SheetsConnector, _parse_clp,
+                                    _parse_fecha)
+from utils.telemetry import get_telemetria
+
+# Filas por bloque de lectura y por petición de escritura
+TAMANO_BLOQUE = 5000
+FILAS_POR_ESCRITURA = 5000
+# Reintentos de cada escritura (espera 2, 4, 8 s)
+INTENTOS_ESCRITURA = 4
+# Errores detallados que se guardan (el resto solo se cuenta)
+MAX_ERRORES = 1000
+
+TIPOS_MANTENIMIENTO = ["Preventivo", "Correctivo", "Predictivo"]
+# Columnas del costo y duración: vacío = 0, como en get_data
+COLUMNAS_NUMERICAS = ['costo_repuestos', 'costo_mano_obra', 'horas_parada']
+COLUMNAS_OPCIONALES = ['descripcion']
+
+
+def _normalizar_encabezado(nombre):
+    return str(nombre or '').strip().lower().replace(' ', '_')
+
+
+def _separador(origen):
+    """';' si la primera línea tiene más puntos y coma que comas (CSV exportado con configuración chilena)."""
+    if isinstance(origen, str):
+        with open(origen, encoding='utf-8-sig', errors='ignore') as f:
+            linea = f.readline()
+    else:
+        linea = origen.readline()
+        origen.seek(0)
+        if isinstance(linea, bytes):
+            linea = linea.decode('utf-8-sig', errors='ignore')
+    return ';' if linea.count(';') > linea.count(',') else ','
+
+
+def llaves_registros(df):
+    """
+    Hash por registro de mantenimiento limpio (activo, día, tipo, costos y horas) para detectar duplicados.
+    La descripción no entra: es texto libre.
+    """
+    if df.empty:
+        return np.array([], dtype='uint64')
+    claves = pd.DataFrame({
+        'id_activo': df['id_activo'].astype(str).str.strip().to_numpy(),
+        'fecha': pd.to_datetime(df['fecha']).dt.strftime('%Y-%m-%d').to_numpy(),
+        'tipo': df['tipo_mantenimiento'].astype(str).str.strip().str.lower().to_numpy(),
+        'repuestos': df['costo_repuestos'].to_numpy(dtype=float).round(0),
+        'mano_obra': df['costo_mano_obra'].to_numpy(dtype=float).round(0),
+        'horas': df['horas_parada'].to_numpy(dtype=float).round(2),
+    })
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+
+class LlavesImportadas:
+    """
+    Llaves de los registros escritos por importaciones de este proceso, compartidas entre sesiones.
+    Cubren el tiempo entre la escritura y el snapshot que la trae: cada llave se olvida cuando
+    un importador se crea con registros existentes que ya la incluyen.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._llaves = set()
+
+    def agregar(self, llaves):
+        with self._lock:
+            self._llaves.update(llaves)
+
+    def confirmar(self, existentes):
+        """Olvida las llaves que ya trae el snapshot ('existentes')."""
+        with self._lock:
+            self._llaves -= existentes
+
+    def __contains__(self, llave):
+        return llave in self._llaves
+
+    def __len__(self):
+        return len(self._llaves)
+
+
+_llaves_importadas = LlavesImportadas()
+
+
+def get_llaves_importadas():
+    return _llaves_importadas
+
+
+def _a_celda(valor):
+    """Valor limpio -> celda de Sheets (los costos enteros sin decimales)."""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+class BulkImporter:
+    def __init__(self, connector, activos_validos=None, registros_existentes=None,
+                 tamano_bloque=TAMANO_BLOQUE, filas_por_escritura=FILAS_POR_ESCRITURA):
+        """
+        connector: SheetsConnector donde se escribe la hoja 'Mantenimiento'.
+        activos_validos: ids de activo aceptados (None = cualquiera).
+        registros_existentes: DataFrame limpio de 'Mantenimiento' para descartar duplicados
+        (None = se lee de la hoja). Lo escrito por otras importaciones del proceso que aún
+        no trae se descarta también (get_llaves_importadas).
+        """
+        self.connector = connector
+        self.activos_validos = None if activos_validos is None else {str(a).strip() for a in activos_validos}
+        self.tamano_bloque = tamano_bloque
+        self.filas_por_escritura = filas_por_escritura
+        if registros_existentes is None:
+            registros_existentes = connector.get_data('Mantenimiento')
+        self._vistos = set(llaves_registros(registros_existentes).tolist())
+        self._escritas = get_llaves_importadas()
+        self._escritas.confirmar(self._vistos)
+
+    # --- LECTURA POR BLOQUES ---
+    def leer_bloques(self, origen, nombre_archivo):
+        """
+        Genera DataFrames crudos de hasta tamano_bloque filas, con 'fila_origen' (número de fila
+        en el archivo, encabezado = 1). origen: ruta o archivo abierto (ej: st.file_uploader).
+        """
+        if nombre_archivo.lower().endswith(('.xlsx', '.xlsm')):
+            yield from self._bloques_excel(origen)
+        else:
+            yield from self._bloques_csv(origen)
+
+    def _bloques_csv(self, origen):
+        lector = pd.read_csv(origen, sep=_separador(origen), dtype=str, keep_default_na=False,
+                             skip_blank_lines=False, encoding='utf-8-sig', chunksize=self.tamano_bloque)
+        inicio = 2
+        for bloque in lector:
+            bloque.columns = [_normalizar_encabezado(c) for c in bloque.columns]
+            bloque['fila_origen'] = np.arange(inicio, inicio + len(bloque))
+            inicio += len(bloque)
+            yield bloque
+
+    def _bloques_excel(self, origen):
+        from openpyxl import load_workbook
+        libro = load_workbook(origen, read_only=True, data_only=True)
+        try:
+            hoja = libro['Mantenimiento'] if 'Mantenimiento' in libro.sheetnames else libro.active
+            filas = hoja.iter_rows(values_only=True)
+            encabezado = [_normalizar_encabezado(c) for c in next(filas, ())]
+            valores, numeros = [], []
+            for numero, fila in enumerate(filas, start=2):
+                valores.append(['' if v is None else v for v in fila[:len(encabezado)]])
+                numeros.append(numero)
+                if len(valores) >= self.tamano_bloque:
+                    yield self._bloque_excel(encabezado, valores, numeros)
+                    valores, numeros = [], []
+            if valores:
+                yield self._bloque_excel(encabezado, valores, numeros)
+        finally:
+            libro.close()
+
+    @staticmethod
+    def _bloque_excel(encabezado, valores, numeros):
+        bloque = pd.DataFrame(valores, columns=encabezado, dtype=object)
+        bloque['fila_origen'] = numeros
+        return bloque
+
+    # --- VALIDACIÓN Y LIMPIEZA ---
+    def validar_bloque(self, bloque):
+        """
+        Retorna (filas limpias válidas, [{'fila', 'motivo'}]).
+        Las filas completamente vacías se ignoran sin error.
+        """
+        columnas = COLUMNAS_HOJAS['Mantenimiento']
+        faltan = [c for c in columnas if c not in bloque.columns and c not in COLUMNAS_OPCIONALES]
+        if faltan:
+            raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltan)}")
+
+        # Series.map por columna (DataFrame.map requiere pandas >= 2.1)
+        crudo = pd.DataFrame({
+            c: (bloque[c] if c in bloque.columns else pd.Series('', index=bloque.index))
+            .astype(object).fillna('').map(lambda v: v.strip() if isinstance(v, str) else v)
+            for c in columnas
+        })
+        fila_vacia = crudo.eq('').to_numpy().all(axis=1)
+
+        motivos = pd.Series('', index=bloque.index, dtype=object)
+
+        def marcar(mascara, motivo):
+            nuevos = mascara & (motivos == '') & ~fila_vacia
+            motivos[nuevos] = motivo
+
+        ids = crudo['id_activo'].astype(str)
+        marcar(crudo['id_activo'].eq('').to_numpy(), "id_activo vacío")
+        if self.activos_validos is not None:
+            marcar(~ids.isin(self.activos_validos).to_numpy(), "id_activo no existe en Activos")
+
+        fechas = _parse_fecha(crudo['fecha'])
+        marcar(fechas.isna().to_numpy(), "fecha inválida")
+
+        tipos = crudo['tipo_mantenimiento'].astype(str).str.capitalize()
+        marcar(~tipos.isin(TIPOS_MANTENIMIENTO).to_numpy(),
+               f"tipo_mantenimiento debe ser {', '.join(TIPOS_MANTENIMIENTO)}")
+
+        numericas = {}
+        for col in COLUMNAS_NUMERICAS:
+            # Mismas reglas que la hoja (clean_data)
+            numeros = _parse_clp(crudo[col])
+            marcar((numeros.isna() & ~crudo[col].eq('')).to_numpy(), f"{col} no es numérico")
+            marcar((numeros < 0).to_numpy(), f"{col} negativo")
+            numericas[col] = numeros
+
+        validas = (motivos == '').to_numpy() & ~fila_vacia
+        errores = [{'fila': int(f), 'motivo': m}
+                   for f, m in zip(bloque['fila_origen'][~validas & ~fila_vacia], motivos[~validas & ~fila_vacia])]
+
+        crudo = crudo[validas].assign(fecha=fechas[validas], tipo_mantenimiento=tipos[validas],
+                                      id_activo=ids[validas],
+                                      **{col: numeros[validas] for col, numeros in numericas.items()})
+        # Mismas reglas que al leer la hoja: el resultado es lo que get_data traerá después
+        limpio = SheetsConnector.clean_data('Mantenimiento', crudo.reset_index(drop=True))
+        limpio['fila_origen'] = bloque['fila_origen'][validas].to_numpy()
+        return limpio, errores
+
+    def _descartar_duplicados(self, limpio):
+        """
+        Quita los registros que ya están en la hoja, los que otra importación escribió y el
+        snapshot aún no trae, y los que aparecieron antes en el archivo.
+        Retorna (nuevos, llaves de los nuevos, cantidad descartada).
+        """
+        llaves = llaves_registros(limpio).tolist()
+        nuevos = np.zeros(len(limpio), dtype=bool)
+        for i, llave in enumerate(llaves):
+            if llave not in self._vistos and llave not in self._escritas:
+                self._vistos.add(llave)
+                nuevos[i] = True
+        return limpio[nuevos], [l for l, nuevo in zip(llaves, nuevos) if nuevo], int((~nuevos).sum())
+
+    # --- ESCRITURA ---
+    @staticmethod
+    def _a_filas(limpio):
+        """DataFrame limpio -> filas en el orden de la hoja (fechas dd/mm/aaaa, como el formulario de la app)."""
+        salida = limpio[COLUMNAS_HOJAS['Mantenimiento']].astype(object)
+        salida['id_activo'] = limpio['id_activo'].astype(str)
+        salida['tipo_mantenimiento'] = limpio['tipo_mantenimiento'].astype(str)
+        salida['fecha'] = limpio['fecha'].dt.strftime(FORMATO_FECHA_HOJA)
+        salida['descripcion'] = limpio['descripcion'].fillna('').astype(str)
+        for col in COLUMNAS_NUMERICAS:
+            salida[col] = limpio[col].astype(float).round(2).astype(object)
+        return [[_a_celda(v) for v in fila] for fila in salida.itertuples(index=False, name=None)]
+
+    def _ids_hoja(self):
+        """Columna id_activo de la hoja, sin el encabezado."""
+        return self.connector.worksheet('Mantenimiento').col_values(1)[1:]
+
+    def _lote_escrito(self, filas_antes, filas):
+        """
+        True si el lote ya está en la hoja tras una escritura fallida (ej: timeout con el append
+        hecho en el servidor): sus id_activo aparecen seguidos después de las filas_antes que había.
+        """
+        ids = [str(f[0]) for f in filas]
+        cola = self._ids_hoja()[filas_antes:]
+        return any(cola[i:i + len(ids)] == ids for i in range(len(cola) - len(ids) + 1))
+
+    def _escribir(self, filas):
+        """
+        append_rows con reintentos. append_rows no es idempotente: antes de reenviar se revisa si
+        el intento fallido alcanzó a escribir el lote, para no duplicarlo.
+        """
+        filas_antes = None
+        verificar = False
+        for intento in range(INTENTOS_ESCRITURA):
+            try:
+                with get_telemetria().span('importacion.escribir', hoja='Mantenimiento'):
+                    if filas_antes is None:
+                        filas_antes = len(self._ids_hoja())
+                    if verificar and self._lote_escrito(filas_antes, filas):
+                        return None
+                    # Desde aquí un error puede haber escrito el lote: el próximo intento verifica primero
+                    verificar = True
+                    return self.connector.append_rows('Mantenimiento', filas)
+            except Exception as e:
+                if intento == INTENTOS_ESCRITURA - 1:
+                    raise
+                print(f"Error escribiendo lote de importación (intento {intento + 1}): {e}")
+                time.sleep(2 ** (intento + 1))
+
+    def importar(self, origen, nombre_archivo, progreso=None):
+        """
+        Importa el archivo completo. progreso: callable(resultado) tras cada bloque.
+        Ante un error (ej: escritura fallida tras los reintentos) se detiene y lo reporta en
+        resultado['error']; lo ya escrito queda y reimportar el archivo no lo duplica (las llaves
+        escritas se registran en get_llaves_importadas hasta que el snapshot las trae).
+        """
+        resultado = {'leidas': 0, 'importadas': 0, 'duplicadas': 0, 'con_error': 0,
+                     'errores': [], 'completo': False, 'error': None, 'segundos': 0.0}
+        inicio = time.perf_counter()
+        pendientes = []
+        llaves_pendientes = []
+
+        def vaciar():
+            if pendientes:
+                filas = [f for lote in pendientes for f in lote]
+                pendientes.clear()
+                self._escribir(filas)
+                self._escritas.agregar(llaves_pendientes)
+                llaves_pendientes.clear()
+                resultado['importadas'] += len(filas)
+
+        try:
+            for bloque in self.leer_bloques(origen, nombre_archivo):
+                with get_telemetria().span('importacion.bloque'):
+                    limpio, errores = self.validar_bloque(bloque)
+                    limpio, llaves, duplicadas = self._descartar_duplicados(limpio)
+                resultado['leidas'] += len(bloque)
+                resultado['duplicadas'] += duplicadas
+                resultado['con_error'] += len(errores)
+                resultado['errores'].extend(errores[:MAX_ERRORES - len(resultado['errores'])])
+                if not limpio.empty:
+                    pendientes.append(self._a_filas(limpio))
+                    llaves_pendientes.extend(llaves)
+                if sum(len(lote) for lote in pendientes) >= self.filas_por_escritura:
+                    vaciar()
+                resultado['segundos'] = time.perf_counter() - inicio
+                if progreso is not None:
+                    progreso(resultado)
+            vaciar()
+            resultado['completo'] = True
+        except Exception as e:
+            # Columnas faltantes, archivo ilegible o escritura fallida tras los reintentos
+            print(f"Error en importación masiva: {e}")
+            resultado['error'] = str(e)
+        resultado['segundos'] = time.perf_counter() - inicio
+        return resultado
@@ -0,0 +1,106 @@
+"""
+Índice temporal de costos por activo.
+Fechas ordenadas por activo con costos acumulados: la suma de cualquier ventana
+(últimos 12/24/36 meses o un rango libre) es una búsqueda binaria, sin recorrer el historial.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _a_dias(fechas):
+    """Fechas -> días desde 1970 (int64)."""
+    return pd.to_datetime(fechas).to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+
+class CostTimeIndex:
+    def __init__(self, ids=None, dias=None, costos=None):
+        """
+        ids, dias, costos: un valor por registro con fecha (cualquier orden).
+        Normalmente se construye con CostTimeIndex.desde_mantenimiento.
+        """
+        ids = np.asarray(ids if ids is not None else [], dtype=object)
+        dias = np.asarray(dias if dias is not None else [], dtype=np.int64)
+        costos = np.asarray(costos if costos is not None else [], dtype=float)
+
+        codigos, unicos = pd.factorize(ids)
+        self._ids = pd.Index(np.asarray(unicos, dtype=object))
+        self._dia_min = int(dias.min()) if len(dias) else 0
+        # Ancho de cada segmento de activo en la llave compuesta (deja un día libre a cada lado)
+        self._ancho = (int(dias.max()) - self._dia_min + 2) if len(dias) else 2
+
+        orden = np.lexsort((dias, codigos))
+        self.ids = ids[orden]
+        self.dias = dias[orden]
+        self.costos = costos[orden]
+        # Llave (activo, día) creciente en todo el arreglo: una sola búsqueda sirve para toda la flota
+        self._llaves = codigos[orden].astype(np.int64) * self._ancho + (self.dias - self._dia_min)
+        self._acumulado = np.concatenate([[0.0], np.cumsum(self.costos)])
+
+    @classmethod
+    def desde_mantenimiento(cls, df_mantenimiento):
+        """Índice a partir del historial limpio. Los registros sin fecha no entran en ninguna ventana."""
+        if (df_mantenimiento is None or df_mantenimiento.empty
+                or 'id_activo' not in df_mantenimiento.columns or 'fecha' not in df_mantenimiento.columns):
+            return cls()
+        if 'costo_mantenimiento' in df_mantenimiento.columns:
+            costo = df_mantenimiento['costo_mantenimiento']
+        elif 'costo_repuestos' in df_mantenimiento.columns and 'costo_mano_obra' in df_mantenimiento.columns:
+            costo = df_mantenimiento['costo_repuestos'] + df_mantenimiento['costo_mano_obra']
+        else:
+            costo = pd.Series(0.0, index=df_mantenimiento.index)
+
+        con_fecha = df_mantenimiento['fecha'].notna().to_numpy()
+        return cls(
+            ids=df_mantenimiento['id_activo'].to_numpy(dtype=object)[con_fecha],
+            dias=_a_dias(df_mantenimiento['fecha'][con_fecha]),
+            costos=costo.to_numpy(dtype=float)[con_fecha],
+        )
+
+    def __len__(self):
+        return len(self.dias)
+
+    def agregar(self, df_nuevos):
+        """Índice nuevo con registros adicionales."""
+        delta = CostTimeIndex.desde_mantenimiento(df_nuevos)
+        if not len(delta):
+            return self
+        return CostTimeIndex(
+            ids=np.concatenate([self.ids, delta.ids]),
+            dias=np.concatenate([self.dias, delta.dias]),
+            costos=np.concatenate([self.costos, delta.costos]),
+        )
+
+    @staticmethod
+    def rango_ventana(meses=12, referencia=None):
+        """(desde, hasta) de los últimos 'meses' hasta 'referencia' (hoy por defecto), ambos inclusive."""
+        hasta = pd.Timestamp(referencia if referencia is not None else pd.Timestamp.now()).normalize()
+        desde = hasta - pd.DateOffset(months=meses) + pd.Timedelta(days=1)
+        return desde, hasta
+
+    def costos_ventana(self, ids, meses=12, referencia=None, desde=None, hasta=None):
+        """
+        Costo por activo en la ventana, alineado con 'ids' (0 si no hay registros).
+        Usa desde/hasta (inclusive) si se entregan; si no, los últimos 'meses' hasta 'referencia'.
+        """
+        if desde is None and hasta is None:
+            desde, hasta = self.rango_ventana(meses, referencia)
+        ids = np.asarray(ids, dtype=object)
+        if not len(self.dias) or not len(ids):
+            return pd.Series(0.0, index=ids)
+
+        dia_desde = _a_dias([desde])[0] if desde is not None else self._dia_min
+        dia_hasta = _a_dias([hasta])[0] if hasta is not None else self._dia_min + self._ancho - 2
+        # Desplazamientos acotados al segmento para no invadir al activo vecino
+        off_desde = np.clip(dia_desde - self._dia_min, 0, self._ancho - 1)
+        off_hasta = np.clip(dia_hasta - self._dia_min, -1, self._ancho - 1)
+
+        codigos = self._ids.get_indexer(ids).astype(np.int64)
+        base = codigos * self._ancho
+        inicio = np.searchsorted(self._llaves, base + off_desde, side='left')
+        fin = np.maximum(np.searchsorted(self._llaves, base + off_hasta, side='right'), inicio)
+        suma = self._acumulado[fin] - self._acumulado[inicio]
+        return pd.Series(np.where(codigos >= 0, suma, 0.0), index=ids)
+
+    def costo(self, id_activo, desde=None, hasta=None):
+        """Costo de un activo entre desde y hasta (inclusive)."""
+        return float(self.costos_ventana([id_activo], desde=desde, hasta=hasta).iloc[0])
@@ -0,0 +1,87 @@
+"""
+Proyección de degradación de toda la flota en una sola operación matricial.
+Usa las fórmulas de LifecycleCalculator (scores_desde_arrays) con la tasa de uso real
+de cada equipo (horómetro / edad). Las matrices son de solo lectura: se comparten entre sesiones.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.lifecycle_calculator import LifecycleCalculator
+
+# Edades de la curva ideal (gráfico de ciclo de vida)
+EDADES_CURVA = np.arange(0, 21, 1)
+# Umbrales de health score de las zonas del gráfico y las reglas
+UMBRALES = (85, 60, 40)
+
+
+class DegradationForecast:
+    def __init__(self, ids, curvas, meses, proyeccion, info):
+        self.ids = pd.Index(ids)
+        self.edades = EDADES_CURVA
+        self.curvas = curvas            # activos × EDADES_CURVA (confiabilidad ideal = 100)
+        self.meses = meses              # horizonte en meses desde hoy
+        self.proyeccion = proyeccion    # activos × meses (confiabilidad actual)
+        self.info = info                # id_activo, tipo_equipo, health_score, horas_anuales
+        for matriz in (self.curvas, self.proyeccion):
+            matriz.setflags(write=False)
+        # Fila de cada id (si un id se repite en Activos vale la primera, como en el detalle)
+        self._fila = pd.Series(np.arange(len(self.ids)), index=self.ids)[~self.ids.duplicated()]
+
+    @classmethod
+    def desde_flota(cls, df_flota, df_costos_ref, horizonte_meses=120):
+        """
+        df_flota: métricas de LifecycleCalculator (horometro_actual, edad_anos, score_confiabilidad).
+        horizonte_meses: largo de la proyección mensual desde el estado actual.
+        """
+        horometro = df_flota['horometro_actual'].to_numpy(dtype=float)
+        edad = df_flota['edad_anos'].to_numpy(dtype=float)
+        if 'score_confiabilidad' in df_flota.columns:
+            confiabilidad = df_flota['score_confiabilidad'].to_numpy(dtype=float)
+        else:
+            confiabilidad = np.full(len(df_flota), 100.0)
+
+        # Vida útil por tipo (misma resolución que el cálculo de scores)
+        calc = LifecycleCalculator()
+        vida_util = calc.vida_util_flota(df_flota['tipo_equipo'], df_costos_ref)
+
+        # Tasa de uso real de cada máquina
+        horas_anuales = horometro / np.maximum(1, edad)
+
+        # Curva ideal: desde edad 0 con la tasa de uso del activo
+        curvas = calc.scores_desde_arrays(EDADES_CURVA[None, :] * horas_anuales[:, None], EDADES_CURVA[None, :],
+                                          vida_util[:, None], score_confiabilidad=100.0)['health_score']
+
+        # Proyección desde hoy manteniendo uso y confiabilidad actuales
+        meses = np.arange(0, horizonte_meses + 1)
+        anios = meses[None, :] / 12.0
+        proyeccion = calc.scores_desde_arrays(horometro[:, None] + anios * horas_anuales[:, None],
+                                              edad[:, None] + anios, vida_util[:, None],
+                                              score_confiabilidad=confiabilidad[:, None])['health_score']
+
+        info = pd.DataFrame({
+            'id_activo': df_flota['id_activo'].to_numpy(),
+            'tipo_equipo': df_flota['tipo_equipo'].to_numpy(),
+            'health_score': df_flota['health_score'].to_numpy(dtype=float) if 'health_score' in df_flota.columns else proyeccion[:, 0],
+            'horas_anuales': horas_anuales,
+        })
+        return cls(df_flota['id_activo'].to_numpy(), curvas, meses, proyeccion, info)
+
+    def curva(self, id_activo):
+        """(edades, health) de la curva ideal de un activo."""
+        fila = self._fila.get(id_activo)
+        if fila is None:
+            raise KeyError(id_activo)
+        return self.edades, self.curvas[fila]
+
+    def cruces(self, umbrales=UMBRALES):
+        """
+        Meses hasta que la proyección de cada activo baja de cada umbral.
+        0 = ya está bajo el umbral; NaN = no lo cruza dentro del horizonte.
+        """
+        tabla = self.info.copy()
+        for umbral in umbrales:
+            bajo = self.proyeccion < umbral
+            cruza = bajo.any(axis=1)
+            primero = bajo.argmax(axis=1)
+            tabla[f'meses_hasta_{umbral}'] = np.where(cruza, self.meses[primero], np.nan)
+        return tabla
@@ -0,0 +1,35 @@
+"""
+Huella (fingerprint) barata del contenido de DataFrames.
+Se usa como llave de caché: si los datos no cambian, la huella tampoco.
+"""
+import hashlib
+import pandas as pd
+
+
+def _hash_df(df, h):
+    if df is None:
+        h.update(b'none')
+        return
+    h.update(str(df.shape).encode())
+    h.update('|'.join(map(str, df.columns)).encode())
+    if df.empty:
+        return
+    try:
+        valores = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    except TypeError:
+        # Columnas con objetos no hasheables (listas, dicts): pasamos a texto
+        valores = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    h.update(valores.tobytes())
+
+
+def calcular_huella(*dfs, extra=None):
+    """
+    Retorna un hash hexadecimal corto del contenido de los DataFrames.
+    extra: texto adicional a incluir (ej: versión del calculador).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for df in dfs:
+        _hash_df(df, h)
+    if extra is not None:
+        h.update(str(extra).encode())
+    return h.hexdigest()
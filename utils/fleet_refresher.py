@@ -0,0 +1,146 @@
+"""
+Refresco en segundo plano (stale-while-revalidate) de las hojas de flota y sus métricas.
+Las sesiones leen siempre el último snapshot bueno al instante; un hilo lo renueva por
+intervalo o al detectar un cambio de revisión. Si un refresco falla, se conserva el anterior.
+"""
+import threading
+import time
+from datetime import date
+
+from utils.fingerprint import calcular_huella
+from utils.telemetry import get_telemetria
+
+HOJAS_FLOTA = ("Activos", "Mantenimiento", "Costos_Referencia")
+# Refresco completo periódico y consulta de la revisión del Spreadsheet (segundos)
+INTERVALO_REFRESCO = 600
+INTERVALO_REVISION = 30
+
+
+class FleetSnapshot:
+    def __init__(self, hojas, huella, clave, metricas, revision, leido_en=None):
+        self.hojas = hojas              # {nombre_hoja: DataFrame limpio}
+        self.huella = huella            # huella del contenido de las hojas
+        self.clave = clave              # huella + versión + fecha (llave de las métricas)
+        self.metricas = metricas        # resultado de calcular(...)
+        self.revision = revision        # revisión del Spreadsheet al leer (None si no hay)
+        self.cargado_en = time.time()
+        self.leido_en = leido_en or self.cargado_en   # inicio de la lectura de las hojas
+
+    @property
+    def edad_segundos(self):
+        return time.time() - self.cargado_en
+
+
+class FleetRefresher:
+    def __init__(self, conectar, calcular, hojas=HOJAS_FLOTA, version='',
+                 intervalo=INTERVALO_REFRESCO, intervalo_revision=INTERVALO_REVISION):
+        """
+        conectar: callable -> SheetsConnector (ej: get_connector del pool).
+        calcular: callable(*hojas) -> métricas; corre en el hilo de refresco, sin llamadas a st.*.
+        version: versión del cálculo; entra en la llave junto a la huella y la fecha.
+        """
+        self.conectar = conectar
+        self.calcular = calcular
+        self.hojas = tuple(hojas)
+        self.version = version
+        self.intervalo = intervalo
+        self.intervalo_revision = intervalo_revision
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._lock_hilo = threading.Lock()
+        self._evento = threading.Event()
+        self._hilo = None
+        self._refrescando = False
+        self._ultimo_intento = None
+        self._ultimo_error = None
+
+    def obtener(self):
+        """
+        Último snapshot bueno, sin esperar. Solo la primera carga del proceso es síncrona.
+        Retorna None si nunca se pudo cargar.
+        """
+        self._iniciar_hilo()
+        if self._snapshot is None:
+            get_telemetria().marcar_cache(False)
+            self.refrescar(solo_si_vacio=True)
+        return self._snapshot
+
+    def refrescar(self, solo_si_vacio=False):
+        """
+        Lee las hojas y recalcula las métricas si cambió la llave. Retorna True si quedó un snapshot nuevo.
+        solo_si_vacio: no repetir la carga si otra sesión ya la hizo mientras se esperaba el lock.
+        """
+        with self._lock:
+            if solo_si_vacio and self._snapshot is not None:
+                return True
+            self._refrescando = True
+            self._ultimo_intento = time.time()
+            try:
+                with get_telemetria().span('fleet.refrescar'):
+                    leido_en = time.time()
+                    conn = self.conectar()
+                    revision = conn.get_revision()
+                    hojas = conn.get_many(list(self.hojas), estricto=True)
+                    if hojas[self.hojas[0]].empty:
+                        raise ValueError(f"la hoja '{self.hojas[0]}' llegó vacía")
+                    frames = [hojas[nombre] for nombre in self.hojas]
+                    huella = calcular_huella(*frames)
+                    clave = f"{huella}:{self.version}:{date.today()}"
+                    actual = self._snapshot
+                    if actual is not None and actual.clave == clave:
+                        metricas = actual.metricas
+                    else:
+                        metricas = self.calcular(*frames)
+                    self._snapshot = FleetSnapshot(hojas, huella, clave, metricas, revision, leido_en)
+                self._ultimo_error = None
+                return True
+            except Exception as e:
+                # Se conserva el snapshot anterior
+                print(f"Error refrescando datos de flota: {e}")
+                self._ultimo_error = str(e)
+                return False
+            finally:
+                self._refrescando = False
+
+    def solicitar(self):
+        """Pide un refresco en segundo plano (ej: después de escribir en Sheets)."""
+        self._iniciar_hilo()
+        self._evento.set()
+
+    def estado(self):
+        snapshot = self._snapshot
+        return {
+            'cargado_en': snapshot.cargado_en if snapshot else None,
+            'edad_segundos': snapshot.edad_segundos if snapshot else None,
+            'refrescando': self._refrescando,
+            'ultimo_intento': self._ultimo_intento,
+            'ultimo_error': self._ultimo_error,
+        }
+
+    # --- HILO DE REFRESCO ---
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock_hilo:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="fleet-refresher", daemon=True)
+                self._hilo.start()
+
+    def _cambio_revision(self, snapshot):
+        """True si el Spreadsheet cambió desde el snapshot (consulta barata a Drive)."""
+        try:
+            revision = self.conectar().get_revision()
+        except Exception as e:
+            print(f"Error consultando revisión: {e}")
+            return False
+        return revision is not None and revision != snapshot.revision
+
+    def _bucle(self):
+        while True:
+            solicitado = self._evento.wait(self.intervalo_revision)
+            self._evento.clear()
+            snapshot = self._snapshot
+            if (solicitado or snapshot is None or snapshot.edad_segundos >= self.intervalo
+                    or snapshot.clave.rsplit(':', 1)[-1] != str(date.today())
+                    or self._cambio_revision(snapshot)):
+                self.refrescar()
@@ -0,0 +1,79 @@
+"""
+Filtro, orden y paginación de la tabla de flota del lado del servidor.
+Las vistas construyen (y estilizan) solo la página visible; las métricas salen del frame completo.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+FILAS_POR_PAGINA = 25
+# Columnas donde busca el texto libre
+COLUMNAS_BUSQUEDA = ['id_activo', 'tipo_equipo', 'marca', 'modelo', 'accion']
+
+
+def _contiene(serie, texto):
+    """str.contains sin distinguir mayúsculas; en categóricas busca solo en las categorías."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        en_categoria = serie.cat.categories.astype(str).str.contains(texto, case=False, regex=False)
+        return np.asarray(en_categoria, dtype=bool)[codigos] & (codigos >= 0)
+    return serie.astype(str).str.contains(texto, case=False, regex=False).to_numpy(dtype=bool)
+
+
+def filtrar_flota(df, prioridades=None, tipos=None, horizonte_max=None, texto=None,
+                  columnas_texto=COLUMNAS_BUSQUEDA):
+    """
+    Filtra la flota con máscaras vectorizadas. None o vacío = sin filtro.
+    prioridades: lista de niveles (1 = crítico) | tipos: lista de tipo_equipo
+    horizonte_max: meses máximos hasta la acción | texto: búsqueda libre en columnas_texto
+    """
+    mascara = np.ones(len(df), dtype=bool)
+    if prioridades:
+        mascara &= df['prioridad'].isin(prioridades).to_numpy()
+    if tipos:
+        mascara &= df['tipo_equipo'].isin(tipos).to_numpy()
+    if horizonte_max is not None:
+        mascara &= (df['horizonte_meses'] <= horizonte_max).to_numpy()
+    texto = (texto or '').strip()
+    if texto:
+        coincide = np.zeros(len(df), dtype=bool)
+        for col in columnas_texto:
+            if col in df.columns:
+                coincide |= _contiene(df[col], texto)
+        mascara &= coincide
+    return df if mascara.all() else df[mascara]
+
+
+def _llave_orden(serie, ascendente):
+    """
+    Llave numérica para lexsort, en el mismo orden que sort_values: las categóricas por el orden
+    de sus categorías, los textos alfabéticamente y los vacíos al final.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        valores = np.where(codigos >= 0, codigos, np.nan)
+    elif pd.api.types.is_numeric_dtype(serie):
+        valores = serie.to_numpy(dtype=float)
+    else:
+        codigos, _ = pd.factorize(serie.astype(str), sort=True)
+        valores = np.where(serie.isna().to_numpy(), np.nan, codigos)
+    # Negar mantiene los NaN al final también en orden descendente
+    return valores if ascendente else -valores
+
+
+def paginar(df, orden=None, ascendente=True, pagina=1, por_pagina=FILAS_POR_PAGINA):
+    """
+    Ordena por 'orden' (columna o lista de columnas) y retorna (filas de la página, total de páginas).
+    Solo se reordenan las llaves; el frame se indexa una vez, para las filas visibles.
+    """
+    total_paginas = max(1, math.ceil(len(df) / por_pagina))
+    pagina = min(max(1, int(pagina)), total_paginas)
+    inicio = (pagina - 1) * por_pagina
+    if not orden:
+        return df.iloc[inicio:inicio + por_pagina], total_paginas
+
+    columnas = [orden] if isinstance(orden, str) else list(orden)
+    # lexsort ordena por la última llave primero; es estable, como sort_values
+    posiciones = np.lexsort([_llave_orden(df[c], ascendente) for c in reversed(columnas)])
+    return df.iloc[posiciones[inicio:inicio + por_pagina]], total_paginas
@@ -1,10 +1,182 @@
-import google.generativeai as genai
 import pandas as pd
+import queue
+import threading
+import time
+
+from utils.response_cache import ResponseCache
+from utils.prompt_context import ContextBuilder
+from utils.fingerprint import calcular_huella
+from utils.maintenance_cube import MaintenanceCube
+from utils.telemetry import get_telemetria, medido
+
+MENSAJE_TIMEOUT = "⏱️ La IA no respondió a tiempo ({segundos:g} s). Intenta nuevamente en unos minutos."
 
 class GeminiAnalyzer:
-    def __init__(self, api_key):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    def __init__(self, api_key, model_name='gemini-2.0-flash-exp', cache_dir=None, cache_ttl=24 * 3600,
+                 timeout=60, first_token_timeout=20, model=None, context_tokens=4000):
+        """
+        cache_dir: carpeta para el nivel en disco de la caché de respuestas (None = solo memoria).
+        cache_ttl: segundos que una respuesta se considera vigente.
+        timeout: plazo máximo total por llamada (segundos).
+        first_token_timeout: plazo máximo hasta el primer fragmento en modo streaming.
+        model: modelo ya construido (ej: FakeGenerativeModel para pruebas sin red).
+        context_tokens: presupuesto aproximado de tokens para el contexto de custom_query.
+        """
+        self.model_name = model_name
+        if model is None:
+            # El cliente (y sus dependencias gRPC) se carga solo al usar Gemini de verdad
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.timeout = timeout
+        self.first_token_timeout = first_token_timeout
+        self.cache = ResponseCache(cache_dir=cache_dir, ttl_seconds=cache_ttl)
+        self.context_tokens = context_tokens
+        self._ctx = None
+        self._ctx_lock = threading.Lock()
+
+    def respuesta_en_cache(self, prompt):
+        """Respuesta guardada para un prompt ya armado (None si no hay o expiró)."""
+        return self.cache.get(ResponseCache.make_key(prompt, self.model_name))
+
+    def analizar_prompt(self, prompt, regenerate=False):
+        """
+        Respuesta para un prompt ya armado, pasando por la caché. Retorna (texto, desde_cache).
+        Propaga TimeoutError y los errores del modelo: quien llama decide si reintenta.
+        """
+        if not regenerate:
+            cached = self.respuesta_en_cache(prompt)
+            if cached is not None:
+                return cached, True
+        text = self._call_model(prompt)
+        if text:
+            self.cache.set(ResponseCache.make_key(prompt, self.model_name), text, model_name=self.model_name)
+        return text, False
+
+    def _generate(self, prompt, regenerate=False):
+        """
+        Llama al modelo pasando por la caché (llave = hash del prompt final + modelo).
+        regenerate=True ignora la caché y guarda la respuesta nueva.
+        """
+        with get_telemetria().span('gemini.respuesta', cache=True, modo='completo') as span:
+            try:
+                text, desde_cache = self.analizar_prompt(prompt, regenerate=regenerate)
+            except TimeoutError:
+                span.marcar_cache(False)
+                span.marcar_error()
+                return MENSAJE_TIMEOUT.format(segundos=self.timeout)
+            except Exception as e:
+                # Los errores no se guardan en caché
+                span.marcar_cache(False)
+                span.marcar_error()
+                return f"Error: {str(e)}"
+            span.marcar_cache(desde_cache)
+            return text
+
+    def _call_model(self, prompt):
+        """
+        Llamada directa al modelo con plazo máximo (sin caché).
+        Lanza TimeoutError si vence el plazo y propaga los errores del modelo.
+        """
+        # La llamada corre en un hilo para poder cortar por plazo aunque el cliente no lo haga
+        resultado = {}
+
+        def _llamar():
+            try:
+                response = self.model.generate_content(prompt, request_options={'timeout': self.timeout})
+                resultado['text'] = response.text
+            except Exception as e:
+                resultado['error'] = e
+
+        hilo = threading.Thread(target=_llamar, daemon=True)
+        hilo.start()
+        hilo.join(self.timeout)
+        if hilo.is_alive():
+            raise TimeoutError(f"Gemini no respondió en {self.timeout:g} s")
+        if 'error' in resultado:
+            raise resultado['error']
+        return resultado['text']
+
+    def _stream(self, prompt, regenerate=False):
+        """
+        Generador de fragmentos de texto a medida que llegan del modelo.
+        Respeta first_token_timeout y timeout; al vencer emite un mensaje y termina.
+        La respuesta completa se guarda en caché solo si terminó bien y no vino vacía.
+        """
+        telemetria = get_telemetria()
+        inicio_span = time.perf_counter()
+        key = ResponseCache.make_key(prompt, self.model_name)
+        if not regenerate:
+            cached = self.cache.get(key)
+            if cached is not None:
+                telemetria.registrar('gemini.respuesta', time.perf_counter() - inicio_span, cache=True, modo='stream')
+                yield cached
+                return
+
+        fragmentos = queue.Queue()
+        cancelado = threading.Event()
+        FIN = object()
+
+        def _producir():
+            try:
+                response = self.model.generate_content(
+                    prompt, stream=True, request_options={'timeout': self.timeout}
+                )
+                for chunk in response:
+                    if cancelado.is_set():
+                        return
+                    fragmentos.put(chunk.text)
+            except Exception as e:
+                fragmentos.put(e)
+            fragmentos.put(FIN)
+
+        threading.Thread(target=_producir, daemon=True).start()
+
+        inicio = time.monotonic()
+        partes = []
+        completo = False
+        try:
+            while True:
+                restante = self.timeout - (time.monotonic() - inicio)
+                if not partes:
+                    restante = min(restante, self.first_token_timeout)
+                try:
+                    item = fragmentos.get(timeout=max(0, restante))
+                except queue.Empty:
+                    cancelado.set()
+                    if partes:
+                        yield "\n\n" + MENSAJE_TIMEOUT.format(segundos=self.timeout)
+                    else:
+                        yield MENSAJE_TIMEOUT.format(segundos=self.first_token_timeout)
+                    return
+                if item is FIN:
+                    break
+                if isinstance(item, Exception):
+                    yield f"Error: {str(item)}"
+                    return
+                partes.append(item)
+                yield item
+
+            # Un stream sin fragmentos no se guarda: quedaría como acierto vacío para este prompt
+            if partes:
+                self.cache.set(key, "".join(partes), model_name=self.model_name)
+            completo = True
+        finally:
+            # Hasta el último fragmento consumido (o el corte por plazo/error)
+            telemetria.registrar('gemini.respuesta', time.perf_counter() - inicio_span, cache=False,
+                                 error=not completo, modo='stream')
+
+    def _responder(self, prompt, regenerate=False, stream=False):
+        return self._stream(prompt, regenerate) if stream else self._generate(prompt, regenerate)
+
+    def _context_builder(self, activos_df, mantenimiento_df, cubo=None):
+        """ContextBuilder reutilizado mientras los datos no cambien (índices construidos una vez)."""
+        huella = calcular_huella(mantenimiento_df, activos_df[['id_activo', 'tipo_equipo']])
+        with self._ctx_lock:
+            if self._ctx is None or self._ctx[0] != huella:
+                self._ctx = (huella, ContextBuilder(mantenimiento_df, activos_df, cubo=cubo))
+            return self._ctx[1]
 
     def _ensure_costs(self, df):
         """Asegura que exista la columna de costo total"""
@@ -15,14 +187,28 @@ class GeminiAnalyzer:
                 df['costo_mantenimiento'] = 0
         return df
 
-    def generate_executive_summary(self, activos_df, mantenimiento_df, costos_df):
-        mantenimiento_df = self._ensure_costs(mantenimiento_df.copy())
+    def generate_executive_summary(self, activos_df, mantenimiento_df, costos_df, regenerate=False, stream=False,
+                                   cubo=None):
+        """
+        stream=True retorna un generador de fragmentos (para st.write_stream).
+        cubo: MaintenanceCube de mantenimiento_df (evita reagrupar el historial).
+        """
+        prompt = self.build_executive_summary_prompt(activos_df, mantenimiento_df, costos_df, cubo=cubo)
+        return self._responder(prompt, regenerate=regenerate, stream=stream)
+
+    @medido('gemini.prompt', tipo='resumen')
+    def build_executive_summary_prompt(self, activos_df, mantenimiento_df, costos_df, cubo=None):
+        if cubo is None:
+            cubo = MaintenanceCube.desde_mantenimiento(mantenimiento_df)
+        # Solo los registros recientes se muestran; los totales vienen del cubo
+        recientes = self._ensure_costs(mantenimiento_df.tail(10).copy())
         
         critical_assets = activos_df[activos_df['health_score'] < 40]
         avg_health = activos_df['health_score'].mean()
         
-        total_mant_cost = mantenimiento_df['costo_mantenimiento'].sum() if not mantenimiento_df.empty else 0
-        total_mant_events = len(mantenimiento_df)
+        totales = cubo.totales(medidas=['eventos', 'costo_mantenimiento'])
+        total_mant_cost = totales['costo_mantenimiento']
+        total_mant_events = int(totales['eventos'])
 
         prompt = f"""
 Eres un consultor experto en gestión de activos industriales. Genera un resumen ejecutivo profesional basado en estos datos:
@@ -40,24 +226,31 @@ Eres un consultor experto en gestión de activos industriales. Genera un resumen
 {critical_assets[['id_activo', 'tipo_equipo', 'health_score', 'accion']].to_string() if not critical_assets.empty else 'No hay activos críticos'}
 
 **HISTORIAL RECIENTE:**
-{mantenimiento_df[['fecha', 'id_activo', 'tipo_mantenimiento', 'costo_mantenimiento']].tail(10).to_string(index=False) if not mantenimiento_df.empty else 'Sin datos'}
+{recientes[['fecha', 'id_activo', 'tipo_mantenimiento', 'costo_mantenimiento']].to_string(index=False) if not recientes.empty else 'Sin datos'}
 
 Genera un resumen de 200 palabras enfocándote en gastos y riesgos.
 """
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error: {str(e)}"
+        return prompt
 
-    def analyze_asset(self, asset_data, mantenimiento_df, costos_df):
-        mantenimiento_df = self._ensure_costs(mantenimiento_df.copy())
-        
-        asset_mant = mantenimiento_df[mantenimiento_df['id_activo'] == asset_data['id_activo']]
-        
-        total_mant_cost = asset_mant['costo_mantenimiento'].sum() if not asset_mant.empty else 0
-        preventivos = len(asset_mant[asset_mant['tipo_mantenimiento'] == 'Preventivo'])
-        correctivos = len(asset_mant[asset_mant['tipo_mantenimiento'] == 'Correctivo'])
+    def analyze_asset(self, asset_data, mantenimiento_df, costos_df, regenerate=False, stream=False, cubo=None):
+        prompt = self.build_asset_prompt(asset_data, mantenimiento_df, costos_df, cubo=cubo)
+        return self._responder(prompt, regenerate=regenerate, stream=stream)
+
+    @medido('gemini.prompt', tipo='activo')
+    def build_asset_prompt(self, asset_data, mantenimiento_df, costos_df, cubo=None):
+        asset_mant = self._ensure_costs(
+            mantenimiento_df[mantenimiento_df['id_activo'] == asset_data['id_activo']].copy()
+        )
+        if cubo is None:
+            cubo = MaintenanceCube.desde_mantenimiento(asset_mant)
+
+        # Conteos y gasto desde el cubo; el historial solo se usa para el detalle
+        cubo_activo = cubo.filtrar(activos=[asset_data['id_activo']])
+        total_eventos = int(cubo_activo.totales(medidas=['eventos'])['eventos'])
+        total_mant_cost = cubo_activo.totales(medidas=['costo_mantenimiento'])['costo_mantenimiento']
+        por_tipo = cubo_activo.eventos_por_tipo()
+        preventivos = int(por_tipo.get('Preventivo', 0))
+        correctivos = int(por_tipo.get('Correctivo', 0))
 
         prompt = f"""
 Analiza este activo:
@@ -66,7 +259,7 @@ Health Score: {asset_data['health_score']:.1f}%
 Acción: {asset_data['accion']}
 
 **MANTENIMIENTO:**
-- Total eventos: {len(asset_mant)}
+- Total eventos: {total_eventos}
 - Preventivos: {preventivos} | Correctivos: {correctivos}
 - Gasto Total: ${total_mant_cost:,.0f} CLP
 
@@ -75,50 +268,25 @@ Acción: {asset_data['accion']}
 
 Diagnostica el estado y justifica el gasto realizado.
 """
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error: {str(e)}"
+        return prompt
+
+    def custom_query(self, activos_df, mantenimiento_df, costos_df, question, regenerate=False, stream=False,
+                     cubo=None):
+        prompt = self.build_custom_query_prompt(activos_df, mantenimiento_df, costos_df, question, cubo=cubo)
+        return self._responder(prompt, regenerate=regenerate, stream=stream)
 
-    def custom_query(self, activos_df, mantenimiento_df, costos_df, question):
+    @medido('gemini.prompt', tipo='pregunta')
+    def build_custom_query_prompt(self, activos_df, mantenimiento_df, costos_df, question, cubo=None):
         # 1. Preparar datos y asegurar costos
         mantenimiento_df = self._ensure_costs(mantenimiento_df.copy())
-        
-        # 2. CALCULAR TOTALES ROBUSTOS (ANUAL Y MENSUAL)
-        resumen_calculado = "No hay datos suficientes para cálculos."
-        
-        if 'fecha' in mantenimiento_df.columns and not mantenimiento_df.empty:
-            try:
-                # A. Totales por Año
-                gastos_anuales = mantenimiento_df.groupby(mantenimiento_df['fecha'].dt.year)['costo_mantenimiento'].sum()
-                txt_anual = "\n".join([f"- Año {anio}: ${monto:,.0f} CLP" for anio, monto in gastos_anuales.items()])
-                
-                # B. Totales por Mes (Formato YYYY-MM)
-                # Creamos columna temporal periodo
-                mantenimiento_df['periodo'] = mantenimiento_df['fecha'].dt.to_period('M')
-                gastos_mensuales = mantenimiento_df.groupby('periodo')['costo_mantenimiento'].sum()
-                # Tomamos los últimos 24 meses para no saturar, o todos si son pocos
-                txt_mensual = "\n".join([f"- {periodo}: ${monto:,.0f} CLP" for periodo, monto in gastos_mensuales.items()])
-                
-                resumen_calculado = f"""
-                **TOTALES ANUALES (USAR ESTO PARA PREGUNTAS GENERALES):**
-                {txt_anual}
-                
-                **TOTALES MENSUALES (USAR ESTO PARA DETALLES DE FECHAS):**
-                {txt_mensual}
-                """
-            except Exception as e:
-                resumen_calculado = f"Error calculando totales: {str(e)}"
 
-        # 3. Preparar contexto de filas (Detalle individual)
-        # Limitamos a las ultimas 50 transacciones para no romper el límite de tokens si hay muchos datos
-        cols_mant = ['fecha', 'id_activo', 'tipo_mantenimiento', 'descripcion', 'costo_repuestos', 'costo_mano_obra', 'costo_mantenimiento']
-        cols_final = [c for c in cols_mant if c in mantenimiento_df.columns]
-        
-        # Ordenamos por fecha descendente para que vea lo más reciente primero
-        df_sorted = mantenimiento_df.sort_values('fecha', ascending=False).head(50)
-        mant_context = df_sorted[cols_final].to_string(index=False) if not df_sorted.empty else 'Sin datos'
+        # 2. Contexto relevante a la pregunta (activos, fechas, tipos) dentro del presupuesto de tokens
+        try:
+            builder = self._context_builder(activos_df, mantenimiento_df, cubo=cubo)
+            resumen_calculado, mant_context, _ = builder.build(question, max_tokens=self.context_tokens)
+        except Exception as e:
+            resumen_calculado = f"Error calculando totales: {str(e)}"
+            mant_context = 'Sin datos'
 
         prompt = f"""
 Eres un asistente analítico de datos preciso para Concremag S.A.
@@ -126,7 +294,7 @@ Eres un asistente analítico de datos preciso para Concremag S.A.
 **DATOS PRE-CALCULADOS (VERDAD ABSOLUTA MATEMÁTICA):**
 {resumen_calculado}
 
-**DETALLE DE LOS ÚLTIMOS REGISTROS (Para contexto de qué se reparó):**
+**DETALLE DE REGISTROS RELEVANTES (Para contexto de qué se reparó):**
 {mant_context}
 
 **PREGUNTA DEL USUARIO:**
@@ -135,10 +303,7 @@ Eres un asistente analítico de datos preciso para Concremag S.A.
 INSTRUCCIONES CLAVE:
 1. Prioridad TOTAL a la sección "DATOS PRE-CALCULADOS". Si te preguntan "¿Cuánto se gastó en septiembre 2025?", busca "2025-09" en la lista mensual y da ese valor exacto. NO intentes sumar filas manualmente.
 2. Si te preguntan por un año, usa el total anual pre-calculado.
-3. Si la pregunta es sobre el *detalle* (ej: "¿Qué se rompió?"), usa la tabla de detalle.
+3. Si la pregunta menciona activos, fechas o tipos, usa el "TOTAL DE LOS REGISTROS QUE CALZAN CON LA PREGUNTA".
+4. Si la pregunta es sobre el *detalle* (ej: "¿Qué se rompió?"), usa la tabla de detalle.
 """
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error: {str(e)}"
+        return prompt
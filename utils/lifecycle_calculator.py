@@ -2,17 +2,96 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from utils.maintenance_cube import MaintenanceCube
+from utils.cost_index import CostTimeIndex
+from utils.telemetry import medido
+
+VIDA_UTIL_DEFAULT = 15000
+TASA_DEPRECIACION_DEFAULT = 0.15
+# Ventana del costo de mantención usado en scores y reglas económicas
+VENTANA_COSTO_MESES = 12
+
+
+def _potencia(base, exponente):
+    """base ** exponente en float64; base negativa -> NaN (con exponente no entero no hay real)."""
+    base = np.asarray(base, dtype=float)
+    return np.power(np.where(base >= 0, base, np.nan), exponente)
+
+
+# ---------------------------------------------------------
+# REGLAS DE RECOMENDACIÓN (se evalúan en orden, gana la primera)
+# ---------------------------------------------------------
+# health_max: aplica si health_score < health_max (None = sin límite)
+# costo_sobre_residual_min: aplica si costo_mant > valor_residual * ratio
+# impacto: suma de columna * factor (health, rul, costo_mant, valor_residual)
+REGLAS_RECOMENDACION = [
+    {
+        'health_max': 40,
+        'accion': "🔴 REEMPLAZO CRÍTICO",
+        'razon': "Confiabilidad comprometida y vida útil excedida",
+        'detalle': "Score ({health:.1f}%) bajo zona de seguridad. Alto riesgo de falla catastrófica.",
+        'horizonte_meses': 3,
+        'prioridad': 1,
+        'impacto': {'valor_residual': 0.2, 'costo_mant': 1.0},
+    },
+    {
+        # Chequeo económico: ¿Estamos gastando más de lo que vale la máquina?
+        'health_max': 60,
+        'costo_sobre_residual_min': 0.4,
+        'accion': "🟠 EVALUAR BAJA (ECONÓMICA)",
+        'razon': "Costo de mantenimiento supera el 40% del valor residual",
+        'detalle': "Gasto anual ${costo_mant:,.0f} vs Valor Residual ${valor_residual:,.0f}. No es rentable reparar.",
+        'horizonte_meses': 6,
+        'prioridad': 1,
+        'impacto': {'costo_mant': 1.0},
+    },
+    {
+        'health_max': 60,
+        'accion': "🟡 OVERHAUL / REPARACIÓN MAYOR",
+        'razon': "Desgaste medio-alto. Requiere intervención para extender vida.",
+        'detalle': "RUL: {rul:.0f} hrs. Planificar reparación mayor.",
+        'horizonte_meses': 6,
+        'prioridad': 2,
+        'impacto': {'costo_mant': 0.5},
+    },
+    {
+        'health_max': 85,
+        'accion': "🟢 MANTENIMIENTO PREVENTIVO",
+        'razon': "Operación normal con desgaste esperado",
+        'detalle': "Reforzar pautas preventivas según horómetro.",
+        'horizonte_meses': 12,
+        'prioridad': 3,
+        'impacto': {},
+    },
+    {
+        'health_max': None,
+        'accion': "✅ OPERACIÓN NORMAL",
+        'razon': "Equipo en óptimas condiciones",
+        'detalle': "Sin acciones correctivas requeridas.",
+        'horizonte_meses': 24,
+        'prioridad': 4,
+        'impacto': {},
+    },
+]
+
+
 class LifecycleCalculator:
+    # Subir la versión al cambiar fórmulas o reglas: invalida las métricas en caché
+    VERSION = "2.1"
     
     def calcular_health_score(self, row, df_mantenimiento, df_costos_ref):
+        """
+        Cálculo fila a fila (implementación de referencia).
+        La app usa calcular_scores_flota, que debe producir los mismos valores.
+        """
         id_activo = row['id_activo']
         tipo_equipo = row['tipo_equipo']
 
         # 1. OBTENER REFERENCIAS
         ref = df_costos_ref[df_costos_ref['tipo_equipo'] == tipo_equipo]
         if ref.empty:
-            vida_util_esperada = 15000
-            tasa_depreciacion = 0.15
+            vida_util_esperada = VIDA_UTIL_DEFAULT
+            tasa_depreciacion = TASA_DEPRECIACION_DEFAULT
         else:
             vida_util_esperada = ref['vida_util_esperada_horas'].values[0]
             tasa_depreciacion = ref['tasa_depreciacion_anual'].values[0]
@@ -75,93 +154,236 @@ class LifecycleCalculator:
 
         return health_score, rul_horas
 
-    def calcular_metricas_completas(self, df_activos, df_mantenimiento, df_costos_ref):
+    def agregar_mantenimiento(self, df_mantenimiento, cubo=None):
+        """
+        Agregados por id_activo leídos del cubo de mantenimiento (se construye si no se entrega).
+        Retorna: total_eventos, eventos_correctivos, gasto_total, gasto_correctivo
+        """
+        if cubo is None:
+            cubo = MaintenanceCube.desde_mantenimiento(df_mantenimiento)
+        return cubo.por_activo()
+
+    def referencias_por_tipo(self, df_costos_ref):
+        """Primera fila de referencia por tipo_equipo (igual que el cálculo fila a fila)."""
+        if df_costos_ref is None or df_costos_ref.empty or 'tipo_equipo' not in df_costos_ref.columns:
+            return pd.DataFrame(columns=['vida_util_esperada_horas', 'tasa_depreciacion_anual'], dtype=float)
+        return df_costos_ref.drop_duplicates('tipo_equipo', keep='first').set_index('tipo_equipo')
+
+    def vida_util_flota(self, tipos_equipo, df_costos_ref):
+        """Vida útil esperada por activo (merge único por tipo_equipo, VIDA_UTIL_DEFAULT si no hay referencia)."""
+        refs = self.referencias_por_tipo(df_costos_ref)
+        if 'vida_util_esperada_horas' not in refs.columns:
+            return np.full(len(tipos_equipo), float(VIDA_UTIL_DEFAULT))
+        con_ref = tipos_equipo.isin(refs.index).to_numpy()
+        vida_util = tipos_equipo.map(refs['vida_util_esperada_horas']).to_numpy(dtype=float)
+        return np.where(con_ref, vida_util, VIDA_UTIL_DEFAULT)
+
+    def calcular_scores_flota(self, df_activos, df_mantenimiento, df_costos_ref, agregados=None,
+                              indice_costos=None, referencia=None):
+        """
+        Versión columnar de calcular_health_score para toda la flota.
+        Agrupa mantenimiento y referencias una sola vez y calcula los scores con NumPy.
+        indice_costos: CostTimeIndex del historial (costo real de los últimos VENTANA_COSTO_MESES).
+        referencia: fecha de cierre de la ventana (hoy por defecto).
+        """
         df = df_activos.copy()
+        if agregados is None:
+            agregados = self.agregar_mantenimiento(df_mantenimiento)
+        if indice_costos is None:
+            indice_costos = CostTimeIndex.desde_mantenimiento(df_mantenimiento)
+        vida_util = self.vida_util_flota(df['tipo_equipo'], df_costos_ref)
 
-        # Aplicar cálculo fila por fila
-        resultados = df.apply(
-            lambda row: self.calcular_health_score(row, df_mantenimiento, df_costos_ref),
-            axis=1
+        horometro = df['horometro_actual'].to_numpy(dtype=float)
+        edad = df['edad_anos'].to_numpy(dtype=float)
+
+        agg = agregados.reindex(df['id_activo'])
+        scores = self.scores_desde_arrays(
+            horometro, edad, vida_util,
+            agg['total_eventos'].fillna(0).to_numpy(dtype=float),
+            agg['eventos_correctivos'].fillna(0).to_numpy(dtype=float),
+            agg['gasto_total'].fillna(0).to_numpy(dtype=float),
+            agg['gasto_correctivo'].fillna(0).to_numpy(dtype=float),
         )
-        
-        # Desempaquetar resultados
-        df['health_score'] = [x[0] for x in resultados]
-        df['rul_horas'] = [x[1] for x in resultados]
-
-        # Calcular costo último año de forma segura
-        def get_costo_anual(id_act):
-            filtro = df_mantenimiento[df_mantenimiento['id_activo'] == id_act]
-            if filtro.empty: return 0
-            if 'costo_mantenimiento' in filtro.columns:
-                return filtro['costo_mantenimiento'].sum()
-            elif 'costo_repuestos' in filtro.columns:
-                return filtro['costo_repuestos'].sum() + filtro['costo_mano_obra'].sum()
-            return 0
-
-        df['costo_mantencion_ultimo_ano'] = df['id_activo'].apply(get_costo_anual)
-
-        # Generar recomendaciones
-        recomendaciones = df.apply(
-            lambda row: self.recomendar_accion(row, df_costos_ref),
-            axis=1
+        for columna, valores in scores.items():
+            df[columna] = valores
+        df['costo_mantencion_ultimo_ano'] = indice_costos.costos_ventana(
+            df['id_activo'], meses=VENTANA_COSTO_MESES, referencia=referencia
+        ).to_numpy()
+        return df
+
+    def scores_desde_arrays(self, horometro, edad, vida_util, total_eventos=None, eventos_correctivos=None,
+                            gasto_total=None, gasto_correctivo=None, score_confiabilidad=None):
+        """
+        Fórmulas del health score sobre arrays NumPy.
+        Admite broadcasting (ej: escenarios × activos en ScenarioEngine, activos × meses en DegradationForecast).
+        score_confiabilidad: si se entrega (ej: la actual, en una proyección), no se calcula desde los eventos.
+        """
+        # 1. DESGASTE FÍSICO
+        with np.errstate(divide='ignore', invalid='ignore'):
+            uso_pct = np.minimum(horometro / vida_util, 1.5)
+            score_uso = np.fmax(0, 100 * (1 - _potencia(uso_pct, 1.2)))
+
+        # 2. CONFIABILIDAD
+        if score_confiabilidad is None:
+            con_eventos = total_eventos > 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                tasa_fallas = np.where(con_eventos, eventos_correctivos / total_eventos, 0)
+                ratio_correctivo = np.where(gasto_total > 0, gasto_correctivo / gasto_total, 0)
+            score_confiabilidad = np.where(con_eventos, np.fmax(0, 100 - (tasa_fallas * 100)), 100)
+            penalizacion = np.where(con_eventos & (gasto_total > 0) & (ratio_correctivo > 0.6), 10, 0)
+            score_confiabilidad = np.fmax(0, score_confiabilidad - penalizacion)
+
+        # 3. EDAD
+        score_edad = np.fmax(0, 100 * np.exp(-0.1 * edad))
+
+        # 4. CALCULO FINAL
+        return {
+            'score_uso': score_uso,
+            'score_edad': score_edad,
+            'score_confiabilidad': score_confiabilidad,
+            'health_score': (score_uso * 0.30) + (score_edad * 0.20) + (score_confiabilidad * 0.50),
+            'rul_horas': np.fmax(0, vida_util - horometro),
+        }
+
+    @medido('lifecycle.calcular_metricas_completas')
+    def calcular_metricas_completas(self, df_activos, df_mantenimiento, df_costos_ref, agregados=None,
+                                    indice_costos=None, referencia=None):
+        # Scores de toda la flota en una sola pasada columnar
+        df = self.calcular_scores_flota(df_activos, df_mantenimiento, df_costos_ref, agregados=agregados,
+                                        indice_costos=indice_costos, referencia=referencia)
+
+        # Recomendaciones evaluadas sobre columnas completas
+        return self.recomendar_acciones_flota(df)
+
+    def actualizar_mantenimiento(self, df_flota, agregados, df_nuevos, df_costos_ref, indice_costos=None,
+                                 referencia=None):
+        """
+        Aplica registros de mantenimiento nuevos sin recalcular toda la flota.
+        Suma los nuevos eventos a los agregados y recalcula solo los activos afectados.
+        indice_costos: índice que ya incluye df_nuevos. Sin él, al costo de la ventana
+        se le suman los registros nuevos que caen dentro de ella.
+        Retorna (df_flota, agregados) actualizados.
+        """
+        delta = self.agregar_mantenimiento(df_nuevos)
+        if delta.empty:
+            return df_flota, agregados
+
+        agregados = agregados.add(delta, fill_value=0)
+        afectados = df_flota['id_activo'].isin(delta.index)
+        if not afectados.any():
+            return df_flota, agregados
+
+        sub = self.calcular_scores_flota(df_flota[afectados], None, df_costos_ref, agregados=agregados,
+                                         indice_costos=indice_costos, referencia=referencia)
+        if indice_costos is None:
+            # Costo previo de la ventana + registros nuevos que caen dentro de ella
+            nuevos = CostTimeIndex.desde_mantenimiento(df_nuevos).costos_ventana(
+                sub['id_activo'], meses=VENTANA_COSTO_MESES, referencia=referencia
+            )
+            sub['costo_mantencion_ultimo_ano'] = (
+                df_flota.loc[afectados, 'costo_mantencion_ultimo_ano'].to_numpy(dtype=float) + nuevos.to_numpy()
+            )
+        sub = self.recomendar_acciones_flota(sub)
+
+        df_flota = df_flota.copy()
+        df_flota.loc[afectados, sub.columns] = sub
+        return df_flota, agregados
+
+    def evaluar_reglas(self, health, rul, costo_mant, valor_residual):
+        """
+        Índice en REGLAS_RECOMENDACION (primera regla que se cumple) e impacto económico.
+        Arrays de cualquier forma compatible (ej: escenarios × activos).
+        """
+        health, rul, costo_mant, valor_residual = np.broadcast_arrays(
+            np.asarray(health, dtype=float), np.asarray(rul, dtype=float),
+            np.asarray(costo_mant, dtype=float), np.asarray(valor_residual, dtype=float)
         )
-        
-        # Asignar columnas de recomendación
-        col_names = ['accion', 'razon', 'detalle', 'horizonte_meses', 'prioridad', 'impacto_economico_clp']
-        for i, col in enumerate(col_names):
-            df[col] = [x[i] for x in recomendaciones]
+        columnas = {'health': health, 'rul': rul, 'costo_mant': costo_mant, 'valor_residual': valor_residual}
 
-        return df
+        regla_idx = np.full(health.shape, -1)
+        for i, regla in enumerate(REGLAS_RECOMENDACION):
+            cumple = regla_idx == -1
+            if regla.get('health_max') is not None:
+                cumple &= health < regla['health_max']
+            ratio = regla.get('costo_sobre_residual_min')
+            if ratio is not None:
+                cumple &= (valor_residual > 0) & (costo_mant > valor_residual * ratio)
+            regla_idx[cumple] = i
 
-    def recomendar_accion(self, row, df_costos_ref):
-        health = row['health_score']
-        rul = row['rul_horas']
-        costo_mant = row.get('costo_mantencion_ultimo_ano', 0)
-        valor_residual = row['valor_residual_estimado'] # Usamos valor residual, es más realista que valor compra
-
-        # Umbrales ajustados para mayor sensibilidad
-        if health < 40:
-            accion = "🔴 REEMPLAZO CRÍTICO"
-            razon = "Confiabilidad comprometida y vida útil excedida"
-            detalle = f"Score ({health:.1f}%) bajo zona de seguridad. Alto riesgo de falla catastrófica."
-            horizonte_meses = 3
-            prioridad = 1
-            impacto = valor_residual * 0.2 + costo_mant # Impacto alto
-
-        elif health < 60:
-            # Chequeo económico: ¿Estamos gastando más de lo que vale la máquina?
-            if valor_residual > 0 and (costo_mant > valor_residual * 0.4):
-                accion = "🟠 EVALUAR BAJA (ECONÓMICA)"
-                razon = "Costo de mantenimiento supera el 40% del valor residual"
-                detalle = f"Gasto anual ${costo_mant:,.0f} vs Valor Residual ${valor_residual:,.0f}. No es rentable reparar."
-                horizonte_meses = 6
-                prioridad = 1
-                impacto = costo_mant
-            else:
-                accion = "🟡 OVERHAUL / REPARACIÓN MAYOR"
-                razon = "Desgaste medio-alto. Requiere intervención para extender vida."
-                detalle = f"RUL: {rul:.0f} hrs. Planificar reparación mayor."
-                horizonte_meses = 6
-                prioridad = 2
-                impacto = costo_mant * 0.5
-
-        elif health < 85:
-            accion = "🟢 MANTENIMIENTO PREVENTIVO"
-            razon = "Operación normal con desgaste esperado"
-            detalle = "Reforzar pautas preventivas según horómetro."
-            horizonte_meses = 12
-            prioridad = 3
-            impacto = 0
+        impacto = np.zeros(health.shape)
+        for i, regla in enumerate(REGLAS_RECOMENDACION):
+            mask = regla_idx == i
+            if not mask.any():
+                continue
+            monto = np.zeros(int(mask.sum()))
+            for col, factor in regla['impacto'].items():
+                monto = monto + columnas[col][mask] * factor
+            impacto[mask] = monto
+        return regla_idx, impacto
 
+    def recomendar_acciones_flota(self, df):
+        """
+        Evalúa REGLAS_RECOMENDACION sobre toda la flota.
+        La primera regla que se cumple define la recomendación de cada activo.
+        """
+        df = df.copy()
+        n = len(df)
+        health = df['health_score'].to_numpy(dtype=float)
+        rul = df['rul_horas'].to_numpy(dtype=float)
+        if 'costo_mantencion_ultimo_ano' in df.columns:
+            costo_mant = df['costo_mantencion_ultimo_ano'].to_numpy(dtype=float)
         else:
-            accion = "✅ OPERACIÓN NORMAL"
-            razon = "Equipo en óptimas condiciones"
-            detalle = "Sin acciones correctivas requeridas."
-            horizonte_meses = 24
-            prioridad = 4
-            impacto = 0
-
-        return accion, razon, detalle, horizonte_meses, prioridad, impacto
+            costo_mant = np.zeros(n)
+        valor_residual = df['valor_residual_estimado'].to_numpy(dtype=float)
+        columnas = {'health': health, 'rul': rul, 'costo_mant': costo_mant, 'valor_residual': valor_residual}
+
+        regla_idx, impacto = self.evaluar_reglas(health, rul, costo_mant, valor_residual)
+
+        accion = np.empty(n, dtype=object)
+        razon = np.empty(n, dtype=object)
+        detalle = np.empty(n, dtype=object)
+        horizonte = np.zeros(n, dtype=int)
+        prioridad = np.zeros(n, dtype=int)
+
+        for i, regla in enumerate(REGLAS_RECOMENDACION):
+            mask = regla_idx == i
+            if not mask.any():
+                continue
+            accion[mask] = regla['accion']
+            razon[mask] = regla['razon']
+            horizonte[mask] = regla['horizonte_meses']
+            prioridad[mask] = regla['prioridad']
+
+            # Solo formateamos las filas que usan la plantilla
+            plantilla = regla['detalle']
+            if '{' in plantilla:
+                valores = {k: v[mask] for k, v in columnas.items()}
+                detalle[mask] = [
+                    plantilla.format(**{k: valores[k][j] for k in valores})
+                    for j in range(int(mask.sum()))
+                ]
+            else:
+                detalle[mask] = plantilla
+
+        df['accion'] = accion
+        df['razon'] = razon
+        df['detalle'] = detalle
+        df['horizonte_meses'] = horizonte
+        df['prioridad'] = prioridad
+        df['impacto_economico_clp'] = impacto
+        return df
+
+    def recomendar_accion(self, row, df_costos_ref):
+        """Recomendación de un solo activo (usa la misma tabla de reglas que la flota)."""
+        df_row = pd.DataFrame([{
+            'health_score': row['health_score'],
+            'rul_horas': row['rul_horas'],
+            'costo_mantencion_ultimo_ano': row.get('costo_mantencion_ultimo_ano', 0),
+            'valor_residual_estimado': row['valor_residual_estimado'],
+        }])
+        rec = self.recomendar_acciones_flota(df_row).iloc[0]
+        return (rec['accion'], rec['razon'], rec['detalle'], rec['horizonte_meses'],
+                rec['prioridad'], rec['impacto_economico_clp'])
 
     def priorizar_flota(self, df):
         # Ordenar por prioridad (ascendente) y health_score (ascendente)
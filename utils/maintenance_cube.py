@@ -0,0 +1,159 @@
+"""
+Cubo de agregados de mantenimiento: activo × mes × tipo_mantenimiento.
+Se materializa una vez por carga de datos y lo leen el dashboard, la IA y el calculador
+en lugar de volver a agrupar el historial completo.
+"""
+import numpy as np
+import pandas as pd
+
+DIMENSIONES = ['id_activo', 'periodo', 'tipo_mantenimiento']
+MEDIDAS = ['eventos', 'costo_repuestos', 'costo_mano_obra', 'costo_mantenimiento', 'horas_parada']
+
+
+class MaintenanceCube:
+    def __init__(self, datos=None):
+        """
+        datos: celdas del cubo (DIMENSIONES + MEDIDAS + anio/mes derivados).
+        Normalmente se construye con MaintenanceCube.desde_mantenimiento.
+        """
+        if datos is None:
+            datos = pd.DataFrame({
+                'id_activo': pd.Series(dtype=object),
+                'periodo': pd.Series(dtype='period[M]'),
+                'tipo_mantenimiento': pd.Series(dtype=object),
+                **{m: pd.Series(dtype=float) for m in MEDIDAS},
+                'anio': pd.Series(dtype='Int64'),
+                'mes': pd.Series(dtype='Int64'),
+            })
+        self.datos = datos
+
+    @classmethod
+    def desde_mantenimiento(cls, df_mantenimiento):
+        """Agrupa el historial limpio en una sola pasada."""
+        if df_mantenimiento is None or df_mantenimiento.empty or 'id_activo' not in df_mantenimiento.columns:
+            return cls()
+
+        def _col(nombre):
+            if nombre in df_mantenimiento.columns:
+                return df_mantenimiento[nombre]
+            return pd.Series(0.0, index=df_mantenimiento.index)
+
+        if 'costo_mantenimiento' in df_mantenimiento.columns:
+            costo = df_mantenimiento['costo_mantenimiento']
+        else:
+            costo = _col('costo_repuestos') + _col('costo_mano_obra')
+        if 'fecha' in df_mantenimiento.columns:
+            periodo = df_mantenimiento['fecha'].dt.to_period('M')
+        else:
+            periodo = pd.Series(pd.NaT, index=df_mantenimiento.index, dtype='period[M]')
+        if 'tipo_mantenimiento' in df_mantenimiento.columns:
+            tipo = df_mantenimiento['tipo_mantenimiento']
+        else:
+            tipo = pd.Series('', index=df_mantenimiento.index)
+
+        base = pd.DataFrame({
+            'id_activo': df_mantenimiento['id_activo'],
+            'periodo': periodo,
+            'tipo_mantenimiento': tipo,
+            'eventos': 1,
+            'costo_repuestos': _col('costo_repuestos'),
+            'costo_mano_obra': _col('costo_mano_obra'),
+            'costo_mantenimiento': costo,
+            'horas_parada': _col('horas_parada'),
+        })
+        return cls._agrupar(base)
+
+    @staticmethod
+    def _agrupar(base):
+        # dropna=False: los registros sin fecha siguen contando en los totales por activo
+        datos = base.groupby(DIMENSIONES, sort=True, observed=True, dropna=False)[MEDIDAS].sum().reset_index()
+        for dim in ('id_activo', 'tipo_mantenimiento'):
+            # Ids planos: el cubo se combina con registros nuevos que traen otras categorías
+            datos[dim] = datos[dim].astype(object)
+        datos['eventos'] = datos['eventos'].astype(np.int64)
+        # Sin fecha -> <NA> (el accessor .dt entrega -1 para NaT)
+        con_fecha = datos['periodo'].notna()
+        datos['anio'] = datos['periodo'].dt.year.astype('Int64').where(con_fecha)
+        datos['mes'] = datos['periodo'].dt.month.astype('Int64').where(con_fecha)
+        return MaintenanceCube(datos)
+
+    @property
+    def empty(self):
+        return self.datos.empty
+
+    def __len__(self):
+        return len(self.datos)
+
+    def agregar(self, df_nuevos):
+        """Cubo nuevo con registros adicionales (solo se agrupan los nuevos y las celdas del cubo)."""
+        delta = MaintenanceCube.desde_mantenimiento(df_nuevos)
+        if delta.empty:
+            return self
+        base = pd.concat([self.datos, delta.datos], ignore_index=True)[DIMENSIONES + MEDIDAS]
+        return self._agrupar(base)
+
+    # --- SLICE ---
+    def filtrar(self, activos=None, tipos=None, periodos=None, anios=None, meses=None, desde=None, hasta=None):
+        """
+        Sub-cubo con las celdas que cumplen todos los filtros dados (None = sin filtro).
+        periodos: lista de (año, mes); desde/hasta: fechas o 'YYYY-MM' (inclusive).
+        """
+        d = self.datos
+        mask = np.ones(len(d), dtype=bool)
+        if activos is not None:
+            mask &= d['id_activo'].isin(list(activos)).to_numpy()
+        if tipos is not None:
+            mask &= d['tipo_mantenimiento'].isin(list(tipos)).to_numpy()
+        if periodos is not None:
+            claves = (d['anio'] * 100 + d['mes']).fillna(0)
+            mask &= claves.isin([a * 100 + m for a, m in periodos]).to_numpy()
+        if anios is not None:
+            mask &= d['anio'].isin(list(anios)).fillna(False).to_numpy(dtype=bool)
+        if meses is not None:
+            mask &= d['mes'].isin(list(meses)).fillna(False).to_numpy(dtype=bool)
+        if desde is not None:
+            mask &= (d['periodo'] >= pd.Period(desde, 'M')).to_numpy()
+        if hasta is not None:
+            mask &= (d['periodo'] <= pd.Period(hasta, 'M')).to_numpy()
+        if mask.all():
+            return self
+        return MaintenanceCube(d[mask].reset_index(drop=True))
+
+    # --- ROLL-UP ---
+    def totales(self, por=None, medidas=None):
+        """
+        Suma las medidas agrupando por una o más dimensiones.
+        por: None (total general, Series), 'id_activo', 'periodo', 'anio', 'mes',
+             'tipo_mantenimiento' o una lista de ellas.
+        Las celdas sin fecha no aparecen en los roll-ups por periodo/anio/mes.
+        """
+        medidas = medidas or MEDIDAS
+        if por is None:
+            return self.datos[medidas].sum()
+        return self.datos.groupby(por, sort=True)[medidas].sum()
+
+    def totales_anuales(self, medida='costo_mantenimiento'):
+        return self.totales('anio', [medida])[medida]
+
+    def totales_mensuales(self, medida='costo_mantenimiento'):
+        return self.totales('periodo', [medida])[medida]
+
+    def por_activo(self):
+        """Eventos y gastos por activo, con el desglose correctivo que usa el health score."""
+        d = self.datos
+        if d.empty:
+            return pd.DataFrame(columns=['total_eventos', 'eventos_correctivos', 'gasto_total', 'gasto_correctivo'],
+                                dtype=float)
+        es_correctivo = (d['tipo_mantenimiento'] == 'Correctivo').to_numpy()
+        base = pd.DataFrame({
+            'id_activo': d['id_activo'],
+            'total_eventos': d['eventos'],
+            'eventos_correctivos': np.where(es_correctivo, d['eventos'], 0),
+            'gasto_total': d['costo_mantenimiento'],
+            'gasto_correctivo': np.where(es_correctivo, d['costo_mantenimiento'], 0.0),
+        })
+        return base.groupby('id_activo', sort=False).sum()
+
+    def eventos_por_tipo(self):
+        """Cantidad de eventos por tipo_mantenimiento."""
+        return self.totales('tipo_mantenimiento', ['eventos'])['eventos']
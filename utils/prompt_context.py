@@ -0,0 +1,303 @@
+"""
+Constructor de contexto para preguntas libres a la IA.
+Extrae activos, fechas y tipos de la pregunta, selecciona solo los totales y
+registros relevantes mediante índices y ajusta el resultado a un presupuesto de tokens.
+"""
+import re
+
+import numpy as np
+
+from utils.maintenance_cube import MaintenanceCube
+
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12,
+}
+
+TIPOS_MANTENIMIENTO = {'preventiv': 'Preventivo', 'correctiv': 'Correctivo', 'predictiv': 'Predictivo'}
+
+COLUMNAS_DETALLE = ['fecha', 'id_activo', 'tipo_mantenimiento', 'descripcion',
+                    'costo_repuestos', 'costo_mano_obra', 'costo_mantenimiento']
+
+# Meses recientes a mostrar cuando la pregunta no menciona fechas
+MESES_RECIENTES = 24
+# Máximo de líneas activo/año en los totales filtrados
+MAX_LINEAS_ACTIVO = 60
+# Máximo de registros de detalle (los totales ya traen las sumas exactas)
+MAX_FILAS_DETALLE = 50
+# Tokens de la plantilla del prompt de custom_query (instrucciones y títulos)
+RESERVA_PLANTILLA = 300
+# Avisos del detalle cuando no hay filas que mostrar (el más largo queda reservado en el presupuesto)
+SIN_DATOS = 'Sin datos'
+SIN_REGISTROS = 'Sin registros para los filtros de la pregunta.'
+SIN_ESPACIO = 'Sin espacio para detalle.'
+
+
+def estimar_tokens(texto):
+    """Estimación rápida: ~4 caracteres por token."""
+    return len(texto) // 4 + 1
+
+
+def _costo_linea(linea):
+    """Tokens de una línea con su salto: la suma por líneas no queda bajo estimar_tokens del texto unido."""
+    return estimar_tokens(linea + "\n")
+
+
+class ContextBuilder:
+    def __init__(self, mantenimiento_df, activos_df=None, cubo=None):
+        """
+        mantenimiento_df: historial limpio (con costo_mantenimiento y fecha).
+        activos_df: flota (para resolver tipo_equipo -> activos).
+        cubo: MaintenanceCube de los mismos datos (se construye si no se entrega).
+        Los índices se construyen una sola vez por versión de datos.
+        """
+        self.df = mantenimiento_df.reset_index(drop=True)
+        self.cubo = cubo if cubo is not None else MaintenanceCube.desde_mantenimiento(self.df)
+        self.ids = {}
+        self.tipos_equipo = {}
+
+        self.idx_activo, self.idx_anio, self.idx_periodo, self.idx_mes, self.idx_tipo = {}, {}, {}, {}, {}
+        self.orden_fecha = np.array([], dtype=np.intp)
+
+        if not self.df.empty and 'id_activo' in self.df.columns:
+            self.idx_activo = {str(k): v for k, v in self.df.groupby('id_activo', observed=True).indices.items()}
+            self.ids.update({str(k).lower(): str(k) for k in self.idx_activo})
+        if not self.df.empty and 'tipo_mantenimiento' in self.df.columns:
+            self.idx_tipo = {str(k): v for k, v in self.df.groupby('tipo_mantenimiento', observed=True).indices.items()}
+        if not self.df.empty and 'fecha' in self.df.columns:
+            fechas = self.df['fecha']
+            anio, mes = fechas.dt.year, fechas.dt.month
+            self.idx_anio = {int(k): v for k, v in self.df.groupby(anio).indices.items()}
+            self.idx_mes = {int(k): v for k, v in self.df.groupby(mes).indices.items()}
+            self.idx_periodo = {(int(a), int(m)): v for (a, m), v in self.df.groupby([anio, mes]).indices.items()}
+            # Posiciones ordenadas de más reciente a más antigua (NaT al final)
+            self.orden_fecha = fechas.sort_values(ascending=False, na_position='last', kind='stable').index.to_numpy()
+
+        if activos_df is not None and not activos_df.empty and 'id_activo' in activos_df.columns:
+            self.ids.update({str(k).lower(): str(k) for k in activos_df['id_activo']})
+            if 'tipo_equipo' in activos_df.columns:
+                for tipo, grupo in activos_df.groupby('tipo_equipo', observed=True)['id_activo']:
+                    self.tipos_equipo[str(tipo).lower()] = [str(x) for x in grupo]
+
+        # Totales de la flota (leídos del cubo)
+        self.totales_anuales = self.cubo.totales_anuales()
+        self.totales_mensuales = self.cubo.totales_mensuales()
+
+    # --- EXTRACCIÓN DE FILTROS ---
+    def extraer_filtros(self, question):
+        """Retorna dict con activos, tipos_equipo, tipos_mantenimiento, anios, meses y periodos."""
+        q = question.lower()
+        tokens = set(re.findall(r'[\w\-]+', q))
+
+        activos = sorted({self.ids[t] for t in tokens if t in self.ids})
+        tipos_equipo = sorted(t for t in self.tipos_equipo if t in q)
+        tipos_mant = sorted({v for k, v in TIPOS_MANTENIMIENTO.items() if k in q})
+
+        periodos = set()
+        for a, m in re.findall(r'\b(19\d{2}|20\d{2})[-/](\d{1,2})\b', q):
+            periodos.add((int(a), int(m)))
+        for m, a in re.findall(r'\b(\d{1,2})[-/](19\d{2}|20\d{2})\b', q):
+            periodos.add((int(a), int(m)))
+        for nombre, a in re.findall(r'\b(' + '|'.join(MESES) + r')\s+(?:de\s+|del\s+)?(19\d{2}|20\d{2})\b', q):
+            periodos.add((int(a), MESES[nombre]))
+        periodos = {(a, m) for a, m in periodos if 1 <= m <= 12}
+
+        meses = sorted({MESES[t] for t in tokens if t in MESES})
+        anios = sorted({int(a) for a in re.findall(r'\b(19\d{2}|20\d{2})\b', q)})
+
+        return {'activos': activos, 'tipos_equipo': tipos_equipo, 'tipos_mantenimiento': tipos_mant,
+                'anios': anios, 'meses': meses, 'periodos': sorted(periodos)}
+
+    # --- SELECCIÓN POR ÍNDICES ---
+    def _union(self, indice, llaves):
+        partes = [indice[k] for k in llaves if k in indice]
+        return np.unique(np.concatenate(partes)) if partes else np.array([], dtype=np.intp)
+
+    def seleccionar(self, filtros):
+        """Posiciones de registros que cumplen todos los filtros presentes (None = sin filtro)."""
+        seleccion = None
+
+        activos = self._activos_filtrados(filtros)
+        if activos:
+            seleccion = self._union(self.idx_activo, activos)
+
+        if filtros['periodos']:
+            tiempo = self._union(self.idx_periodo, filtros['periodos'])
+        elif filtros['meses'] and filtros['anios']:
+            tiempo = self._union(self.idx_periodo, [(a, m) for a in filtros['anios'] for m in filtros['meses']])
+        elif filtros['meses']:
+            tiempo = self._union(self.idx_mes, filtros['meses'])
+        elif filtros['anios']:
+            tiempo = self._union(self.idx_anio, filtros['anios'])
+        else:
+            tiempo = None
+        if tiempo is not None:
+            seleccion = tiempo if seleccion is None else np.intersect1d(seleccion, tiempo, assume_unique=True)
+
+        if filtros['tipos_mantenimiento']:
+            tipo = self._union(self.idx_tipo, filtros['tipos_mantenimiento'])
+            seleccion = tipo if seleccion is None else np.intersect1d(seleccion, tipo, assume_unique=True)
+
+        return seleccion
+
+    def _activos_filtrados(self, filtros):
+        activos = list(filtros['activos'])
+        for tipo in filtros['tipos_equipo']:
+            activos.extend(self.tipos_equipo.get(tipo, []))
+        return activos
+
+    def filtrar_cubo(self, filtros):
+        """Mismos filtros que seleccionar, aplicados sobre el cubo (para totales exactos)."""
+        activos = self._activos_filtrados(filtros)
+        kwargs = {}
+        if activos:
+            kwargs['activos'] = activos
+        if filtros['periodos']:
+            kwargs['periodos'] = filtros['periodos']
+        elif filtros['meses'] and filtros['anios']:
+            kwargs['periodos'] = [(a, m) for a in filtros['anios'] for m in filtros['meses']]
+        elif filtros['meses']:
+            kwargs['meses'] = filtros['meses']
+        elif filtros['anios']:
+            kwargs['anios'] = filtros['anios']
+        if filtros['tipos_mantenimiento']:
+            kwargs['tipos'] = filtros['tipos_mantenimiento']
+        return self.cubo.filtrar(**kwargs) if kwargs else None
+
+    # --- ARMADO DEL CONTEXTO ---
+    @staticmethod
+    def _ajustar_secciones(secciones, presupuesto_tokens):
+        """
+        Recorta secciones {'encabezado', 'lineas', 'prioridad', 'recientes'} al presupuesto.
+        Se llenan por prioridad (0 primero); una sección sin espacio para su encabezado se omite y
+        las recortadas guardan sus líneas más recientes (recientes=True) o las primeras, con una
+        nota de lo omitido. Retorna el texto en el orden original de las secciones.
+        """
+        restante = presupuesto_tokens
+        elegidas = {}
+        for i in sorted(range(len(secciones)), key=lambda j: secciones[j]['prioridad']):
+            seccion = secciones[i]
+            costo_encabezado = sum(_costo_linea(l) for l in seccion['encabezado'])
+            if costo_encabezado > restante:
+                continue
+            restante -= costo_encabezado
+            lineas = seccion['lineas'][::-1] if seccion['recientes'] else list(seccion['lineas'])
+            nota = f"- ... y {len(lineas)} líneas más omitidas por espacio (incluidas en los totales)"
+            costo_nota = _costo_linea(nota)
+            tomadas = []
+            for j, linea in enumerate(lineas):
+                # Si no es la última, queda reservado el espacio de la nota de omitidas
+                reserva = costo_nota if j < len(lineas) - 1 else 0
+                if _costo_linea(linea) + reserva > restante:
+                    break
+                tomadas.append(linea)
+                restante -= _costo_linea(linea)
+            if seccion['recientes']:
+                tomadas.reverse()
+            omitidas = len(lineas) - len(tomadas)
+            if omitidas:
+                nota = f"- ... y {omitidas} líneas más omitidas por espacio (incluidas en los totales)"
+                if _costo_linea(nota) <= restante:
+                    tomadas.append(nota)
+                    restante -= _costo_linea(nota)
+            elegidas[i] = seccion['encabezado'] + tomadas
+        return "\n".join(l for i in sorted(elegidas) for l in elegidas[i])
+
+    def _texto_totales(self, filtros, sub_cubo, presupuesto_tokens=None):
+        """
+        Totales pre-calculados. Con presupuesto, las secciones se recortan en este orden de
+        prioridad: total de lo que calza con la pregunta, por activo, anuales y mensuales.
+        """
+        secciones = [{
+            'encabezado': ["**TOTALES ANUALES DE LA FLOTA (USAR ESTO PARA PREGUNTAS GENERALES):**"],
+            'lineas': [f"- Año {anio}: ${monto:,.0f} CLP" for anio, monto in self.totales_anuales.items()],
+            'prioridad': 2, 'recientes': True,
+        }]
+
+        mensuales = self.totales_mensuales
+        hay_tiempo = filtros['periodos'] or filtros['meses'] or filtros['anios']
+        if hay_tiempo and not mensuales.empty:
+            anios = {a for a, _ in filtros['periodos']} | set(filtros['anios'])
+            meses = {m for _, m in filtros['periodos']} | set(filtros['meses'])
+            mask = np.ones(len(mensuales), dtype=bool)
+            if anios:
+                mask &= mensuales.index.year.isin(list(anios))
+            if meses:
+                mask &= mensuales.index.month.isin(list(meses))
+            mensuales = mensuales[mask]
+        else:
+            mensuales = mensuales.tail(MESES_RECIENTES)
+        secciones.append({
+            'encabezado': ["", "**TOTALES MENSUALES DE LA FLOTA (USAR ESTO PARA DETALLES DE FECHAS):**"],
+            'lineas': [f"- {periodo}: ${monto:,.0f} CLP" for periodo, monto in mensuales.items()] or ["- Sin datos"],
+            'prioridad': 3, 'recientes': True,
+        })
+
+        if sub_cubo is not None:
+            total = sub_cubo.totales(medidas=['eventos', 'costo_mantenimiento'])
+            secciones.append({
+                'encabezado': ["", f"**TOTAL DE LOS REGISTROS QUE CALZAN CON LA PREGUNTA:** {int(total['eventos'])} eventos | "
+                                   f"${total['costo_mantenimiento']:,.0f} CLP"],
+                'lineas': [], 'prioridad': 0, 'recientes': False,
+            })
+            if (filtros['activos'] or filtros['tipos_equipo']) and not sub_cubo.empty:
+                por_activo = sub_cubo.totales(['id_activo', 'anio'], ['eventos', 'costo_mantenimiento'])
+                lineas = [f"- {act} {int(anio)}: {int(r['eventos'])} eventos, ${r['costo_mantenimiento']:,.0f} CLP"
+                          for (act, anio), r in por_activo.head(MAX_LINEAS_ACTIVO).iterrows()]
+                if len(por_activo) > MAX_LINEAS_ACTIVO:
+                    lineas.append(f"- ... y {len(por_activo) - MAX_LINEAS_ACTIVO} combinaciones más (incluidas en el total)")
+                secciones.append({'encabezado': ["**POR ACTIVO Y AÑO:**"], 'lineas': lineas,
+                                  'prioridad': 1, 'recientes': False})
+
+        if presupuesto_tokens is None:
+            return "\n".join(l for seccion in secciones for l in seccion['encabezado'] + seccion['lineas'])
+        return self._ajustar_secciones(secciones, presupuesto_tokens)
+
+    def _texto_detalle(self, seleccion, presupuesto_tokens):
+        """Registros más recientes de la selección que caben en el presupuesto (nota de omitidos incluida)."""
+        if self.df.empty:
+            return SIN_DATOS, 0
+        orden = self.orden_fecha if len(self.orden_fecha) else np.arange(len(self.df))
+        if seleccion is None:
+            posiciones = orden
+        else:
+            rank = np.empty(len(self.df), dtype=np.intp)
+            rank[orden] = np.arange(len(self.df))
+            posiciones = seleccion[np.argsort(rank[seleccion], kind='stable')]
+        if len(posiciones) == 0:
+            return SIN_REGISTROS, 0
+
+        cols = [c for c in COLUMNAS_DETALLE if c in self.df.columns]
+        k = min(len(posiciones), MAX_FILAS_DETALLE)
+        lineas = self.df.iloc[posiciones[:k]][cols].to_string(index=False).split("\n")
+
+        # Encabezado + tantas filas como quepan, dejando lugar a la nota de omitidos
+        nota = f"({len(posiciones)} registros más antiguos omitidos; usar los totales pre-calculados)"
+        usados = _costo_linea(lineas[0]) + _costo_linea(nota)
+        lo = 0
+        for linea in lineas[1:]:
+            usados += _costo_linea(linea)
+            if usados > presupuesto_tokens:
+                break
+            lo += 1
+        if lo == 0:
+            return SIN_ESPACIO, len(posiciones)
+        texto = "\n".join(lineas[:lo + 1])
+        omitidos = len(posiciones) - lo
+        if omitidos:
+            texto += f"\n({omitidos} registros más antiguos omitidos; usar los totales pre-calculados)"
+        return texto, omitidos
+
+    def build(self, question, max_tokens=4000):
+        """
+        Retorna (resumen_calculado, detalle, filtros) ajustados a max_tokens, que cubre también la
+        pregunta y la plantilla del prompt (RESERVA_PLANTILLA). Los totales tienen prioridad y se
+        recortan si no caben; el detalle usa el presupuesto restante.
+        """
+        filtros = self.extraer_filtros(question)
+        seleccion = self.seleccionar(filtros)
+        disponible = max(0, max_tokens - estimar_tokens(question) - RESERVA_PLANTILLA)
+        reserva_aviso = max(estimar_tokens(a) for a in (SIN_DATOS, SIN_REGISTROS, SIN_ESPACIO))
+        resumen = self._texto_totales(filtros, self.filtrar_cubo(filtros), max(0, disponible - reserva_aviso))
+        detalle, _ = self._texto_detalle(seleccion, max(0, disponible - estimar_tokens(resumen)))
+        return resumen, detalle, filtros
@@ -0,0 +1,142 @@
+"""
+Caché de respuestas por contenido (hash del prompt + modelo).
+Dos niveles: LRU en memoria y archivos JSON en disco, con TTL y límite de tamaño.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=None, ttl_seconds=24 * 3600, max_memory_items=256, max_disk_mb=50):
+        """
+        cache_dir: carpeta del nivel en disco (None = solo memoria).
+        ttl_seconds: antigüedad máxima de una respuesta.
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits_memoria': 0, 'hits_disco': 0, 'misses': 0, 'escrituras': 0, 'evicciones': 0}
+
+    @staticmethod
+    def make_key(prompt, model_name):
+        return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Retorna el texto en caché o None (miss o expirado)."""
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(key)
+            if entrada is not None:
+                if ahora - entrada['created'] <= self.ttl_seconds:
+                    self._memoria.move_to_end(key)
+                    self._stats['hits_memoria'] += 1
+                    return entrada['text']
+                del self._memoria[key]
+
+        entrada = self._leer_disco(key)
+        with self._lock:
+            if entrada is not None and ahora - entrada['created'] <= self.ttl_seconds:
+                self._guardar_memoria(key, entrada)
+                self._stats['hits_disco'] += 1
+                return entrada['text']
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key, text, model_name=None):
+        entrada = {'created': time.time(), 'model': model_name, 'text': text}
+        with self._lock:
+            self._guardar_memoria(key, entrada)
+            self._stats['escrituras'] += 1
+        self._escribir_disco(key, entrada)
+
+    def clear(self):
+        with self._lock:
+            self._memoria.clear()
+        for path in self._archivos_disco():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['items_memoria'] = len(self._memoria)
+        consultas = stats['hits_memoria'] + stats['hits_disco'] + stats['misses']
+        stats['hit_rate'] = (stats['hits_memoria'] + stats['hits_disco']) / consultas if consultas else 0.0
+        return stats
+
+    # --- NIVEL MEMORIA ---
+    def _guardar_memoria(self, key, entrada):
+        self._memoria[key] = entrada
+        self._memoria.move_to_end(key)
+        while len(self._memoria) > self.max_memory_items:
+            self._memoria.popitem(last=False)
+            self._stats['evicciones'] += 1
+
+    # --- NIVEL DISCO ---
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _archivos_disco(self):
+        if self.cache_dir is None or not os.path.isdir(self.cache_dir):
+            return []
+        return [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith('.json')]
+
+    def _leer_disco(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir_disco(self, key, entrada):
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entrada, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+            self._evictar_disco()
+        except OSError as e:
+            print(f"Error escribiendo caché IA: {e}")
+
+    def _evictar_disco(self):
+        """Elimina expirados y luego los más antiguos hasta quedar bajo el límite."""
+        ahora = time.time()
+        archivos = []
+        for path in self._archivos_disco():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if ahora - st.st_mtime > self.ttl_seconds:
+                self._borrar(path)
+                continue
+            archivos.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in archivos)
+        for _, size, path in sorted(archivos):
+            if total <= self.max_disk_bytes:
+                break
+            self._borrar(path)
+            total -= size
+
+    def _borrar(self, path):
+        try:
+            os.remove(path)
+            with self._lock:
+                self._stats['evicciones'] += 1
+        except OSError:
+            pass
@@ -0,0 +1,128 @@
+"""
+Motor de escenarios "what-if" sobre las fórmulas de LifecycleCalculator.
+Evalúa muchos escenarios a la vez como matrices escenarios × activos.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.lifecycle_calculator import LifecycleCalculator, REGLAS_RECOMENDACION
+
+ESCENARIO_BASE = 'Base'
+
+
+def _por_tipo(valor, tipos, codigos, defecto):
+    """
+    Escalar o dict {tipo_equipo: valor} -> array por activo.
+    Los activos sin tipo (código -1 de pd.factorize) reciben el defecto.
+    """
+    if valor is None:
+        return np.full(len(codigos), float(defecto))
+    if not isinstance(valor, dict):
+        return np.full(len(codigos), float(valor))
+    # El defecto va al final: el código -1 lo toma (funciona aunque no haya ningún tipo)
+    por_tipo = np.array([float(valor.get(t, defecto)) for t in tipos] + [float(defecto)])
+    return por_tipo[codigos]
+
+
+class ScenarioResult:
+    def __init__(self, nombres, info, health, regla_idx, impacto):
+        self.nombres = list(nombres)
+        self.info = info                  # id_activo, tipo_equipo por activo
+        self.health = health              # escenarios × activos
+        self.regla_idx = regla_idx
+        self.impacto = impacto
+        self.prioridad = np.array([r['prioridad'] for r in REGLAS_RECOMENDACION])[regla_idx]
+
+    def resumen(self):
+        """Una fila por escenario, con diferencias respecto del escenario base (fila 0)."""
+        tabla = pd.DataFrame({
+            'escenario': self.nombres,
+            'health_promedio': self.health.mean(axis=1),
+            'criticos': (self.health < 40).sum(axis=1),
+            'urgentes': (self.prioridad <= 2).sum(axis=1),
+            'impacto_total_clp': self.impacto.sum(axis=1),
+        })
+        tabla['delta_health'] = tabla['health_promedio'] - tabla['health_promedio'].iloc[0]
+        tabla['delta_urgentes'] = tabla['urgentes'] - tabla['urgentes'].iloc[0]
+        tabla['delta_impacto_clp'] = tabla['impacto_total_clp'] - tabla['impacto_total_clp'].iloc[0]
+        return tabla
+
+    def detalle(self, nombre):
+        """Comparación por activo entre el escenario base y 'nombre'."""
+        i = self.nombres.index(nombre)
+        acciones = np.array([r['accion'] for r in REGLAS_RECOMENDACION], dtype=object)
+        tabla = self.info.copy()
+        tabla['health_base'] = self.health[0]
+        tabla['health_escenario'] = self.health[i]
+        tabla['delta_health'] = self.health[i] - self.health[0]
+        tabla['accion_base'] = acciones[self.regla_idx[0]]
+        tabla['accion_escenario'] = acciones[self.regla_idx[i]]
+        tabla['prioridad_escenario'] = self.prioridad[i]
+        tabla['impacto_escenario_clp'] = self.impacto[i]
+        return tabla
+
+
+class ScenarioEngine:
+    def __init__(self, calculator=None, horizonte_meses=12):
+        """
+        horizonte_meses: momento en que se evalúa cada escenario. El uso se proyecta
+        con la tasa real de cada activo (horómetro / edad) por ese plazo.
+        """
+        self.calculator = calculator or LifecycleCalculator()
+        self.horizonte_meses = horizonte_meses
+
+    def evaluar(self, df_flota, agregados, df_costos_ref, escenarios):
+        """
+        df_flota: métricas de calcular_metricas_completas.
+        agregados: agregados por activo (LifecycleCalculator.agregar_mantenimiento).
+        escenarios: lista de dicts con 'nombre' y overrides opcionales:
+            'uso': multiplicador de horas de uso (escalar o {tipo_equipo: mult})
+            'correctivo_a_preventivo': fracción de correctivos que pasan a preventivos (escalar o dict)
+            'vida_util': horas que reemplazan la referencia (escalar o {tipo_equipo: horas})
+        El escenario base (sin cambios) se agrega siempre como primera fila.
+        """
+        calc = self.calculator
+        escenarios = [{'nombre': ESCENARIO_BASE}] + [e for e in escenarios if e.get('nombre') != ESCENARIO_BASE]
+
+        codigos, tipos = pd.factorize(df_flota['tipo_equipo'].astype(object))
+        horometro = df_flota['horometro_actual'].to_numpy(dtype=float)
+        edad = df_flota['edad_anos'].to_numpy(dtype=float)
+        vida_base = calc.vida_util_flota(df_flota['tipo_equipo'], df_costos_ref)
+
+        agg = agregados.reindex(df_flota['id_activo'])
+        total_eventos = agg['total_eventos'].fillna(0).to_numpy(dtype=float)
+        eventos_correctivos = agg['eventos_correctivos'].fillna(0).to_numpy(dtype=float)
+        gasto_total = agg['gasto_total'].fillna(0).to_numpy(dtype=float)
+        gasto_correctivo = agg['gasto_correctivo'].fillna(0).to_numpy(dtype=float)
+
+        # Matrices de parámetros: escenarios × activos
+        uso = np.vstack([_por_tipo(e.get('uso'), tipos, codigos, 1.0) for e in escenarios])
+        traspaso = np.vstack([_por_tipo(e.get('correctivo_a_preventivo'), tipos, codigos, 0.0) for e in escenarios])
+        traspaso = np.clip(traspaso, 0, 1)
+        vida_util = np.vstack([_por_tipo(e.get('vida_util'), tipos, codigos, np.nan) for e in escenarios])
+        vida_util = np.where(np.isnan(vida_util), vida_base[None, :], vida_util)
+
+        anios = self.horizonte_meses / 12.0
+        horas_anuales = horometro / np.maximum(1, edad)
+        scores = calc.scores_desde_arrays(
+            horometro[None, :] + uso * horas_anuales[None, :] * anios,
+            edad[None, :] + anios,
+            vida_util,
+            total_eventos[None, :],
+            eventos_correctivos[None, :] * (1 - traspaso),
+            gasto_total[None, :],
+            gasto_correctivo[None, :] * (1 - traspaso),
+        )
+
+        if 'costo_mantencion_ultimo_ano' in df_flota.columns:
+            costo_mant = df_flota['costo_mantencion_ultimo_ano'].to_numpy(dtype=float)
+        else:
+            costo_mant = np.zeros(len(df_flota))
+        regla_idx, impacto = calc.evaluar_reglas(
+            scores['health_score'], scores['rul_horas'],
+            costo_mant[None, :], df_flota['valor_residual_estimado'].to_numpy(dtype=float)[None, :]
+        )
+
+        info = pd.DataFrame({'id_activo': df_flota['id_activo'].to_numpy(),
+                             'tipo_equipo': df_flota['tipo_equipo'].to_numpy()})
+        return ScenarioResult([e['nombre'] for e in escenarios], info, scores['health_score'], regla_idx, impacto)
@@ -1,12 +1,188 @@
 import pandas as pd
+import numpy as np
 from google.oauth2 import service_account
 import gspread
-from datetime import datetime
+from gspread.utils import fill_gaps, numericise_all, rowcol_to_a1, to_records
+from datetime import date, datetime
 import streamlit as st
+import json
+import os
+import threading
+import time
+
+from utils.telemetry import get_telemetria
+
+# Orden de columnas de cada hoja (igual a los encabezados del Spreadsheet)
+COLUMNAS_HOJAS = {
+    "Activos": ['id_activo', 'tipo_equipo', 'marca', 'modelo', 'ano_compra',
+                'horometro_actual', 'valor_compra', 'valor_residual_estimado'],
+    "Mantenimiento": ['id_activo', 'fecha', 'tipo_mantenimiento', 'descripcion',
+                      'costo_repuestos', 'costo_mano_obra', 'horas_parada'],
+    "Costos_Referencia": ['tipo_equipo', 'costo_hora_operacion', 'costo_dia_parada',
+                          'vida_util_esperada_horas', 'tasa_depreciacion_anual'],
+}
+
+# Esquema de limpieza por hoja: columna -> {'tipo': ..., 'dtype': ...}
+# clp: número con formato chileno ($1.234.567 / 1.234,5) o decimal simple (2.5) | date | category
+ESQUEMAS_HOJAS = {
+    "Activos": {
+        'id_activo': {'tipo': 'category'},
+        'tipo_equipo': {'tipo': 'category'},
+        'marca': {'tipo': 'category'},
+        'modelo': {'tipo': 'category'},
+        'ano_compra': {'tipo': 'clp', 'dtype': 'int16'},
+        'horometro_actual': {'tipo': 'clp'},
+        'valor_compra': {'tipo': 'clp'},
+        'valor_residual_estimado': {'tipo': 'clp'},
+    },
+    "Mantenimiento": {
+        'id_activo': {'tipo': 'category'},
+        'fecha': {'tipo': 'date'},
+        'tipo_mantenimiento': {'tipo': 'category'},
+        'costo_repuestos': {'tipo': 'clp'},
+        'costo_mano_obra': {'tipo': 'clp'},
+        'horas_parada': {'tipo': 'clp', 'dtype': 'float32'},
+    },
+    "Costos_Referencia": {
+        'tipo_equipo': {'tipo': 'category'},
+        'costo_hora_operacion': {'tipo': 'clp'},
+        'costo_dia_parada': {'tipo': 'clp'},
+        'vida_util_esperada_horas': {'tipo': 'clp'},
+        'tasa_depreciacion_anual': {'tipo': 'clp'},
+    },
+}
+
+# Subir al cambiar las reglas de clean_data: invalida los snapshots en disco
+SNAPSHOT_VERSION = 3
+# Fechas en texto: la del formulario de la app (la que se escribe) y las de historiales anteriores
+FORMATO_FECHA_HOJA = '%d/%m/%Y'
+FORMATOS_FECHA = [FORMATO_FECHA_HOJA, '%Y-%m-%d', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S']
+# Número con puntos de miles (ej: 1.234.567 o 1.234,5); sin '$' ni esta forma el punto es decimal
+PATRON_MILES = r'-?\d{1,3}(?:\.\d{3})+(?:,\d+)?'
+# Solo las hojas de flota van al snapshot en disco ('Usuarios' trae hashes de contraseña)
+HOJAS_SNAPSHOT = frozenset(ESQUEMAS_HOJAS)
+
+
+def _parse_clp(serie):
+    """
+    Limpia moneda de forma vectorizada: a los textos se les quita '$', la coma pasa a punto
+    decimal y el punto es de miles solo si el texto lleva '$' o tiene forma de miles
+    (PATRON_MILES); si no, es decimal ("2.5" = 2.5). Los valores ya numéricos no se tocan.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').astype('float64')
+
+    es_texto = serie.map(type).to_numpy() == str
+    no_texto = serie.where(~es_texto)
+    try:
+        resultado = no_texto.astype('float64')
+    except (TypeError, ValueError):
+        resultado = pd.to_numeric(no_texto, errors='coerce').astype('float64')
+    if es_texto.any():
+        texto = serie[es_texto].astype('string').str.strip()
+        con_miles = texto.str.contains('$', regex=False) | texto.str.fullmatch(PATRON_MILES)
+        texto = texto.str.replace('$', '', regex=False).str.strip()
+        texto = (texto.mask(con_miles, texto.str.replace('.', '', regex=False))
+                 .str.replace(',', '.', regex=False))
+        resultado[es_texto] = pd.to_numeric(texto, errors='coerce').astype('float64').to_numpy(na_value=np.nan)
+    return resultado
+
+
+def _parse_fecha(serie):
+    """
+    Fechas de forma vectorizada. Los textos se prueban con cada formato de FORMATOS_FECHA (sin inferir:
+    con formatos mezclados pandas deja NaT y lee 05/01 como mes/día); las celdas de fecha pasan tal cual.
+    Los números quedan NaT: pd.to_datetime los tomaría como segundos desde 1970.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    tipos = serie.map(type)
+    es_texto = tipos.to_numpy() == str
+    es_fecha = tipos.map(lambda t: issubclass(t, (date, np.datetime64))).to_numpy(dtype=bool)
+    fechas = pd.to_datetime(serie.where(es_fecha), errors='coerce')
+    if es_texto.any():
+        texto = serie[es_texto].str.strip()
+        parseadas = pd.Series(pd.NaT, index=texto.index, dtype=fechas.dtype)
+        for formato in FORMATOS_FECHA:
+            faltan = parseadas.isna()
+            if not faltan.any():
+                break
+            parseadas[faltan] = pd.to_datetime(texto[faltan], format=formato, errors='coerce')
+        fechas[es_texto] = parseadas
+    return fechas
+
+
+def _castear(serie, dtype):
+    """Reduce el dtype solo si los valores caben sin pérdida; si no, deja float64."""
+    serie = serie.astype('float64')
+    if dtype == 'float64':
+        return serie
+    if dtype.startswith('int'):
+        info = np.iinfo(dtype)
+        valores = serie.to_numpy()
+        if ((valores % 1 == 0) & (valores >= info.min) & (valores <= info.max)).all():
+            return serie.astype(dtype)
+        return serie
+    return serie.astype(dtype)
+
+# Segundos durante los que se reutiliza la revisión consultada a Drive
+REVISION_TTL = 5
+
+# Hojas que solo crecen (add_row escribe en la primera fila libre): se leen por delta
+HOJAS_SOLO_AGREGAR = {"Mantenimiento"}
+# Cada cuánto una hoja por delta se relee completa (detecta ediciones de filas antiguas)
+RESYNC_SEGUNDOS = 3600
+
+def sin_celdas_vacias(fila):
+    """Fila sin las celdas vacías del final (la API las omite al devolver un rango)."""
+    fila = list(fila)
+    while fila and fila[-1] == '':
+        fila.pop()
+    return fila
+
+
+def concatenar_filas(base, delta):
+    """
+    Une filas nuevas ya limpias al frame en caché con los mismos dtypes que una limpieza completa:
+    las categóricas quedan con la unión ordenada de categorías, las fechas con la unidad de la base.
+    """
+    if base.empty:
+        return delta
+    base = base.copy(deep=False)
+    delta = delta.copy(deep=False)
+    for col in base.columns.intersection(delta.columns):
+        tipo_base, tipo_delta = base[col].dtype, delta[col].dtype
+        if isinstance(tipo_base, pd.CategoricalDtype):
+            nuevas = delta[col].astype(object)
+            union = base[col].cat.categories.union(pd.Index(nuevas.dropna().unique()))
+            base[col] = base[col].cat.set_categories(union)
+            delta[col] = pd.Categorical(nuevas, categories=union)
+        elif pd.api.types.is_datetime64_dtype(tipo_base) and tipo_delta != tipo_base:
+            delta[col] = delta[col].astype(tipo_base)
+    return pd.concat([base, delta], ignore_index=True)
+
 
 class SheetsConnector:
-    def __init__(self, credentials_path=None, spreadsheet_id=None):
+    def __init__(self, credentials_path=None, spreadsheet_id=None, cache_dir=None, spreadsheet=None):
+        """
+        cache_dir: carpeta para snapshots locales de cada hoja (None = sin snapshot).
+        spreadsheet: objeto ya abierto (o un doble de pruebas); evita autenticar.
+        """
         self.spreadsheet_id = spreadsheet_id
+        self.cache_dir = cache_dir
+        self._revision = None
+        self._revision_ts = 0
+        self._worksheets = {}
+        self._lock = threading.Lock()
+        # Estado de ingesta de las hojas por delta: {nombre: {encabezado, filas, ancla, df, completa_en}}.
+        # El conector se comparte entre hilos (pool): rango, ancla y estado se leen y escriben con este lock
+        self._ingesta = {}
+        self._lock_ingesta = threading.Lock()
+
+        if spreadsheet is not None:
+            self.client = None
+            self.sheet = spreadsheet
+            return
 
         scopes = [
             'https://www.googleapis.com/auth/spreadsheets',
@@ -27,77 +203,335 @@ class SheetsConnector:
         self.sheet = self.client.open_by_key(spreadsheet_id)
 
     def get_data(self, worksheet_name):
-        try:
-            ws = self.sheet.worksheet(worksheet_name)
-            data = ws.get_all_records()
-            df = pd.DataFrame(data)
-
-            # --- LIMPIEZA DE MONEDA ---
-            def clean_clp(val):
-                if isinstance(val, str):
-                    val = val.replace('$', '').replace('.', '').replace(',', '.')
-                    return val.strip()
-                return val
-
-            if worksheet_name == "Activos":
-                numeric_cols = ['ano_compra', 'horometro_actual', 'valor_compra', 'valor_residual_estimado']
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = df[col].apply(clean_clp)
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                
-                current_year = datetime.now().year
-                if 'ano_compra' in df.columns:
-                    df['edad_anos'] = current_year - df['ano_compra']
-
-            elif worksheet_name == "Mantenimiento":
-                numeric_cols = ['costo_repuestos', 'costo_mano_obra', 'horas_parada']
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = df[col].apply(clean_clp)
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-                if 'costo_repuestos' in df.columns and 'costo_mano_obra' in df.columns:
-                    df['costo_mantenimiento'] = df['costo_repuestos'] + df['costo_mano_obra']
-
-                if 'fecha' in df.columns:
-                    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-
-            elif worksheet_name == "Costos_Referencia":
-                numeric_cols = ['costo_hora_operacion', 'costo_dia_parada', 
-                               'vida_util_esperada_horas', 'tasa_depreciacion_anual']
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = df[col].apply(clean_clp)
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-            return df
+        telemetria = get_telemetria()
+        with telemetria.span('sheets.get_data', cache=self.cache_dir is not None, hoja=worksheet_name) as span:
+            try:
+                revision = self.get_revision()
+                df = self._load_snapshot(worksheet_name, revision)
+                if df is not None:
+                    return df
+                span.marcar_cache(False)
 
-        except Exception as e:
-            print(f"Error lectura {worksheet_name}: {e}")
+                ws = self.worksheet(worksheet_name)
+                data = ws.get_all_records()
+                with telemetria.span('sheets.clean_data', hoja=worksheet_name):
+                    df = self.clean_data(worksheet_name, pd.DataFrame(data))
+                self._save_snapshot(worksheet_name, revision, df)
+                return df
+
+            except Exception as e:
+                print(f"Error lectura {worksheet_name}: {e}")
+                span.marcar_error()
+                self._worksheets.pop(worksheet_name, None)
+                return pd.DataFrame()
+
+    def worksheet(self, worksheet_name):
+        """Handle de la hoja, cacheado para no repetir la consulta de metadatos."""
+        ws = self._worksheets.get(worksheet_name)
+        if ws is None:
+            with self._lock:
+                ws = self._worksheets.get(worksheet_name)
+                if ws is None:
+                    ws = self.sheet.worksheet(worksheet_name)
+                    self._worksheets[worksheet_name] = ws
+        return ws
+
+    def get_many(self, worksheet_names, estricto=False):
+        """
+        Lee varias hojas en una sola petición batch (values_batch_get).
+        Cada hoja se limpia con sus reglas. Retorna {nombre_hoja: DataFrame}.
+        estricto=True propaga los errores en vez de dejar DataFrames vacíos.
+        """
+        telemetria = get_telemetria()
+        with telemetria.span('sheets.get_many', cache=self.cache_dir is not None) as span:
+            revision = self.get_revision()
+            resultados = {}
+            pendientes = []
+            for name in worksheet_names:
+                df = self._load_snapshot(name, revision)
+                if df is not None:
+                    resultados[name] = df
+                else:
+                    pendientes.append(name)
+
+            if pendientes:
+                span.marcar_cache(False)
+                try:
+                    resultados.update(self._leer_pendientes(pendientes, revision))
+                except Exception as e:
+                    # Si una hoja no existe falla todo el batch: leemos una por una
+                    print(f"Error lectura batch {pendientes}: {e}")
+                    span.marcar_error()
+                    with self._lock_ingesta:
+                        for name in pendientes:
+                            self._ingesta.pop(name, None)
+                    if estricto:
+                        raise
+                    for name in pendientes:
+                        resultados[name] = self.get_data(name)
+
+            return {name: resultados.get(name, pd.DataFrame()) for name in worksheet_names}
+
+    def _leer_pendientes(self, pendientes, revision):
+        """
+        Lee en batch las hojas sin snapshot vigente (por delta las que lo permiten). Toma el lock de
+        ingesta de principio a fin: dos lecturas solapadas no pueden unir dos veces las mismas filas.
+        """
+        resultados = {}
+        with self._lock_ingesta:
+            rangos = [self._rango_lectura(name) for name in pendientes]
+            resp = self.sheet.values_batch_get(rangos)
+            completas = []
+            for name, rango, value_range in zip(pendientes, rangos, resp.get('valueRanges', [])):
+                values = value_range.get('values', [])
+                if '!' not in rango:
+                    df = self._leer_completa(name, values)
+                    self._save_snapshot(name, revision, df)
+                else:
+                    # El frame armado por delta no va al snapshot en disco: su revisión
+                    # no garantiza que traiga toda la hoja (solo una lectura completa lo hace)
+                    df = self._aplicar_delta(name, values)
+                    if df is None:
+                        # El ancla no coincide (filas editadas o borradas): se relee completa
+                        completas.append(name)
+                        continue
+                resultados[name] = df
+            if completas:
+                resp = self.sheet.values_batch_get([f"'{name}'" for name in completas])
+                for name, value_range in zip(completas, resp.get('valueRanges', [])):
+                    df = self._leer_completa(name, value_range.get('values', []))
+                    self._save_snapshot(name, revision, df)
+                    resultados[name] = df
+        return resultados
+
+    # --- LECTURA POR DELTA ---
+    def _rango_lectura(self, worksheet_name):
+        """
+        Rango a pedir para la hoja: completa, o desde la última fila ingerida (el ancla)
+        hasta el final si es una hoja que solo crece y su estado sigue vigente.
+        """
+        estado = self._ingesta.get(worksheet_name)
+        if (estado is None or worksheet_name not in HOJAS_SOLO_AGREGAR
+                or time.monotonic() - estado['completa_en'] >= RESYNC_SEGUNDOS):
+            return f"'{worksheet_name}'"
+        ultima_col = rowcol_to_a1(1, len(estado['encabezado']))[:-1]
+        # Fila 1 = encabezado: la última fila ingerida es la filas + 1
+        return f"'{worksheet_name}'!A{estado['filas'] + 1}:{ultima_col}"
+
+    def _leer_completa(self, worksheet_name, values):
+        """Limpia la hoja completa y, si solo crece, guarda el estado para leer por delta."""
+        with get_telemetria().span('sheets.clean_data', hoja=worksheet_name):
+            df = self.clean_data(worksheet_name, self._values_to_df(values))
+        if worksheet_name in HOJAS_SOLO_AGREGAR and values and values[0]:
+            self._ingesta[worksheet_name] = {
+                'encabezado': list(values[0]),
+                'filas': len(values) - 1,
+                'ancla': sin_celdas_vacias(values[-1]),
+                'df': df,
+                'completa_en': time.monotonic(),
+            }
+        else:
+            self._ingesta.pop(worksheet_name, None)
+        return df
+
+    def _aplicar_delta(self, worksheet_name, values):
+        """
+        values: filas desde la última ingerida. Si la primera coincide con el ancla, limpia
+        solo las nuevas y las une al frame en caché. Retorna None si hay que releer completa.
+        """
+        estado = self._ingesta.get(worksheet_name)
+        if estado is None or not values or sin_celdas_vacias(values[0]) != estado['ancla']:
+            self._ingesta.pop(worksheet_name, None)
+            return None
+        nuevas = values[1:]
+        if not nuevas:
+            return estado['df']
+        with get_telemetria().span('sheets.clean_data', hoja=worksheet_name, delta=True):
+            delta = self.clean_data(worksheet_name, self._values_to_df([estado['encabezado']] + nuevas))
+        df = concatenar_filas(estado['df'], delta)
+        estado.update(filas=estado['filas'] + len(nuevas), ancla=sin_celdas_vacias(nuevas[-1]), df=df)
+        return df
+
+    @staticmethod
+    def _values_to_df(values):
+        """Convierte una matriz de valores (con encabezado) igual que get_all_records."""
+        if not values or values == [[]]:
             return pd.DataFrame()
+        values = fill_gaps(values)
+        keys = values[0]
+        rows = [numericise_all(row) for row in values[1:]]
+        return pd.DataFrame(to_records(keys, rows))
 
-    def add_row(self, worksheet_name, row_data):
+    # --- SNAPSHOT LOCAL ---
+    def get_revision(self, fresca=False):
         """
-        Busca la primera fila disponible y escribe en ella, 
-        respetando el formato existente.
+        Marca de revisión barata del Spreadsheet (fecha de última modificación en Drive).
+        Retorna None si no se puede obtener; en ese caso no se usa el snapshot.
+        fresca=True consulta a Drive aunque la última lectura siga dentro de REVISION_TTL.
         """
+        if self.cache_dir is None:
+            return None
+        if not fresca and self._revision is not None and time.monotonic() - self._revision_ts < REVISION_TTL:
+            return self._revision
+        try:
+            revision = self.sheet.get_lastUpdateTime()
+        except Exception as e:
+            print(f"Error leyendo revisión: {e}")
+            return None
+        self._revision = revision
+        self._revision_ts = time.monotonic()
+        return revision
+
+    def _snapshot_key(self, revision):
+        # El año entra en la llave porque edad_anos depende de él
+        return f"{revision}|v{SNAPSHOT_VERSION}|{datetime.now().year}"
+
+    def _snapshot_paths(self, worksheet_name):
+        base = os.path.join(self.cache_dir, f"{self.spreadsheet_id or 'sheet'}_{worksheet_name}")
+        return base + ".pkl", base + ".json"
+
+    def _load_snapshot(self, worksheet_name, revision):
+        if self.cache_dir is None or revision is None or worksheet_name not in HOJAS_SNAPSHOT:
+            return None
+        data_path, meta_path = self._snapshot_paths(worksheet_name)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('key') != self._snapshot_key(revision):
+                return None
+            return pd.read_pickle(data_path)
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def _save_snapshot(self, worksheet_name, revision, df):
+        """Guarda la hoja ya limpia y tipada (escritura atómica). Solo hojas de HOJAS_SNAPSHOT."""
+        if self.cache_dir is None or revision is None:
+            return
+        data_path, meta_path = self._snapshot_paths(worksheet_name)
+        if worksheet_name not in HOJAS_SNAPSHOT:
+            # Borra lo que haya dejado una versión anterior que sí lo guardaba
+            for ruta in (data_path, meta_path):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+            return
         try:
-            ws = self.sheet.worksheet(worksheet_name)
-            
-            # 1. Traemos solo la columna A (IDs) para contar cuántas filas reales hay
-            # col_values(1) se detiene en el último valor escrito, ignora formatos vacíos
-            col_ids = ws.col_values(1)
-            
-            # 2. La siguiente fila disponible es el largo de la columna + 1
-            next_row = len(col_ids) + 1
-            
-            # 3. Usamos 'update' en lugar de 'append_row'
-            # Esto escribe DENTRO de la celda existente (respetando tus colores y dropdowns)
-            # range_name ej: "A21"
-            ws.update(range_name=f"A{next_row}", values=[row_data])
-            
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_pickle(data_path + ".tmp")
+            os.replace(data_path + ".tmp", data_path)
+            with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({'key': self._snapshot_key(revision), 'rows': len(df)}, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            print(f"Error guardando snapshot {worksheet_name}: {e}")
+
+    @staticmethod
+    def clean_data(worksheet_name, df):
+        """
+        Aplica el esquema de cada hoja (ESQUEMAS_HOJAS) con operaciones vectorizadas.
+        Sirve tanto para lo leído de Sheets como para filas nuevas escritas desde la app.
+        """
+        # Copia superficial: solo se reemplazan columnas completas
+        df = df.copy(deep=False)
+
+        for col, spec in ESQUEMAS_HOJAS.get(worksheet_name, {}).items():
+            if col not in df.columns:
+                continue
+            tipo = spec['tipo']
+            if tipo == 'clp':
+                df[col] = _castear(_parse_clp(df[col]).fillna(0), spec.get('dtype', 'float64'))
+            elif tipo == 'date':
+                df[col] = _parse_fecha(df[col])
+            elif tipo == 'category':
+                df[col] = df[col].astype('category')
+
+        # --- COLUMNAS DERIVADAS ---
+        if worksheet_name == "Activos":
+            current_year = datetime.now().year
+            if 'ano_compra' in df.columns:
+                df['edad_anos'] = current_year - df['ano_compra']
+
+        elif worksheet_name == "Mantenimiento":
+            if 'costo_repuestos' in df.columns and 'costo_mano_obra' in df.columns:
+                df['costo_mantenimiento'] = df['costo_repuestos'] + df['costo_mano_obra']
+
+        return df
+
+    def append_rows(self, worksheet_name, rows):
+        """
+        Agrega filas al final de la tabla en una sola petición (values.append).
+        La API ubica la primera fila libre del lado del servidor, así dos guardados simultáneos
+        no escriben en la misma fila; OVERWRITE usa las filas vacías existentes (respeta
+        colores y dropdowns). Propaga los errores (la cola de escritura reintenta).
+        """
+        with get_telemetria().span('sheets.append_rows', hoja=worksheet_name) as span:
+            try:
+                ws = self.worksheet(worksheet_name)
+                ws.append_rows(rows, value_input_option='RAW', insert_data_option='OVERWRITE',
+                               table_range='A1')
+            except Exception:
+                span.marcar_error()
+                self._worksheets.pop(worksheet_name, None)
+                raise
+            # La revisión en caché ya no vale: la próxima lectura debe ver estas filas
+            self._revision = None
             return True
+
+    def add_row(self, worksheet_name, row_data):
+        """Escribe una fila al final de la hoja (síncrono). Retorna True si se guardó."""
+        try:
+            return self.append_rows(worksheet_name, [row_data])
         except Exception as e:
             st.error(f"Error escribiendo en Sheets: {str(e)}")
             return False
+
+
+class ConnectorPool:
+    """
+    Conectores autorizados compartidos por todo el proceso (todas las sesiones).
+    google-auth renueva el token de la service account antes de que expire,
+    así que cada conector se autoriza una sola vez en la vida del proceso.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conectores = {}
+        self._stats = {'handshakes': 0, 'reutilizados': 0}
+
+    def get(self, spreadsheet_id, credentials_path=None, cache_dir=None):
+        key = (spreadsheet_id, credentials_path, cache_dir)
+        # El lock evita que varias sesiones autentiquen en paralelo al partir
+        with self._lock:
+            conn = self._conectores.get(key)
+            if conn is not None:
+                self._stats['reutilizados'] += 1
+                return conn
+            conn = SheetsConnector(credentials_path=credentials_path,
+                                   spreadsheet_id=spreadsheet_id, cache_dir=cache_dir)
+            self._conectores[key] = conn
+            self._stats['handshakes'] += 1
+            return conn
+
+    def invalidar(self, spreadsheet_id=None):
+        """Descarta conectores (todos o los de un spreadsheet) para forzar re-autorización."""
+        with self._lock:
+            for key in list(self._conectores):
+                if spreadsheet_id is None or key[0] == spreadsheet_id:
+                    del self._conectores[key]
+
+    def stats(self):
+        """handshakes: autorizaciones hechas | reutilizados: handshakes ahorrados."""
+        with self._lock:
+            return dict(self._stats)
+
+
+_pool = ConnectorPool()
+
+
+def get_connector(spreadsheet_id, credentials_path=None, cache_dir=None):
+    """Conector compartido del proceso (ver ConnectorPool)."""
+    return _pool.get(spreadsheet_id, credentials_path=credentials_path, cache_dir=cache_dir)
+
+
+def get_pool():
+    return _pool
@@ -0,0 +1,243 @@
+"""
+Tramos de tiempo (spans) de las rutas críticas: lectura de Sheets, limpieza, scores, Gemini y vistas.
+Se agregan por operación en percentiles y tasa de aciertos de caché, exportables a JSON y Prometheus.
+Desactivada, cada span es un objeto nulo compartido (sin reloj, sin locks).
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+# Duraciones recientes que se guardan por operación para los percentiles
+MUESTRAS_POR_OPERACION = 1024
+PERCENTILES = (50, 90, 99)
+
+
+class _SpanNulo:
+    """Span de la telemetría desactivada: no mide nada."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def marcar_cache(self, hit):
+        pass
+
+    def marcar_error(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+def _percentil(ordenadas, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    idx = min(len(ordenadas) - 1, max(0, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[idx]
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Span:
+    def __init__(self, telemetria, llave, cache=False):
+        """cache=True: la operación pasa por una caché; es un acierto salvo que se marque lo contrario."""
+        self.telemetria = telemetria
+        self.llave = llave
+        self.cache = True if cache else None
+        self.error = False
+        self._inicio = time.perf_counter()
+
+    def marcar_cache(self, hit):
+        if self.cache is not None:
+            self.cache = bool(hit)
+
+    def marcar_error(self):
+        self.error = True
+
+    def cerrar(self):
+        if self._inicio is None:
+            return
+        self.telemetria._registrar(self.llave, time.perf_counter() - self._inicio, self.cache, self.error)
+        self._inicio = None
+
+    def __enter__(self):
+        self.telemetria._pila().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pila = self.telemetria._pila()
+        if pila and pila[-1] is self:
+            pila.pop()
+        if exc_type is not None:
+            self.error = True
+        self.cerrar()
+        return False
+
+
+class _Estadistica:
+    def __init__(self):
+        self.duraciones = deque(maxlen=MUESTRAS_POR_OPERACION)
+        self.llamadas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.errores = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Telemetry:
+    def __init__(self, activo=False):
+        self.activo = activo
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+
+    def _pila(self):
+        pila = getattr(self._local, 'pila', None)
+        if pila is None:
+            pila = self._local.pila = []
+        return pila
+
+    def span(self, nombre, cache=False, **etiquetas):
+        """
+        Context manager que mide 'nombre'. Las etiquetas (ej: hoja='Activos') separan la estadística.
+        Retorna un objeto nulo si la telemetría está desactivada.
+        """
+        if not self.activo:
+            return _SPAN_NULO
+        return Span(self, (nombre, tuple(sorted(etiquetas.items()))), cache=cache)
+
+    def iniciar(self, nombre, **etiquetas):
+        """Span abierto sin context manager (se termina con .cerrar())."""
+        return self.span(nombre, **etiquetas)
+
+    def marcar_cache(self, hit):
+        """
+        Marca el acierto/fallo de caché en el span abierto más cercano que pase por una caché.
+        Pensado para el cuerpo de funciones con st.cache_data (solo corre en un fallo).
+        """
+        if not self.activo:
+            return
+        for span in reversed(self._pila()):
+            if span.cache is not None:
+                span.cache = bool(hit)
+                return
+
+    def registrar(self, nombre, segundos, cache=None, error=False, **etiquetas):
+        """Registra una duración medida por fuera de un span (ej: generadores)."""
+        if self.activo:
+            self._registrar((nombre, tuple(sorted(etiquetas.items()))), segundos, cache, error)
+
+    def _registrar(self, llave, segundos, cache, error):
+        with self._lock:
+            est = self._stats.get(llave)
+            if est is None:
+                est = self._stats[llave] = _Estadistica()
+            est.duraciones.append(segundos)
+            est.llamadas += 1
+            est.total += segundos
+            est.maximo = max(est.maximo, segundos)
+            est.errores += bool(error)
+            if cache is True:
+                est.cache_hits += 1
+            elif cache is False:
+                est.cache_misses += 1
+
+    def reiniciar(self):
+        with self._lock:
+            self._stats = {}
+
+    # --- CONSULTA Y EXPORTACIÓN ---
+    def resumen(self):
+        """Una fila por operación y etiquetas, con percentiles en milisegundos."""
+        with self._lock:
+            copia = [(llave, sorted(est.duraciones), est.llamadas, est.total, est.maximo, est.errores,
+                      est.cache_hits, est.cache_misses) for llave, est in self._stats.items()]
+        filas = []
+        for (nombre, etiquetas), duraciones, llamadas, total, maximo, errores, hits, misses in copia:
+            fila = {
+                'operacion': nombre,
+                'etiquetas': ", ".join(f"{k}={v}" for k, v in etiquetas),
+                'llamadas': llamadas,
+                'errores': errores,
+                'total_s': total,
+            }
+            for p in PERCENTILES:
+                fila[f'p{p}_ms'] = _percentil(duraciones, p) * 1000
+            fila['max_ms'] = maximo * 1000
+            fila['cache_hit_rate'] = hits / (hits + misses) if hits + misses else None
+            filas.append(fila)
+        columnas = ['operacion', 'etiquetas', 'llamadas', 'errores', 'total_s'] + \
+                   [f'p{p}_ms' for p in PERCENTILES] + ['max_ms', 'cache_hit_rate']
+        return pd.DataFrame(filas, columns=columnas).sort_values('total_s', ascending=False, ignore_index=True)
+
+    def a_json(self):
+        tabla = self.resumen()
+        return json.dumps({
+            'generado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'operaciones': json.loads(tabla.to_json(orient='records')),
+        }, ensure_ascii=False, indent=2)
+
+    def a_prometheus(self, prefijo='concremag'):
+        """Formato de texto de Prometheus (summary por operación + contadores de caché y errores)."""
+        with self._lock:
+            copia = [(llave, sorted(est.duraciones), est.llamadas, est.total, est.errores,
+                      est.cache_hits, est.cache_misses) for llave, est in self._stats.items()]
+
+        def _etiquetas(nombre, etiquetas, **extra):
+            pares = [('operacion', nombre)] + list(etiquetas) + list(extra.items())
+            return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+        lineas = [f"# HELP {prefijo}_operacion_segundos Duración de operaciones instrumentadas.",
+                  f"# TYPE {prefijo}_operacion_segundos summary"]
+        for (nombre, etiquetas), duraciones, llamadas, total, _, _, _ in copia:
+            for p in PERCENTILES:
+                lineas.append(f"{prefijo}_operacion_segundos{_etiquetas(nombre, etiquetas, quantile=p / 100)} "
+                              f"{_percentil(duraciones, p):.6f}")
+            lineas.append(f"{prefijo}_operacion_segundos_sum{_etiquetas(nombre, etiquetas)} {total:.6f}")
+            lineas.append(f"{prefijo}_operacion_segundos_count{_etiquetas(nombre, etiquetas)} {llamadas}")
+
+        lineas += [f"# HELP {prefijo}_operacion_errores_total Operaciones terminadas con error.",
+                   f"# TYPE {prefijo}_operacion_errores_total counter"]
+        for (nombre, etiquetas), _, _, _, errores, _, _ in copia:
+            lineas.append(f"{prefijo}_operacion_errores_total{_etiquetas(nombre, etiquetas)} {errores}")
+
+        lineas += [f"# HELP {prefijo}_cache_total Resultados de caché por operación.",
+                   f"# TYPE {prefijo}_cache_total counter"]
+        for (nombre, etiquetas), _, _, _, _, hits, misses in copia:
+            if hits + misses:
+                lineas.append(f"{prefijo}_cache_total{_etiquetas(nombre, etiquetas, resultado='hit')} {hits}")
+                lineas.append(f"{prefijo}_cache_total{_etiquetas(nombre, etiquetas, resultado='miss')} {misses}")
+        return "\n".join(lineas) + "\n"
+
+
+_telemetria = Telemetry(activo=os.getenv("TELEMETRIA", "0") == "1")
+
+
+def get_telemetria():
+    """Telemetría compartida del proceso."""
+    return _telemetria
+
+
+def medido(nombre, **etiquetas):
+    """Decorador: mide cada llamada como un span (con la telemetría desactivada solo agrega un if)."""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            if not _telemetria.activo:
+                return fn(*args, **kwargs)
+            with _telemetria.span(nombre, **etiquetas):
+                return fn(*args, **kwargs)
+        return envoltura
+    return decorador
@@ -1,49 +1,121 @@
 """
 Gestor de usuarios autorizados - Lee desde Google Sheets
+El directorio se comparte en todo el proceso con TTL: un login no vuelve a leer la hoja.
 """
 import streamlit as st
+import pandas as pd
 import hashlib
+import hmac
+import threading
+import time
+
+# Segundos que el directorio de usuarios se considera vigente
+USUARIOS_TTL = 300
+# Si la hoja no se pudo leer, se reintenta antes (el usuario por defecto no dura todo el TTL)
+USUARIOS_TTL_FALLBACK = 30
+
+PERMISSIONS_MAP = {
+    'admin': ['view', 'edit', 'delete', 'manage_users'],
+    'manager': ['view', 'edit'],
+    'viewer': ['view']
+}
+
+# Hash de relleno para emails desconocidos: la verificación toma lo mismo exista o no el usuario
+_HASH_RELLENO = hashlib.sha256(b"").hexdigest()
+
+
+class UserDirectory:
+    """
+    Directorio {email: info} por spreadsheet, compartido entre sesiones.
+    Se recarga al vencer el TTL o con invalidar().
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = {}
+
+    def get(self, connector, cargar, ttl=USUARIOS_TTL):
+        """Retorna el directorio vigente; si venció, lo construye con cargar(connector) -> (usuarios, ttl)."""
+        clave = connector.spreadsheet_id
+        entrada = self._entradas.get(clave)
+        if entrada is not None and time.monotonic() < entrada[1]:
+            return entrada[0]
+        # Una sola lectura aunque lleguen varios logins a la vez
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and time.monotonic() < entrada[1]:
+                return entrada[0]
+            usuarios, vigencia = cargar(connector)
+            self._entradas[clave] = (usuarios, time.monotonic() + min(ttl, vigencia))
+            return usuarios
+
+    def invalidar(self, spreadsheet_id=None):
+        with self._lock:
+            for clave in list(self._entradas):
+                if spreadsheet_id is None or clave == spreadsheet_id:
+                    del self._entradas[clave]
+
+
+_directorio = UserDirectory()
+
+
+def get_directorio():
+    return _directorio
+
 
 class UserManager:
-    def __init__(self, connector):
+    def __init__(self, connector, ttl=USUARIOS_TTL):
         """
         Inicializa el gestor de usuarios
         connector: instancia de SheetsConnector
+        ttl: segundos que se reutiliza el directorio leído de la hoja 'Usuarios'
         """
         self.connector = connector
+        self.ttl = ttl
         self.authorized_users = {}
         self.load_users()
-    
+
     def load_users(self):
-        """Carga usuarios desde Google Sheets"""
+        """Carga usuarios desde el directorio compartido (lee Google Sheets solo si venció)"""
+        self.authorized_users = _directorio.get(self.connector, self._leer_usuarios, ttl=self.ttl)
+
+    @staticmethod
+    def _leer_usuarios(connector):
+        """Lee la hoja 'Usuarios' y arma el directorio por columnas. Retorna (usuarios, vigencia)."""
         try:
-            users_data = self.connector.get_data('Usuarios')
-            
-            permissions_map = {
-                'admin': ['view', 'edit', 'delete', 'manage_users'],
-                'manager': ['view', 'edit'],
-                'viewer': ['view']
+            users_data = connector.get_data('Usuarios')
+
+            def columna(nombre, defecto=''):
+                if nombre not in users_data.columns:
+                    return pd.Series(defecto, index=users_data.index, dtype=object)
+                return users_data[nombre].fillna('').astype(str).str.strip()
+
+            emails = columna('email').str.lower()
+            roles = columna('role', 'viewer').str.lower()
+            nombres = columna('name')
+            empresas = columna('company', 'Concremag S.A.')
+            hashes = columna('password')
+
+            # Las filas repetidas se quedan con la última, como al recorrer la hoja
+            usuarios = {
+                email: {
+                    'name': nombre,
+                    'role': role,
+                    'company': empresa,
+                    'permissions': PERMISSIONS_MAP.get(role, ['view']),
+                    'password_hash': password_hash
+                }
+                for email, role, nombre, empresa, password_hash
+                in zip(emails, roles, nombres, empresas, hashes)
+                if email
             }
-            
-            for _, row in users_data.iterrows():
-                email = str(row.get('email', '')).strip().lower()
-                if email:
-                    role = str(row.get('role', 'viewer')).strip().lower()
-                    password_hash = str(row.get('password', '')).strip()
-                    
-                    self.authorized_users[email] = {
-                        'name': str(row.get('name', '')).strip(),
-                        'role': role,
-                        'company': str(row.get('company', 'Concremag S.A.')).strip(),
-                        'permissions': permissions_map.get(role, ['view']),
-                        'password_hash': password_hash
-                    }
+            # Sin usuarios (hoja vacía o lectura fallida): reintentar pronto
+            return usuarios, USUARIOS_TTL if usuarios else USUARIOS_TTL_FALLBACK
         except Exception as e:
             # Fallback: usuario por defecto si falla la carga
             st.warning(f"⚠️ No se pudo cargar usuarios desde Google Sheets. Usando usuario por defecto.")
             # Password por defecto: "admin123" -> hash
             default_password_hash = hashlib.sha256("admin123".encode()).hexdigest()
-            self.authorized_users = {
+            return {
                 'cf.lopezgaete@gmail.com': {
                     'name': 'Cristopher Lopez',
                     'role': 'admin',
@@ -51,43 +123,42 @@ class UserManager:
                     'permissions': ['view', 'edit', 'delete', 'manage_users'],
                     'password_hash': default_password_hash
                 }
-            }
-    
+            }, USUARIOS_TTL_FALLBACK
+
     def verify_password(self, email, password):
-        """Verifica email + contraseña"""
+        """Verifica email + contraseña (comparación en tiempo constante)"""
         email = email.lower().strip()
-        if email not in self.authorized_users:
-            return False
-        
-        user = self.authorized_users[email]
+        user = self.authorized_users.get(email)
         password_hash = hashlib.sha256(password.encode()).hexdigest()
-        return password_hash == user['password_hash']
-    
+        esperado = user['password_hash'] if user else _HASH_RELLENO
+        coincide = hmac.compare_digest(password_hash.encode(), str(esperado).encode())
+        return user is not None and coincide
+
     def is_authorized(self, email):
         """Verifica si el email está autorizado"""
         return email.lower().strip() in self.authorized_users
-    
+
     def get_user_info(self, email):
         """Obtiene información del usuario"""
         return self.authorized_users.get(email.lower().strip(), None)
-    
+
     def get_role(self, email):
         """Obtiene el rol del usuario"""
         user = self.get_user_info(email)
         return user['role'] if user else None
-    
+
     def has_permission(self, email, permission):
         """Verifica si el usuario tiene un permiso específico"""
         user = self.get_user_info(email)
         if not user:
             return False
         return permission in user['permissions']
-    
+
     def list_users(self):
         """Lista todos los usuarios autorizados"""
         return self.authorized_users
-    
+
     def reload_users(self):
-        """Recarga usuarios desde Google Sheets"""
-        self.authorized_users = {}
+        """Recarga usuarios desde Google Sheets (invalida el directorio compartido)"""
+        _directorio.invalidar(self.connector.spreadsheet_id)
         self.load_users()
@@ -0,0 +1,235 @@
+"""
+Cola de escritura diferida (write-behind) hacia Google Sheets.
+Cada registro se anota en un journal local (JSON lines con fsync) y se confirma al instante;
+un hilo lo envía por lotes con append_rows y reintenta con espera creciente. Lo pendiente
+del journal se reenvía al reiniciar el proceso (entrega al menos una vez).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from utils.telemetry import get_telemetria
+
+# Segundos entre revisiones de la cola sin guardados nuevos
+INTERVALO_ENVIO = 5
+# Filas máximas por hoja en una sola petición
+MAX_FILAS_LOTE = 500
+# Espera entre reintentos: 2, 4, 8... hasta el tope (segundos)
+ESPERA_BASE = 2
+ESPERA_MAX = 300
+# Segundos que se recuerdan las filas ya enviadas (para mostrarlas hasta que las traiga un snapshot)
+RETENCION_ENVIADOS = 900
+
+
+def _valor_json(valor):
+    """Escalares de NumPy/pandas (ej: de un selectbox sobre un DataFrame) a tipos nativos."""
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return str(valor)
+
+
+class WriteQueue:
+    def __init__(self, conectar, journal_path, al_enviar=None, intervalo=INTERVALO_ENVIO):
+        """
+        conectar: callable -> SheetsConnector (ej: get_connector del pool).
+        journal_path: archivo del journal (se crea al primer guardado).
+        al_enviar: callable() tras cada lote escrito (ej: pedir un refresco de los datos).
+        """
+        self.conectar = conectar
+        self.journal_path = journal_path
+        self.al_enviar = al_enviar
+        self.intervalo = intervalo
+        self._pendientes = OrderedDict()   # id -> registro, en orden de llegada
+        self._enviados = OrderedDict()     # id -> registro con 'enviado_en'
+        self._lock = threading.Lock()
+        self._lock_envio = threading.Lock()
+        self._lock_hilo = threading.Lock()
+        self._evento = threading.Event()
+        self._hilo = None
+        self._enviando = False
+        self._intentos = 0
+        self._proximo_intento = 0
+        self._ultimo_envio = None
+        self._ultimo_error = None
+        self._recuperar_journal()
+        if self._pendientes:
+            # Lo recuperado se envía aunque no lleguen guardados nuevos
+            self._iniciar_hilo()
+            self._evento.set()
+
+    # --- JOURNAL ---
+    def _recuperar_journal(self):
+        """Carga los registros que quedaron sin enviar en una ejecución anterior."""
+        try:
+            with open(self.journal_path, encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        # Última línea a medio escribir (corte durante el guardado)
+                        continue
+                    self._pendientes[registro['id']] = registro
+        except OSError:
+            return
+        if self._pendientes:
+            print(f"Cola de escritura: {len(self._pendientes)} registros pendientes recuperados del journal")
+
+    def _anotar(self, registro):
+        carpeta = os.path.dirname(self.journal_path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _reescribir_journal(self):
+        """Deja en el journal solo lo pendiente (escritura atómica). Llamar con self._lock tomado."""
+        tmp = self.journal_path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for registro in self._pendientes.values():
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.journal_path)
+        except OSError as e:
+            print(f"Error reescribiendo journal de escritura: {e}")
+
+    # --- API ---
+    def encolar(self, worksheet_name, fila):
+        """
+        Anota la fila en el journal y retorna su id sin esperar a Sheets.
+        Lanza OSError si no se pudo escribir el journal (la fila no quedó guardada).
+        """
+        registro = {
+            'id': uuid.uuid4().hex,
+            'hoja': worksheet_name,
+            'fila': json.loads(json.dumps(list(fila), default=_valor_json)),
+            'creado_en': time.time(),
+        }
+        with self._lock:
+            self._anotar(registro)
+            self._pendientes[registro['id']] = registro
+        self._iniciar_hilo()
+        self._evento.set()
+        return registro['id']
+
+    def enviar(self):
+        """Envía lo pendiente, un lote por hoja y en orden de llegada. Retorna True si no quedó nada."""
+        with self._lock_envio:
+            with self._lock:
+                lote = list(self._pendientes.values())
+            if not lote:
+                return True
+            por_hoja = OrderedDict()
+            for registro in lote:
+                por_hoja.setdefault(registro['hoja'], []).append(registro)
+
+            self._enviando = True
+            errores = []
+            try:
+                conn = self.conectar()
+                for hoja, registros in por_hoja.items():
+                    for i in range(0, len(registros), MAX_FILAS_LOTE):
+                        parte = registros[i:i + MAX_FILAS_LOTE]
+                        try:
+                            with get_telemetria().span('cola.enviar', hoja=hoja):
+                                # Revisión previa al envío: un snapshot con esta misma revisión aún no trae el lote
+                                revision_previa = conn.get_revision(fresca=True)
+                                conn.append_rows(hoja, [r['fila'] for r in parte])
+                        except Exception as e:
+                            # Lo que sigue de esta hoja espera al reintento para no alterar el orden
+                            errores.append(f"{hoja}: {e}")
+                            break
+                        self._confirmar(parte, revision_previa)
+            except Exception as e:
+                errores.append(str(e))
+            finally:
+                self._enviando = False
+
+            if errores:
+                self._intentos += 1
+                self._ultimo_error = "; ".join(errores)
+                self._proximo_intento = time.time() + min(ESPERA_MAX, ESPERA_BASE ** self._intentos)
+                print(f"Error enviando cola de escritura (intento {self._intentos}): {self._ultimo_error}")
+            else:
+                self._intentos = 0
+                self._ultimo_error = None
+            return not errores
+
+    def _confirmar(self, registros, revision_previa=None):
+        ahora = time.time()
+        with self._lock:
+            for registro in registros:
+                self._pendientes.pop(registro['id'], None)
+                self._enviados[registro['id']] = dict(registro, enviado_en=ahora, revision_previa=revision_previa)
+            while self._enviados and next(iter(self._enviados.values()))['enviado_en'] < ahora - RETENCION_ENVIADOS:
+                self._enviados.popitem(last=False)
+            self._reescribir_journal()
+        self._ultimo_envio = ahora
+        if self.al_enviar is not None:
+            try:
+                self.al_enviar()
+            except Exception as e:
+                print(f"Error notificando envío: {e}")
+
+    def filas_locales(self, worksheet_name, leido_en=None, revision=None):
+        """
+        Registros de la hoja que un snapshot (leído desde 'leido_en', con 'revision') aún no trae.
+        Retorna [(id, fila)].
+        """
+        with self._lock:
+            registros = list(self._enviados.values()) + list(self._pendientes.values())
+        return [(r['id'], r['fila']) for r in registros
+                if r['hoja'] == worksheet_name and not self._en_snapshot(r, leido_en, revision)]
+
+    @staticmethod
+    def _en_snapshot(registro, leido_en, revision):
+        """
+        Un registro enviado cuenta como incluido solo si el snapshot se leyó después del envío y su
+        revisión ya no es la previa al envío (la revisión en caché, el retraso de Drive o un snapshot
+        en disco pueden servir datos anteriores aunque la lectura sea posterior).
+        Sin revisiones (sin caché de snapshots) basta con que la lectura sea posterior.
+        """
+        enviado_en = registro.get('enviado_en')
+        if enviado_en is None or leido_en is None or leido_en < enviado_en:
+            return False
+        previa = registro.get('revision_previa')
+        if previa is None or revision is None:
+            return previa is None and revision is None
+        return revision != previa
+
+    def estado(self):
+        return {
+            'pendientes': len(self._pendientes),
+            'enviando': self._enviando,
+            'intentos': self._intentos,
+            'proximo_intento': self._proximo_intento if self._ultimo_error else None,
+            'ultimo_envio': self._ultimo_envio,
+            'ultimo_error': self._ultimo_error,
+        }
+
+    # --- HILO DE ENVÍO ---
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock_hilo:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="write-queue", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._evento.wait(self.intervalo)
+            self._evento.clear()
+            if not self._pendientes:
+                continue
+            espera = self._proximo_intento - time.time()
+            if self._ultimo_error and espera > 0:
+                # En reintento: un guardado nuevo no adelanta la espera
+                time.sleep(espera)
+            self.enviar()